@@ -0,0 +1,221 @@
+# RenPatch Command Line
+# python -m app.cli watch <project> [--font PATH] [--poll]
+# python -m app.cli check --font PATH [--rev RANGE] [repo]
+# python -m app.cli shard <project> [PATH ...] -o part.rpsa [--counts]
+# python -m app.cli merge part1.rpsa part2.rpsa ... -o merged.rpsa
+# python -m app.cli analyze <project> [--scan merged.rpsa ...]
+# python -m app.cli patch <project> --font LITE --donor FONT [--donor FONT] [--scan merged.rpsa ...] [--tiers]
+import os
+import sys
+import argparse
+
+def _chars(chars, limit=40):
+    text = "".join(sorted(chars))
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _print_delta(delta, fonts):
+    for path in delta["changed"]:
+        print(f"~ {path}")
+    for path in delta["removed"]:
+        print(f"- {path}")
+    line = f"  {delta['unique_chars']} unique characters"
+    if delta["added_chars"]:
+        line += f", +{len(delta['added_chars'])}: {_chars(delta['added_chars'])}"
+    if delta["dropped_chars"]:
+        line += f", -{len(delta['dropped_chars'])}"
+    print(line)
+    for font_path, health in delta["fonts"].items():
+        if fonts and font_path not in fonts:
+            continue
+        name = os.path.basename(font_path)
+        if health["new_missing"]:
+            print(f"  ! {name}: {len(health['new_missing'])} new missing: {_chars(health['new_missing'])}"
+                  f" ({health['missing_count']} total)")
+        elif health["fixed"]:
+            print(f"  {name}: {len(health['fixed'])} fixed ({health['missing_count']} still missing)")
+    sys.stdout.flush()
+
+def watch(args):
+    from app.core.watch import ProjectWatcher
+
+    fonts = {os.path.abspath(path) for path in args.font}
+    print(f"Indexing {args.project}...")
+    watcher = ProjectWatcher(args.project, use_inotify=False if args.poll else None)
+    index = watcher.index
+    print(f"{len(index.unique_chars)} unique characters in {len(index.files)} files")
+    for font_path, (needed, missing, _) in index.missing.items():
+        if not fonts or font_path in fonts:
+            print(f"  {os.path.basename(font_path)}: {len(missing)} of {len(needed)} missing")
+    print(f"Watching ({type(watcher.backend).__name__.strip('_').lower()}), Ctrl+C to stop")
+    try:
+        watcher.run(lambda delta: _print_delta(delta, fonts))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def check(args):
+    from app.core.gate import check_changes, GateError
+
+    try:
+        failure = check_changes(args.repo, args.font, args.rev)
+    except (GateError, OSError) as e:
+        print(f"renpatch check: {e}", file=sys.stderr)
+        return 2
+    if failure is None:
+        return 0
+    path, line, char = failure
+    print(f"{path}:{line}: U+{ord(char):04X} '{char}' is not in {os.path.basename(args.font)}")
+    return 1
+
+def shard(args):
+    from app.core.artifact import scan_shard
+
+    artifact = scan_shard(args.project, args.paths or None, count=args.counts, use_cache=True)
+    artifact.save(args.output)
+    print(f"{len(artifact.files)} files, {len(artifact.characters())} unique characters -> {args.output}")
+    return 0
+
+def merge(args):
+    from app.core.artifact import ScanArtifact, ArtifactError
+
+    try:
+        artifact = ScanArtifact.merge(ScanArtifact.load(path) for path in args.artifacts)
+    except (ArtifactError, OSError) as e:
+        print(f"renpatch merge: {e}", file=sys.stderr)
+        return 2
+    artifact.save(args.output)
+    print(f"{len(artifact.files)} files, {len(artifact.characters())} unique characters -> {args.output}")
+    return 0
+
+def _font_chars(args):
+    """
+    Return: (font map, {language: font map}, counts or None) of the --scan artifacts,
+            or of a live scan of the project without them.
+    """
+    from collections import Counter
+    from app.core import scanner
+    from app.core.artifact import ScanArtifact
+
+    languages = {}
+    if args.scan:
+        artifact = ScanArtifact.merge(ScanArtifact.load(path) for path in args.scan)
+        return artifact.font_characters(languages), languages, artifact.counts
+    counts = Counter()
+    font_chars = scanner.get_font_characters(args.project, use_cache=True, languages=languages, frequencies=counts)
+    return font_chars, languages, counts
+
+def _font_health(font_path, font_chars, languages):
+    """
+    Return: (needed CharSet, missing CharSet, {language: missing CharSet}) of a font.
+    """
+    from app.core import scanner, patcher
+
+    needed = scanner.characters_for_font(font_chars, font_path)
+    missing = patcher.get_missing_characters(needed, font_path)
+    by_language = {
+        language: missing & scanner.characters_for_font(chars, font_path)
+        for language, chars in languages.items()
+    }
+    return needed, missing, by_language
+
+def analyze(args):
+    from app.core import scanner
+
+    font_chars, languages, _ = _font_chars(args)
+    for font_path in scanner.find_fonts(args.project):
+        needed, missing, by_language = _font_health(font_path, font_chars, languages)
+        role, _ = scanner.analyze_font_role(
+            args.project, font_path, missing_count=len(missing), total_chars=len(needed)
+        )
+        line = f"{os.path.basename(font_path)} [{role}]: {len(missing)} of {len(needed)} missing"
+        locales = [f"{language}: {len(chars)}" for language, chars in by_language.items() if language and chars]
+        if locales:
+            line += f" ({', '.join(locales)})"
+        print(line)
+    return 0
+
+def patch(args):
+    from app.core import patcher
+    from app.core.charset import CharSet
+
+    font_chars, languages, counts = _font_chars(args)
+    _, missing, by_language = _font_health(args.font, font_chars, languages)
+    output_dir = args.output or os.path.dirname(os.path.abspath(args.font))
+    frequencies = counts if args.tiers else None
+
+    locale_patches = {}
+    if any(language is not None and chars for language, chars in by_language.items()):
+        locale_patches = patcher.generate_locale_patches(by_language, args.donor, output_dir, frequencies)
+        patches_list, failed_chars = locale_patches.pop(None, ([], CharSet()))
+    else:
+        patches_list, failed_chars = patcher.generate_multi_patch(
+            missing, args.donor, output_dir, frequencies=frequencies
+        )
+    if not patches_list and not any(patches for patches, _ in locale_patches.values()):
+        print("No patches could be generated." if missing else "Nothing to patch.")
+        return 1 if missing else 0
+
+    patcher.generate_renpy_script(
+        patches_list, failed_chars, os.path.basename(args.font),
+        os.path.join(output_dir, "renpatch_init.rpy"),
+        os.path.join(output_dir, "renpatch_log.json"),
+        locales=locale_patches
+    )
+    failed_count = len(failed_chars) + sum(len(failed) for _, failed in locale_patches.values())
+    return 1 if failed_count else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="renpatch", description="RedPanda RenPatch")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    watch_parser = commands.add_parser("watch", help="keep character and missing counts live while scripts are edited")
+    watch_parser.add_argument("project", help="Ren'Py project or game directory")
+    watch_parser.add_argument("--font", action="append", default=[], help="only report this font (repeatable)")
+    watch_parser.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    watch_parser.set_defaults(handler=watch)
+
+    check_parser = commands.add_parser(
+        "check", help="pre-commit / CI gate: fail on the first changed line the font cannot render"
+    )
+    check_parser.add_argument("repo", nargs="?", default=".", help="git repository (default: current directory)")
+    check_parser.add_argument("--font", required=True, help="primary (lite) font the scripts must stay within")
+    check_parser.add_argument(
+        "--rev",
+        help="check a diff range such as origin/main...HEAD (read at its end) instead of the staged changes; "
+             "a single revision is diffed against and read from the work tree"
+    )
+    check_parser.set_defaults(handler=check)
+
+    shard_parser = commands.add_parser("shard", help="scan part of a project into a scan artifact")
+    shard_parser.add_argument("project", help="Ren'Py project or game directory")
+    shard_parser.add_argument("paths", nargs="*", help="files / directories to scan (default: all)")
+    shard_parser.add_argument("-o", "--output", required=True, help="artifact to write (.rpsa)")
+    shard_parser.add_argument("--counts", action="store_true", help="also store character occurrence counts")
+    shard_parser.set_defaults(handler=shard)
+
+    merge_parser = commands.add_parser("merge", help="combine scan artifacts of disjoint shards")
+    merge_parser.add_argument("artifacts", nargs="+", help="artifacts to merge")
+    merge_parser.add_argument("-o", "--output", required=True, help="artifact to write (.rpsa)")
+    merge_parser.set_defaults(handler=merge)
+
+    for name, handler, help_text in (
+        ("analyze", analyze, "report the missing characters of every project font"),
+        ("patch", patch, "generate patch fonts and renpatch_init.rpy for a font"),
+    ):
+        command_parser = commands.add_parser(name, help=help_text)
+        command_parser.add_argument("project", help="Ren'Py project or game directory")
+        command_parser.add_argument(
+            "--scan", action="append", default=[], help="scan artifact to use instead of scanning (repeatable)"
+        )
+        command_parser.set_defaults(handler=handler)
+        if name == "patch":
+            command_parser.add_argument("--font", required=True, help="lite font to patch")
+            command_parser.add_argument("--donor", action="append", required=True, help="donor font, in priority order")
+            command_parser.add_argument("--output", help="output directory (default: the font's directory)")
+            command_parser.add_argument("--tiers", action="store_true", help="split patches into hot / cold tiers")
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
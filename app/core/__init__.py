@@ -1,2 +1,5 @@
-from .scanner import get_unique_characters
+from .scanner import get_unique_characters, get_font_characters, characters_for_font, get_provenance_index
+from .project import ProjectIndex
+from .formats import register_format
+from .charset import CharSet
 from .patcher import get_missing_characters, save_missing_report, generate_patch_font, generate_renpy_script
@@ -0,0 +1,142 @@
+# RenPatch Archive Module
+# Read-only access to Ren'Py .rpa archives (RPA-2.0 / RPA-3.x) without extraction.
+# Members are addressed as paths inside the archive, e.g. game/archive.rpa/fonts/UI.ttf,
+# and read with a seek + read at their recorded offset.
+import io
+import os
+import zlib
+import pickle
+
+ARCHIVE_EXTENSION = ".rpa"
+
+class ArchiveError(Exception):
+    pass
+
+class _IndexUnpickler(pickle.Unpickler):
+    """
+    The archive index is a pickle from a third-party build: only plain
+    containers may be loaded, never arbitrary classes or callables.
+    """
+    # Protocol 2 pickles written by Python 3 (Ren'Py 8) rebuild bytes through _codecs.encode,
+    # and the empty prefix b"" through bytes() (builtins.bytes under protocol 3+)
+    ALLOWED = {("_codecs", "encode"), ("__builtin__", "bytes"), ("builtins", "bytes")}
+
+    def find_class(self, module, name):
+        if (module, name) in self.ALLOWED:
+            return super().find_class(module, name)
+        raise ArchiveError(f"Unexpected object in archive index: {module}.{name}")
+
+def _text(value):
+    # Indexes pickled by Python 2 builds may hold byte strings
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def _raw(value):
+    return value.encode('latin-1') if isinstance(value, str) else value
+
+class RPAArchive:
+    """
+    Index of one .rpa archive.
+    members: {name: (offset, length, prefix)} with de-obfuscated offsets;
+             the member data is prefix + length - len(prefix) bytes at offset.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.members = {}
+        self._load_index()
+
+    def _load_index(self):
+        with open(self.path, 'rb') as f:
+            header = f.readline(256)
+            fields = header.split()
+            if not fields or not fields[0].startswith(b"RPA-"):
+                raise ArchiveError(f"Not a Ren'Py archive: {self.path}")
+            version = fields[0][4:].decode('ascii', 'replace')
+            if version == "2.0":
+                key = 0
+            elif version.startswith("3."):
+                # Same as Ren'Py's loader: every field after the offset is folded into the key
+                key = 0
+                for field in fields[2:]:
+                    key ^= int(field, 16)
+            else:
+                raise ArchiveError(f"Unsupported archive version RPA-{version}: {self.path}")
+
+            f.seek(int(fields[1], 16))
+            index = _IndexUnpickler(io.BytesIO(zlib.decompress(f.read())), encoding='bytes').load()
+
+        for name, chunks in index.items():
+            if not chunks:
+                continue
+            # Ren'Py writes one chunk per member
+            chunk = chunks[0]
+            offset, length = chunk[0] ^ key, chunk[1] ^ key
+            prefix = _raw(chunk[2]) if len(chunk) > 2 else b""
+            self.members[_text(name).replace('\\', '/')] = (offset, length, prefix or b"")
+
+    def names(self, extensions=None):
+        """
+        Return: member names in index order, optionally only those ending with extensions.
+        """
+        if extensions is None:
+            return list(self.members)
+        return [name for name in self.members if name.lower().endswith(extensions)]
+
+    def size(self, name):
+        return self.members[name][1]
+
+    def read(self, name):
+        """
+        Return: the bytes of one member, read straight from its offset.
+        """
+        offset, length, prefix = self.members[name]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length - len(prefix))
+        return prefix + data
+
+# Parsed archives per process, keyed by path and validated by mtime
+_ARCHIVES = {}
+
+def open_archive(path):
+    """
+    Return: the RPAArchive at path, parsed once per process while the file is unchanged.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _ARCHIVES.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, RPAArchive(path))
+        _ARCHIVES[path] = cached
+    return cached[1]
+
+def member_path(archive_path, name):
+    """
+    Return: the path a project uses to address an archive member.
+    """
+    return os.path.join(archive_path, *name.split('/'))
+
+def split_member_path(path):
+    """
+    Split a member path into the archive and the member name.
+    Return: (archive path, member name), or None for a plain file.
+    """
+    if os.path.exists(path):
+        return None
+    head, parts = path, []
+    while True:
+        head, tail = os.path.split(head)
+        if not tail:
+            return None
+        parts.append(tail)
+        if head.lower().endswith(ARCHIVE_EXTENSION) and os.path.isfile(head):
+            return head, "/".join(reversed(parts))
+
+def open_file(path):
+    """
+    Open a project file for binary reading, from disk or from inside an archive.
+    Return: a readable binary file object (use as a context manager).
+    """
+    member = split_member_path(path)
+    if member is None:
+        return open(path, 'rb')
+    archive_path, name = member
+    return io.BytesIO(open_archive(archive_path).read(name))
@@ -0,0 +1,310 @@
+# RenPatch Scan Artifact Module
+# Partial scan results that can be produced on several machines and merged:
+# scan_shard() scans a subset of a project, ScanArtifact |= merges, and the
+# merged artifact stands in for a live get_font_characters() scan.
+#
+# Binary format (little-endian, all maps sorted by key, so equal scans give equal bytes):
+#   "RPSA" magic, u16 version, u16 flags (bit 0: counts present)
+#   sections: 4-byte tag, u32 payload length, payload; unknown tags are skipped
+#     FILE  files:     varint n, n x (str path, varint size, 16-byte blake2b digest)
+#     USGE  usage:     FontUsage block
+#     LANG  languages: varint n, n x (optional str language, FontUsage block)
+#     CNTS  counts:    varint n, n x (varint codepoint delta, varint count)
+#   str: varint length + UTF-8; optional str: 0 for None, else 1 + str
+#   CharSet: varint n, n x (varint gap from the previous range, varint range length - 1)
+#   FontUsage block: by_font {str: CharSet}, by_kind {optional str: CharSet},
+#                    settings {str: [str]}, aliases {str: [str]}, each as varint n + entries
+import os
+import io
+import struct
+from collections import Counter
+
+from .charset import CharSet
+from .attribution import FontUsage, resolve_languages
+from .project import get_project_index
+from .scanner import _scan_project
+
+MAGIC = b"RPSA"
+VERSION = 1
+# Extension of artifact files
+ARTIFACT_EXTENSION = ".rpsa"
+_COUNTS = 1
+
+class ArtifactError(Exception):
+    pass
+
+### ENCODING ###
+
+class _Writer:
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def varint(self, value):
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if value:
+                self.buffer.write(bytes((byte | 0x80,)))
+            else:
+                self.buffer.write(bytes((byte,)))
+                return
+
+    def str(self, text):
+        data = text.encode('utf-8')
+        self.varint(len(data))
+        self.buffer.write(data)
+
+    def optional_str(self, text):
+        if text is None:
+            self.varint(0)
+        else:
+            self.varint(1)
+            self.str(text)
+
+    def charset(self, chars):
+        ranges = chars.to_ranges()
+        self.varint(len(ranges))
+        previous = -1
+        for first, last in ranges:
+            self.varint(first - previous - 1)
+            self.varint(last - first)
+            previous = last
+
+    def usage(self, usage):
+        for chars_map, key in ((usage.by_font, self.str), (usage.by_kind, self.optional_str)):
+            self.varint(len(chars_map))
+            for name in sorted(chars_map, key=lambda name: name or ""):
+                key(name)
+                self.charset(chars_map[name])
+        for values_map in (usage.settings, usage.aliases):
+            self.varint(len(values_map))
+            for name in sorted(values_map):
+                self.str(name)
+                self.varint(len(values_map[name]))
+                for value in sorted(values_map[name]):
+                    self.str(value)
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, size):
+        if self.pos + size > len(self.data):
+            raise ArtifactError("truncated scan artifact")
+        data = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def varint(self):
+        value = shift = 0
+        while True:
+            byte = self.read(1)[0]
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def str(self):
+        return self.read(self.varint()).decode('utf-8')
+
+    def optional_str(self):
+        return self.str() if self.varint() else None
+
+    def charset(self):
+        ranges = []
+        previous = -1
+        for _ in range(self.varint()):
+            first = previous + 1 + self.varint()
+            previous = first + self.varint()
+            ranges.append((first, previous))
+        return CharSet.from_ranges(ranges)
+
+    def usage(self):
+        usage = FontUsage()
+        for chars_map, key in ((usage.by_font, self.str), (usage.by_kind, self.optional_str)):
+            for _ in range(self.varint()):
+                name = key()
+                chars_map[name] = self.charset()
+        for values_map in (usage.settings, usage.aliases):
+            for _ in range(self.varint()):
+                name = self.str()
+                values_map[name] = {self.str() for _ in range(self.varint())}
+        return usage
+
+### ARTIFACT ###
+
+class ScanArtifact:
+    """
+    Result of a ("fonts" mode) scan of some files of a project.
+    - usage: FontUsage of all the files
+    - languages: {language: FontUsage} split by game/tl/<language>, None for the base language
+    - counts: Counter of character occurrences, or None when not collected
+    - files: {path relative to the project: (size, content digest)}
+    Artifacts of disjoint file sets merge with |= in any order and grouping.
+    """
+    def __init__(self, usage=None, languages=None, counts=None, files=None):
+        self.usage = usage if usage is not None else FontUsage()
+        self.languages = languages if languages is not None else {}
+        self.counts = counts
+        self.files = files if files is not None else {}
+
+    def __ior__(self, other):
+        for path, fingerprint in other.files.items():
+            if path in self.files:
+                if self.files[path] != fingerprint:
+                    raise ArtifactError(f"{path} differs between the merged scans")
+                raise ArtifactError(f"{path} is in more than one merged scan")
+        self.files.update(other.files)
+        self.usage |= other.usage
+        for language, usage in other.languages.items():
+            if language not in self.languages:
+                self.languages[language] = FontUsage()
+            self.languages[language] |= usage
+        # Counts of a part of the project would be wrong for the whole
+        if self.counts is None or other.counts is None:
+            self.counts = None
+        else:
+            self.counts = self.counts + other.counts
+        return self
+
+    @classmethod
+    def merge(cls, artifacts):
+        """
+        Return: a new artifact holding all the given ones.
+        """
+        merged = cls(counts=Counter())
+        for artifact in artifacts:
+            merged |= artifact
+        return merged
+
+    def characters(self):
+        return self.usage.characters()
+
+    def font_characters(self, languages=None):
+        """
+        Same result as scanner.get_font_characters() on the scanned files.
+        languages: optional dict, filled with {language: font map}.
+        Return: {font as written in the scripts: CharSet}.
+        """
+        if languages is not None:
+            languages.update(resolve_languages(self.usage, self.languages))
+        return self.usage.resolve()
+
+    ### SERIALIZATION ###
+
+    def to_bytes(self):
+        sections = []
+
+        files = _Writer()
+        files.varint(len(self.files))
+        for path in sorted(self.files):
+            size, digest = self.files[path]
+            files.str(path)
+            files.varint(size)
+            files.buffer.write(bytes.fromhex(digest))
+        sections.append((b"FILE", files))
+
+        usage = _Writer()
+        usage.usage(self.usage)
+        sections.append((b"USGE", usage))
+
+        languages = _Writer()
+        languages.varint(len(self.languages))
+        for language in sorted(self.languages, key=lambda language: language or ""):
+            languages.optional_str(language)
+            languages.usage(self.languages[language])
+        sections.append((b"LANG", languages))
+
+        if self.counts is not None:
+            counts = _Writer()
+            counts.varint(len(self.counts))
+            previous = -1
+            for codepoint in sorted(map(ord, self.counts)):
+                counts.varint(codepoint - previous - 1)
+                counts.varint(self.counts[chr(codepoint)])
+                previous = codepoint
+            sections.append((b"CNTS", counts))
+
+        flags = _COUNTS if self.counts is not None else 0
+        data = [MAGIC, struct.pack("<HH", VERSION, flags)]
+        for tag, writer in sections:
+            payload = writer.getvalue()
+            data += [tag, struct.pack("<I", len(payload)), payload]
+        return b"".join(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        reader = _Reader(data)
+        if reader.read(4) != MAGIC:
+            raise ArtifactError("not a RenPatch scan artifact")
+        version, flags = struct.unpack("<HH", reader.read(4))
+        if version != VERSION:
+            raise ArtifactError(f"unsupported scan artifact version {version}")
+
+        artifact = cls(counts=Counter() if flags & _COUNTS else None)
+        while reader.pos < len(data):
+            tag = reader.read(4)
+            section = _Reader(reader.read(struct.unpack("<I", reader.read(4))[0]))
+            if tag == b"FILE":
+                for _ in range(section.varint()):
+                    path = section.str()
+                    size = section.varint()
+                    artifact.files[path] = (size, section.read(16).hex())
+            elif tag == b"USGE":
+                artifact.usage = section.usage()
+            elif tag == b"LANG":
+                for _ in range(section.varint()):
+                    language = section.optional_str()
+                    artifact.languages[language] = section.usage()
+            elif tag == b"CNTS" and artifact.counts is not None:
+                codepoint = -1
+                for _ in range(section.varint()):
+                    codepoint += section.varint() + 1
+                    artifact.counts[chr(codepoint)] = section.varint()
+        return artifact
+
+    def save(self, path):
+        # Write then swap so an interrupted save never leaves a corrupt artifact
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+### SHARDS ###
+
+def scan_shard(game_dir, paths=None, count=False, workers=None, parallel=None, use_cache=False, project=None):
+    """
+    Scan some files of a project into an artifact, e.g. one DLC or one game of a monorepo
+    per build agent. Shards of one project must not overlap.
+    paths: files and directories (absolute or relative to game_dir) to scan; None for all.
+    count: also collect character occurrence counts.
+    Return: a ScanArtifact, paths relative to game_dir.
+    """
+    project = get_project_index(game_dir, project)
+    if paths is not None:
+        project = project.subset(paths)
+
+    digests = {}
+    languages = {}
+    counts = Counter() if count else None
+    usage = _scan_project(
+        game_dir, "fonts", FontUsage(), workers, parallel, use_cache, project=project,
+        languages=languages, frequencies=counts, digests=digests
+    )
+
+    fingerprints = {}
+    for path, size, _ in project.scripts + project.sources:
+        # Hashed while scanning or stored in the scan cache: files are not read twice
+        if path in digests:
+            key = os.path.relpath(path, game_dir).replace(os.sep, "/")
+            fingerprints[key] = (size, digests[path])
+    return ScanArtifact(usage, languages, counts, fingerprints)
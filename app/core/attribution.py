@@ -0,0 +1,272 @@
+# RenPatch Font Attribution Module
+# Works out which font renders each piece of displayable text, from:
+# - inline {font=...}...{/font} tags
+# - style <name>: font "..." statements
+# - define gui.*_font = "..." (or = gui.other_font)
+import os
+import re
+import copy
+
+from .cache import ScanCache
+from .charset import CharSet
+from .lexer import _syntax_of, iter_literals, is_probably_path, emit_literal, new_sink, finish_sink
+from .statements import _Statements, SAY, NAME, MENU, SCREEN, BUTTON, LABEL
+
+# Settings that decide the font of each kind of text, most specific first.
+# Follows the style / gui variable chain of the Ren'Py gui template.
+KIND_FONTS = {
+    SAY: ("style.say_dialogue", "style.default", "gui.text_font"),
+    NAME: ("style.say_label", "gui.name_text_font", "style.default", "gui.text_font"),
+    MENU: ("style.choice_button_text", "gui.choice_button_text_font", "style.default", "gui.text_font"),
+    SCREEN: ("style.text", "style.default", "gui.text_font"),
+    BUTTON: ("style.button_text", "gui.button_text_font", "gui.interface_text_font",
+             "style.default", "gui.text_font"),
+    LABEL: ("style.label_text", "gui.label_text_font", "gui.interface_text_font",
+            "style.default", "gui.text_font"),
+}
+
+def _patterns(kind):
+    def pattern(text, flags=0):
+        return re.compile(text if kind is str else text.encode('ascii'), flags)
+    return {
+        # {font=...} / {/font}
+        "font_tag": pattern(r'\{(/?)font(?:=([^}\n]*))?\}'),
+        # define gui.text_font = "..." / define gui.button_text_font = gui.interface_text_font
+        "gui_font": pattern(
+            r'^[ \t]*define\s+(?:[-+]?\d+\s+)?gui\.(\w+_font)\s*=\s*'
+            r'(?:(["\'])([^"\'\n]*)\2|gui\.(\w+_font)\b)', re.MULTILINE
+        ),
+    }
+
+_PATTERNS = {True: _patterns(str), False: _patterns(bytes)}
+# One-line style statement, e.g. style say_label font "..."
+_STYLE_FONT = re.compile(r'style\s+(\w+)\b.*\sfont$')
+
+def _font_ref(text):
+    """
+    Normalize a font as written in a script, e.g. "fonts\\UI.ttf" -> "fonts/UI.ttf".
+    """
+    return text.strip().replace('\\', '/')
+
+class FontUsage:
+    """
+    Displayable characters grouped by what decides their font.
+    - by_font: text inside {font=...} tags, keyed by the font as written
+    - by_kind: all other text, keyed by statement kind (say, name, menu ...)
+      or None when nothing ties it to a font, e.g. translate strings
+    - settings: "gui.text_font" / "style.say_label" -> set of fonts assigned
+    - aliases: "gui.button_text_font" -> set of gui variables assigned to it
+    Results of single files are merged with |=.
+    """
+    def __init__(self):
+        self.by_font = {}
+        self.by_kind = {}
+        self.settings = {}
+        self.aliases = {}
+
+    def __ior__(self, other):
+        for mine, theirs in ((self.by_font, other.by_font), (self.by_kind, other.by_kind)):
+            for key, chars in theirs.items():
+                mine[key] = mine[key] | chars if key in mine else chars.copy()
+        for mine, theirs in ((self.settings, other.settings), (self.aliases, other.aliases)):
+            for key, values in theirs.items():
+                mine.setdefault(key, set()).update(values)
+        return self
+
+    @classmethod
+    def from_characters(cls, chars):
+        """
+        Return: a FontUsage holding chars as text of unknown font.
+        """
+        usage = cls()
+        if chars:
+            usage.by_kind[None] = chars
+        return usage
+
+    ### SERIALIZATION ###
+
+    def to_json(self):
+        return {
+            "by_font": {font: chars.to_string() for font, chars in self.by_font.items()},
+            "by_kind": {kind or "": chars.to_string() for kind, chars in self.by_kind.items()},
+            "settings": {key: sorted(values) for key, values in self.settings.items()},
+            "aliases": {key: sorted(values) for key, values in self.aliases.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        usage = cls()
+        usage.by_font = {font: CharSet(chars) for font, chars in data["by_font"].items()}
+        usage.by_kind = {kind or None: CharSet(chars) for kind, chars in data["by_kind"].items()}
+        usage.settings = {key: set(values) for key, values in data["settings"].items()}
+        usage.aliases = {key: set(values) for key, values in data["aliases"].items()}
+        return usage
+
+    ### RESOLUTION ###
+
+    def characters(self):
+        """
+        Return: all displayable characters, whatever their font.
+        """
+        return CharSet().union(*self.by_font.values(), *self.by_kind.values())
+
+    def _setting_fonts(self, name, seen):
+        if name in seen:
+            return set()
+        seen.add(name)
+        fonts = set(self.settings.get(name, ()))
+        for alias in self.aliases.get(name, ()):
+            fonts |= self._setting_fonts(alias, seen)
+        return fonts
+
+    def fonts_of(self, kind):
+        """
+        Return: the set of fonts that render text of a statement kind (empty if unknown).
+        """
+        for name in KIND_FONTS.get(kind, ()):
+            fonts = self._setting_fonts(name, set())
+            if fonts:
+                return fonts
+        return set()
+
+    def resolve(self):
+        """
+        Return: {font as written in the scripts: CharSet}; the None key holds
+                characters whose font could not be determined.
+        """
+        font_chars = {}
+        def add(font, chars):
+            font_chars[font] = font_chars[font] | chars if font in font_chars else chars.copy()
+
+        for font, chars in self.by_font.items():
+            add(font, chars)
+        for kind, chars in self.by_kind.items():
+            for font in self.fonts_of(kind) or (None,):
+                add(font, chars)
+        return font_chars
+
+def resolve_languages(usage, languages):
+    """
+    Resolve the usage of each language with the font settings of the whole project:
+    they usually live in the base language scripts.
+    usage: FontUsage of all the files; languages: {language: FontUsage}, left unchanged.
+    Return: {language: font map, see FontUsage.resolve()}.
+    """
+    resolved = {}
+    for language, found in languages.items():
+        found = copy.copy(found)
+        found.settings, found.aliases = usage.settings, usage.aliases
+        resolved[language] = found.resolve()
+    return resolved
+
+class FontUsageCache(ScanCache):
+    """
+    Per-file cache of FontUsage results.
+    """
+    def encode(self, usage):
+        return usage.to_json()
+
+    def decode(self, data):
+        return FontUsage.from_json(data)
+
+def _emit_spans(content, start, end, patterns, default, font_sink):
+    """
+    Add a literal body to default, except text inside {font=...} tags,
+    which goes to font_sink(font). Tags may nest.
+    """
+    syntax = _syntax_of(content)
+    tag = patterns["font_tag"].search(content, start, end)
+    if tag is None:
+        emit_literal(content, start, end, default)
+        return
+
+    fonts = []
+    pos = start
+    while tag is not None:
+        emit_literal(content, pos, tag.start(), font_sink(fonts[-1]) if fonts else default)
+        if tag.group(1):
+            if fonts:
+                fonts.pop()
+        elif tag.group(2) is not None:
+            fonts.append(_font_ref(syntax.text(content, tag.start(2), tag.end(2))))
+        pos = tag.end()
+        tag = patterns["font_tag"].search(content, pos, end)
+    emit_literal(content, pos, end, font_sink(fonts[-1]) if fonts else default)
+
+def scan_font_usage(content, vectorized=False, occurrences=None):
+    """
+    Extract the displayable characters of a Ren'Py script grouped by what decides their font,
+    along with the gui / style font assignments the script makes.
+    content: decoded text, or raw UTF-8 bytes / mmap.
+    occurrences: optional Occurrences of the same content, records where each character is.
+    Return: a FontUsage.
+    """
+    syntax = _syntax_of(content)
+    patterns = _PATTERNS[syntax.is_text]
+    usage = FontUsage()
+    kind_sinks = {}
+    font_sinks = {}
+
+    def font_sink(font):
+        if font not in font_sinks:
+            font_sinks[font] = new_sink(vectorized)
+        return font_sinks[font]
+
+    statements = _Statements(content)
+    for start, end, width in iter_literals(content, skip_comments=True):
+        statements.feed(start - width)
+        kind = statements.literal(end + width)
+
+        if kind is None:
+            # style <name>: font "..." inside a style block, or on one line
+            style = statements.style() if statements.prefix == "font" else None
+            if style is None:
+                match = _STYLE_FONT.match(statements.prefix)
+                style = match.group(1) if match else None
+            if style is not None:
+                font = _font_ref(syntax.text(content, start, end))
+                usage.settings.setdefault(f"style.{style}", set()).add(font)
+            continue
+
+        if start == end or is_probably_path(content, start, end, tags=True):
+            continue
+        if kind not in KIND_FONTS:
+            kind = None
+        if kind not in kind_sinks:
+            kind_sinks[kind] = new_sink(vectorized)
+        _emit_spans(content, start, end, patterns, kind_sinks[kind], font_sink)
+        if occurrences is not None:
+            occurrences.record(start, end)
+
+    for match in patterns["gui_font"].finditer(content):
+        name = "gui." + syntax.text(content, *match.span(1))
+        if match.group(3) is not None:
+            usage.settings.setdefault(name, set()).add(_font_ref(syntax.text(content, *match.span(3))))
+        else:
+            usage.aliases.setdefault(name, set()).add("gui." + syntax.text(content, *match.span(4)))
+
+    for sinks, chars in ((font_sinks, usage.by_font), (kind_sinks, usage.by_kind)):
+        for key, sink in sinks.items():
+            found = finish_sink(sink)
+            if found:
+                chars[key] = found
+    return usage
+
+def characters_for_font(font_chars, font_path):
+    """
+    Characters a font file has to cover, from the map returned by get_font_characters().
+    Fonts are matched by file name. Characters with an unknown font count for
+    every font, and a font the scripts never name is checked against everything.
+    Return: a CharSet.
+    """
+    name = os.path.basename(font_path).lower()
+    chars = CharSet()
+    matched = False
+    for font, font_set in font_chars.items():
+        if font is not None and font.rsplit('/', 1)[-1].lower() == name:
+            chars |= font_set
+            matched = True
+
+    if not matched:
+        return CharSet().union(*font_chars.values())
+    return chars | font_chars.get(None, CharSet())
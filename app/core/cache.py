@@ -0,0 +1,141 @@
+# RenPatch Scan Cache Module
+import os
+import json
+import hashlib
+
+from .charset import CharSet
+from .archive import open_file
+
+# Cache lives inside the scanned project so it travels with it
+CACHE_DIR = os.path.join(".renpatch", "cache")
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """
+    Content hash of a file (or .rpa archive member), read in chunks to keep memory flat.
+    Return: hex digest string.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open_file(file_path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ScanCache:
+    """
+    On-disk per-file cache of extracted characters.
+    Entries are keyed by project-relative path and validated by size, mtime and content hash:
+    - size + mtime unchanged: trusted without reading the file
+    - mtime changed but hash unchanged (e.g. touched by git checkout): reused
+    - otherwise: the file has to be rescanned
+    Entries of files not seen during a scan are dropped on save(), unless only part
+    of the project was scanned.
+    Subclasses cache other per-file results by overriding encode() / decode().
+    """
+    def __init__(self, project_dir, name="scan", version=1):
+        self.project_dir = project_dir
+        self.version = version
+        self.path = os.path.join(project_dir, CACHE_DIR, f"{name}.json")
+        self.entries = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def _key(self, file_path):
+        return os.path.relpath(file_path, self.project_dir).replace(os.sep, "/")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Entries written by another extractor version are stale
+            if data.get("version") == self.version:
+                self.entries = data.get("files", {})
+        except Exception as e:
+            print(f"Error loading scan cache {self.path}: {e}")
+            self.entries = {}
+
+    def encode(self, chars):
+        """
+        Return: the JSON-serializable form of a per-file result.
+        """
+        return CharSet(chars).to_string()
+
+    def decode(self, data):
+        """
+        Return: the per-file result stored by encode().
+        """
+        return CharSet(data)
+
+    def lookup(self, file_path, size, mtime):
+        """
+        Return: the cached result of the file, or None if it has to be rescanned.
+        """
+        key = self._key(file_path)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+
+        if entry and entry["size"] == size:
+            if entry["mtime"] == mtime:
+                self.hits += 1
+                return self.decode(entry["chars"])
+            try:
+                if entry["hash"] == hash_file(file_path):
+                    entry["mtime"] = mtime
+                    self.hits += 1
+                    return self.decode(entry["chars"])
+            except OSError:
+                pass
+
+        self.misses += 1
+        return None
+
+    def store(self, file_path, size, mtime, chars, digest=None):
+        key = self._key(file_path)
+        self.seen.add(key)
+        if digest is None:
+            digest = hash_file(file_path)
+        self.entries[key] = {
+            "size": size,
+            "mtime": mtime,
+            "hash": digest,
+            "chars": self.encode(chars)
+        }
+
+    def digest(self, file_path):
+        """
+        Return: the content hash stored for the file, or None.
+        """
+        entry = self.entries.get(self._key(file_path))
+        return entry["hash"] if entry else None
+
+    def save(self, prune=True):
+        """
+        Persist entries of the files seen since load, dropping deleted files.
+        prune: False keeps the entries of unseen files, for scans of a subset of the project.
+        """
+        if prune:
+            self.entries = {k: v for k, v in self.entries.items() if k in self.seen}
+        data = {"version": self.version, "files": self.entries}
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write then swap so an interrupted save never leaves a corrupt cache
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving scan cache {self.path}: {e}")
+
+class CountsCache(ScanCache):
+    """
+    Per-file cache of character occurrence counts ({character: count}).
+    """
+    def encode(self, counts):
+        return counts
+
+    def decode(self, data):
+        return data
@@ -0,0 +1,224 @@
+# RenPatch CharSet Module
+# Compact set of characters backed by a codepoint bitmap.
+import re
+
+# Set bit positions of every byte value, for fast iteration
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+# Non-empty stretches of the bitmap; lets iteration skip unused Unicode blocks
+_NONZERO = re.compile(rb'[^\x00]+')
+
+# int.bit_count() needs Python 3.10
+_popcount = getattr(int, "bit_count", None) or (lambda bits: bin(bits).count("1"))
+
+def _bits_from_codepoints(codepoints):
+    """
+    Build a bitmap int from codepoints without creating an int per insertion.
+    """
+    buffer = bytearray()
+    for codepoint in codepoints:
+        index = codepoint >> 3
+        if index >= len(buffer):
+            buffer.extend(bytes(index - len(buffer) + 1))
+        buffer[index] |= 1 << (codepoint & 7)
+    return int.from_bytes(buffer, 'little')
+
+def _set_bits(bits):
+    """
+    Yields: the positions of the set bits of a bitmap int, ascending.
+    """
+    for run in _NONZERO.finditer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        for index, byte in enumerate(run.group(), run.start()):
+            base = index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+def _bits_of(chars):
+    """
+    Bitmap of any iterable of characters (or another CharSet).
+    """
+    if isinstance(chars, CharSet):
+        return chars._bits
+    return _bits_from_codepoints(map(ord, chars))
+
+class CharSet:
+    """
+    Set of characters stored as a bitmap over Unicode codepoints (bit n = U+n).
+    - A CJK-heavy set of ~20k characters costs a few KB instead of a few MB of str objects
+    - Union, intersection and difference are word-wise big-int bit operations
+    - Iteration yields characters in codepoint order
+    Behaves like a set of one-character strings for the operations RenPatch uses,
+    and accepts any iterable of characters as the other operand.
+    """
+    __slots__ = ("_int", "_view")
+
+    def __init__(self, chars=()):
+        self._bits = _bits_of(chars)
+
+    # The bitmap; every change drops the byte view used for membership tests
+    @property
+    def _bits(self):
+        return self._int
+
+    @_bits.setter
+    def _bits(self, bits):
+        self._int = bits
+        self._view = None
+
+    ### CONSTRUCTORS ###
+
+    @classmethod
+    def from_codepoints(cls, codepoints):
+        """
+        Build from integer codepoints, e.g. the keys of a font cmap.
+        """
+        charset = cls()
+        charset._bits = _bits_from_codepoints(codepoints)
+        return charset
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """
+        Build from inclusive (first, last) codepoint ranges.
+        """
+        bits = 0
+        for first, last in ranges:
+            bits |= ((1 << (last - first + 1)) - 1) << first
+        charset = cls()
+        charset._bits = bits
+        return charset
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Build from the little-endian bitmap produced by to_bytes().
+        """
+        charset = cls()
+        charset._bits = int.from_bytes(data, 'little')
+        return charset
+
+    ### SERIALIZATION ###
+
+    def to_bytes(self):
+        """
+        Return: the bitmap as little-endian bytes (one bit per codepoint).
+        """
+        return self._bits.to_bytes((self._bits.bit_length() + 7) // 8, 'little')
+
+    def to_ranges(self):
+        """
+        Return: a list of inclusive (first, last) codepoint ranges.
+        """
+        # Only the boundary bits are walked: first and last bits of each run of set bits
+        bits = self._bits
+        return list(zip(_set_bits(bits & ~(bits << 1)), _set_bits(bits & ~(bits >> 1))))
+
+    def to_string(self):
+        """
+        Return: all characters joined in codepoint order.
+        """
+        return "".join(self)
+
+    ### ITERATION ###
+
+    def codepoints(self):
+        """
+        Yields: the codepoints in ascending order.
+        """
+        return _set_bits(self._bits)
+
+    def __iter__(self):
+        return map(chr, self.codepoints())
+
+    def __len__(self):
+        return _popcount(self._bits)
+
+    def __bool__(self):
+        return self._bits != 0
+
+    def __contains__(self, char):
+        # Shifting the int would copy the bitmap on every test: index its bytes instead,
+        # built once per change of the set
+        codepoint = char if isinstance(char, int) else ord(char)
+        view = self._view
+        if view is None:
+            view = self._view = self.to_bytes()
+        index = codepoint >> 3
+        return index < len(view) and view[index] >> (codepoint & 7) & 1 == 1
+
+    def __repr__(self):
+        preview = "".join(ch for _, ch in zip(range(20), self))
+        return f"CharSet({len(self)} chars: {preview!r}{'...' if len(self) > 20 else ''})"
+
+    ### SET OPERATIONS ###
+
+    def _new(self, bits):
+        charset = CharSet()
+        charset._bits = bits
+        return charset
+
+    def __or__(self, other):
+        return self._new(self._bits | _bits_of(other))
+
+    def __and__(self, other):
+        return self._new(self._bits & _bits_of(other))
+
+    def __sub__(self, other):
+        return self._new(self._bits & ~_bits_of(other))
+
+    def __xor__(self, other):
+        return self._new(self._bits ^ _bits_of(other))
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __rsub__(self, other):
+        return self._new(_bits_of(other) & ~self._bits)
+
+    def __ior__(self, other):
+        self._bits |= _bits_of(other)
+        return self
+
+    def __iand__(self, other):
+        self._bits &= _bits_of(other)
+        return self
+
+    def __isub__(self, other):
+        self._bits &= ~_bits_of(other)
+        return self
+
+    def __eq__(self, other):
+        if isinstance(other, (CharSet, set, frozenset)):
+            return self._bits == _bits_of(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def union(self, *others):
+        result = self.copy()
+        for other in others:
+            result |= other
+        return result
+
+    def intersection(self, other):
+        return self & other
+
+    def difference(self, other):
+        return self - other
+
+    def issubset(self, other):
+        return self._bits & ~_bits_of(other) == 0
+
+    def update(self, *others):
+        for other in others:
+            self |= other
+
+    def add(self, char):
+        # Rewrites the whole bitmap: build sets in bulk with from_codepoints() or |= instead
+        self._bits |= 1 << ord(char)
+
+    def discard(self, char):
+        self._bits &= ~(1 << ord(char))
+
+    def copy(self):
+        return self._new(self._bits)
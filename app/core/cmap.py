@@ -0,0 +1,188 @@
+# RenPatch Cmap Module
+# Minimal sfnt reader for coverage checks: memory-maps the font, walks the
+# table directory and decodes only the cmap subtables (formats 4, 12, 13 and
+# the variation selectors of format 14) straight into codepoint ranges.
+# Fonts it cannot read (WOFF, other cmap formats, broken tables) return None,
+# and callers fall back to fontTools.
+import sys
+import mmap
+import struct
+from array import array
+
+from .charset import CharSet
+from .archive import open_file, split_member_path
+
+# Unicode subtables in the order fontTools' getBestCmap() (and HarfBuzz) prefers them
+_PREFERENCES = ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0))
+# Unicode variation sequences subtable
+_VARIATIONS = (0, 5)
+_SFNT_VERSIONS = (b"\x00\x01\x00\x00", b"OTTO", b"true")
+_MAX_CODEPOINT = 0x10FFFF
+
+class CmapError(Exception):
+    pass
+
+def _uint16s(data, offset, count):
+    """
+    Return: count big-endian uint16 values as an array.
+    """
+    values = array('H', data[offset:offset + 2 * count])
+    if len(values) != count:
+        raise CmapError("cmap subtable out of bounds")
+    if sys.byteorder != "big":
+        values.byteswap()
+    return values
+
+def _table_offset(data, face, tag):
+    """
+    Return: the offset of a table of a font (face: index in a .ttc collection), or None.
+    """
+    start = 0
+    if data[:4] == b"ttcf":
+        count, = struct.unpack_from(">I", data, 8)
+        if face >= count:
+            raise CmapError(f"font collection has no face {face}")
+        start, = struct.unpack_from(">I", data, 12 + 4 * face)
+    elif face:
+        raise CmapError(f"not a font collection, no face {face}")
+    if data[start:start + 4] not in _SFNT_VERSIONS:
+        raise CmapError("not an sfnt font")
+    num_tables, = struct.unpack_from(">H", data, start + 4)
+    for index in range(num_tables):
+        record = start + 12 + 16 * index
+        if data[record:record + 4] == tag:
+            return struct.unpack_from(">I", data, record + 8)[0]
+    return None
+
+def _format_4(data, offset):
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    base = offset + 14
+    end_codes = _uint16s(data, base, seg_count)
+    start_codes = _uint16s(data, base + 2 * seg_count + 2, seg_count)
+    deltas = _uint16s(data, base + 4 * seg_count + 2, seg_count)
+    range_offsets_at = base + 6 * seg_count + 2
+    range_offsets = _uint16s(data, range_offsets_at, seg_count)
+
+    ranges = []
+    # Like fontTools, the last segment (0xFFFF) is not a mapping
+    for i in range(seg_count - 1):
+        start, end, delta = start_codes[i], end_codes[i], deltas[i]
+        if end < start:
+            continue
+        if range_offsets[i] == 0:
+            # Whole segment maps, except the one code that lands on glyph 0
+            notdef = (-delta) & 0xFFFF
+            if start <= notdef <= end:
+                ranges += [(start, notdef - 1), (notdef + 1, end)]
+            else:
+                ranges.append((start, end))
+            continue
+        # Glyph ids from the glyph index array, at idRangeOffset[i] bytes from idRangeOffset[i] itself
+        glyphs = _uint16s(data, range_offsets_at + 2 * i + range_offsets[i], end - start + 1)
+        run = None
+        for code, glyph in zip(range(start, end + 1), glyphs):
+            if glyph and (glyph + delta) & 0xFFFF:
+                if run is None:
+                    run = code
+            elif run is not None:
+                ranges.append((run, code - 1))
+                run = None
+        if run is not None:
+            ranges.append((run, end))
+    return [(first, last) for first, last in ranges if first <= last]
+
+def _format_12_13(data, offset, many_to_one):
+    count, = struct.unpack_from(">I", data, offset + 12)
+    groups = array('I', data[offset + 16:offset + 16 + 12 * count])
+    if len(groups) != 3 * count:
+        raise CmapError("cmap subtable out of bounds")
+    if sys.byteorder != "big":
+        groups.byteswap()
+
+    ranges = []
+    last_end = 0
+    # Same clamping and skipping of malformed groups as fontTools / HarfBuzz
+    for start, end, glyph in zip(*[iter(groups)] * 3):
+        end = min(end, _MAX_CODEPOINT)
+        if start > end or start < last_end:
+            continue
+        last_end = end
+        if glyph == 0:
+            # All of a format 13 group maps to the missing glyph, only the first code of format 12
+            if many_to_one:
+                continue
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+def _format_14(data, offset):
+    count, = struct.unpack_from(">I", data, offset + 6)
+    # varSelector is a uint24 at the start of each 11-byte record
+    return [
+        (selector, selector)
+        for selector in (
+            int.from_bytes(data[offset + 10 + 11 * i:offset + 13 + 11 * i], "big") for i in range(count)
+        )
+    ]
+
+def cmap_ranges(data, face=0):
+    """
+    Decode the codepoints a font maps from its raw bytes (bytes or mmap).
+    Picks the subtable getBestCmap() would, and adds the variation selectors
+    of a format 14 subtable: text using them renders with the font.
+    Return: a list of inclusive (first, last) ranges, or None when the font needs fontTools.
+    """
+    try:
+        cmap = _table_offset(data, face, b"cmap")
+        if cmap is None:
+            return None
+        num_tables, = struct.unpack_from(">H", data, cmap + 2)
+        subtables = {}
+        for index in range(num_tables):
+            platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * index)
+            # First subtable of each platform / encoding, like fontTools' getcmap()
+            subtables.setdefault((platform, encoding), cmap + offset)
+
+        ranges = None
+        for preference in _PREFERENCES:
+            if preference in subtables:
+                offset = subtables[preference]
+                subtable_format, = struct.unpack_from(">H", data, offset)
+                if subtable_format == 4:
+                    ranges = _format_4(data, offset)
+                elif subtable_format in (12, 13):
+                    ranges = _format_12_13(data, offset, subtable_format == 13)
+                else:
+                    return None
+                break
+        if ranges is None:
+            ranges = []
+
+        if _VARIATIONS in subtables:
+            offset = subtables[_VARIATIONS]
+            if struct.unpack_from(">H", data, offset)[0] == 14:
+                ranges += _format_14(data, offset)
+        return ranges
+    except (struct.error, CmapError, ValueError):
+        return None
+
+def read_cmap_ranges(font_path, face=0):
+    """
+    Read a font's coverage without fontTools: files on disk are memory-mapped,
+    .rpa archive members read whole.
+    Return: a CharSet, or None when the font needs fontTools.
+    """
+    if split_member_path(font_path) is not None:
+        with open_file(font_path) as f:
+            ranges = cmap_ranges(f.read(), face)
+    else:
+        with open(font_path, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file
+                return None
+            with data:
+                ranges = cmap_ranges(data, face)
+    return CharSet.from_ranges(ranges) if ranges is not None else None
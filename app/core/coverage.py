@@ -0,0 +1,194 @@
+# RenPatch Font Coverage Module
+# Persistent cache of the codepoints each font maps, shared by every project:
+# a font RenPatch has seen once is never parsed again for coverage checks.
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from .charset import CharSet
+from .cache import hash_file
+from .cmap import read_cmap_ranges
+from .fontpool import get_font_pool
+
+# Bump whenever the stored coverage could differ for the same font file
+COVERAGE_CACHE_VERSION = 2
+# Fonts kept in the cache; the least recently used are dropped beyond this
+MAX_FONTS = 1024
+
+def default_cache_path():
+    """
+    Return: the per-user cache file ($RENPATCH_CACHE_DIR, else the platform cache directory).
+    """
+    base = os.environ.get("RENPATCH_CACHE_DIR")
+    if not base:
+        if sys.platform == "win32":
+            base = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "RenPatch")
+        elif sys.platform == "darwin":
+            base = os.path.join(os.path.expanduser("~/Library/Caches"), "RenPatch")
+        else:
+            base = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "renpatch")
+    return os.path.join(base, "coverage.json")
+
+def read_cmap(font_path, face=0):
+    """
+    Parse the cmap of a font (face: index in a .ttc / .otc collection).
+    Uses the memory-mapped reader of cmap.py, and fontTools for fonts it cannot read.
+    Return: a CharSet of the mapped codepoints.
+    """
+    coverage = read_cmap_ranges(font_path, face)
+    if coverage is not None:
+        return coverage
+
+    # Shared read-only font from the pool, from disk or from inside an .rpa archive
+    font = get_font_pool().open(font_path, face)
+    # getBestCmap(): the most comprehensive Unicode table
+    coverage = CharSet.from_codepoints(font.getBestCmap() or {})
+    # Variation selectors the font handles, as cmap.py counts them
+    for table in font["cmap"].tables:
+        if table.format == 14:
+            coverage |= CharSet.from_codepoints(table.uvsDict)
+    return coverage
+
+class CoverageCache:
+    """
+    On-disk cache of font coverage.
+    - fonts: "<content hash>:<face index>" -> {"ranges": flat sorted [first, last, ...]
+      inclusive codepoint ranges, "used": last use time}
+    - paths: font path -> [size, mtime, content hash], so an unchanged file is not even hashed
+    Entries are keyed by content, so copies of a font in several projects share one.
+    hits / misses count lookups since load.
+    """
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        self.fonts = {}
+        self.paths = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Open batch() blocks, and whether a save was deferred by them
+        self.batches = 0
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == COVERAGE_CACHE_VERSION:
+                self.fonts = data.get("fonts", {})
+                self.paths = data.get("paths", {})
+        except Exception as e:
+            print(f"Error loading coverage cache {self.path}: {e}")
+            self.fonts, self.paths = {}, {}
+
+    def save(self):
+        if len(self.fonts) > MAX_FONTS:
+            keep = sorted(self.fonts, key=lambda key: self.fonts[key]["used"])[-MAX_FONTS:]
+            self.fonts = {key: self.fonts[key] for key in keep}
+            hashes = {key.rsplit(":", 1)[0] for key in keep}
+            self.paths = {path: entry for path, entry in self.paths.items() if entry[2] in hashes}
+        data = {"version": COVERAGE_CACHE_VERSION, "fonts": self.fonts, "paths": self.paths}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write then swap so an interrupted save never leaves a corrupt cache
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving coverage cache {self.path}: {e}")
+
+    def _changed(self):
+        # Call with the lock held
+        if self.batches:
+            self.dirty = True
+        else:
+            self.save()
+
+    @contextmanager
+    def batch(self):
+        """
+        Save once when the block exits instead of after every change,
+        e.g. while the fonts of a project are checked concurrently.
+        """
+        with self.lock:
+            self.batches += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batches -= 1
+                if not self.batches and self.dirty:
+                    self.dirty = False
+                    self.save()
+
+    def _digest(self, font_path):
+        """
+        Return: (content hash of a font, reused while its size and mtime are unchanged,
+                 whether the paths index changed).
+        Takes the lock only around the paths index: fonts checked concurrently hash in parallel.
+        """
+        try:
+            stat = os.stat(font_path)
+        except OSError:
+            # Archive member: hashed from inside the .rpa every time
+            return hash_file(font_path), False
+        key = os.path.abspath(font_path)
+        with self.lock:
+            entry = self.paths.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2], False
+        digest = hash_file(font_path)
+        with self.lock:
+            self.paths[key] = [stat.st_size, stat.st_mtime, digest]
+        return digest, True
+
+    def coverage(self, font_path, face=0):
+        """
+        Return: a CharSet of the codepoints the font maps, parsed only on a cache miss.
+        """
+        digest, moved = self._digest(font_path)
+        key = f"{digest}:{face}"
+        with self.lock:
+            entry = self.fonts.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry["used"] = time.time()
+                if moved:
+                    self._changed()
+                ranges = entry["ranges"]
+                return CharSet.from_ranges(zip(ranges[::2], ranges[1::2]))
+            self.misses += 1
+
+        coverage = read_cmap(font_path, face)
+        with self.lock:
+            self.fonts[key] = {
+                "ranges": [codepoint for pair in coverage.to_ranges() for codepoint in pair],
+                "used": time.time()
+            }
+            self._changed()
+        return coverage
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_coverage_cache():
+    """
+    Return: the process-wide CoverageCache, loaded on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CoverageCache()
+    return _cache
+
+def font_coverage(font_path, face=0):
+    """
+    Return: a CharSet of the codepoints a font maps, from the persistent cache.
+    """
+    return get_coverage_cache().coverage(font_path, face)
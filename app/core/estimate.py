@@ -0,0 +1,175 @@
+# RenPatch Estimate Module
+# First phase of a progressive scan: scans a sample of the project's script
+# bytes and extrapolates unique and missing character counts, so large
+# projects get numbers within about a second while the exact scan runs.
+import os
+import math
+import random
+from collections import Counter
+
+from .charset import CharSet
+from .lexer import Occurrences
+from .attribution import FontUsage, scan_font_usage, characters_for_font
+from .scanner import _scan_script_files
+from .project import CONFIG_FILES, SCRIPT_EXTENSIONS, get_project_index
+from .archive import split_member_path
+from .patcher import get_font_coverage
+
+# Script bytes scanned for an estimate
+SAMPLE_BYTES = 1024 * 1024
+# Projects with less script text than this are scanned exactly right away
+PROGRESSIVE_MIN_BYTES = 8 * 1024 * 1024
+# Slices read from a script too large to sample whole, spread over the file
+CHUNKS = 16
+
+def script_bytes(project):
+    """
+    Return: total size of the scripts and text sources of a ProjectIndex.
+    """
+    return sum(size for _, size, _ in project.scripts + project.sources)
+
+def _sample(files, sample_bytes):
+    """
+    Config files (font settings live there), then a seeded shuffle of the other files
+    until sample_bytes, so the sample is spread over the project and stable between runs.
+    A plain script larger than what is left of the budget is sampled in slices.
+    Return: a list of ((path, size, mtime), bytes to read or None for the whole file).
+    """
+    def is_config(record):
+        return os.path.basename(record[0]).lower() in CONFIG_FILES
+
+    config = [record for record in files if is_config(record)]
+    others = sorted(record for record in files if not is_config(record))
+    random.Random(0).shuffle(others)
+
+    sample = [(record, None) for record in config]
+    taken = sum(size for _, size, _ in config)
+    for record in others:
+        left = sample_bytes - taken
+        if left <= 0:
+            break
+        path, size, _ = record
+        if size <= left:
+            sample.append((record, None))
+        elif path.endswith(SCRIPT_EXTENSIONS) and split_member_path(path) is None:
+            sample.append((record, left))
+            size = left
+        else:
+            continue
+        taken += size
+    return sample
+
+def _scan_chunks(file_path, size, budget):
+    """
+    Scan CHUNKS evenly spaced slices of a script, cut to whole lines.
+    Return: (FontUsage, {character: count}).
+    """
+    usage = FontUsage()
+    counts = Counter()
+    length = max(budget // CHUNKS, 1)
+    with open(file_path, 'rb') as f:
+        for i in range(CHUNKS):
+            f.seek(size * i // CHUNKS)
+            data = f.read(length)
+            start = data.find(b"\n") + 1 if i else 0
+            end = data.rfind(b"\n") + 1
+            if end <= start:
+                continue
+            content = data[start:end].decode('utf-8', errors='ignore')
+            occurrences = Occurrences(content, lines=False, counts=True)
+            usage |= scan_font_usage(content, False, occurrences)
+            counts.update(occurrences.frequencies())
+    return usage, counts
+
+def _scan_sample(sample):
+    """
+    Yields: (FontUsage, {character: count}, bytes scanned) per sampled file, in sample order.
+    """
+    whole = [record for record, budget in sample if budget is None]
+    scanned = {
+        path: (found, counts)
+        for path, found, _, _, counts, _ in _scan_script_files(whole, parallel=False, mode="fonts", count=True)
+    }
+    for (path, size, _), budget in sample:
+        if budget is None:
+            found, counts = scanned[path]
+            yield found, counts or {}, size
+        else:
+            try:
+                yield (*_scan_chunks(path, size, budget), budget)
+            except OSError as e:
+                print(f"Error reading {path}: {e}")
+
+def _extrapolate(count, scale, exponent):
+    return round(count * scale ** exponent)
+
+def estimate_project(game_dir, project=None, font_paths=None, sample_bytes=SAMPLE_BYTES):
+    """
+    Estimated character counts of a project, from a sample of its scripts.
+    Unique characters grow sublinearly with text (Heaps' law): the growth exponent
+    is fitted between the first half of the sample and the whole sample, then used
+    to extrapolate to the project's total bytes. Missing characters of a font grow
+    at the rate the font misses characters seen only once in the sample, since the
+    characters still unseen are rare ones too.
+    font_paths: fonts to estimate; default every font of the project.
+    Return: {"unique_chars": estimated total,
+             "sampled_files", "sampled_bytes", "total_bytes", "exact": whether everything was scanned,
+             "fonts": {font path: {"total_chars", "missing_count"}} (estimated)}.
+    """
+    project = get_project_index(game_dir, project)
+    files = project.scripts + project.sources
+    total_bytes = sum(size for _, size, _ in files)
+    sample = _sample(files, sample_bytes)
+
+    usage = FontUsage()
+    half = CharSet()
+    half_bytes = sampled_bytes = 0
+    counts = Counter()
+    for found, file_counts, size in _scan_sample(sample):
+        usage |= found
+        counts.update(file_counts)
+        sampled_bytes += size
+        # First half of the sample, in scan order, for the growth exponent
+        if half_bytes < sample_bytes / 2:
+            half |= found.characters()
+            half_bytes += size
+
+    unique = usage.characters()
+    exact = sampled_bytes == total_bytes
+    if exact or not unique or sampled_bytes == 0:
+        scale, exponent = 1, 1
+    else:
+        scale = total_bytes / sampled_bytes
+        if half and 0 < half_bytes < sampled_bytes and len(unique) > len(half):
+            exponent = math.log(len(unique) / len(half)) / math.log(sampled_bytes / half_bytes)
+            exponent = min(max(exponent, 0.0), 1.0)
+        else:
+            exponent = 0.0
+
+    font_chars = usage.resolve()
+    fonts = {}
+    for font_path in font_paths if font_paths is not None else project.font_paths:
+        needed = characters_for_font(font_chars, font_path)
+        try:
+            coverage = get_font_coverage(font_path)
+        except Exception as e:
+            print(f"Error analyzing font {font_path}: {e}")
+            coverage = CharSet()
+        missing = needed - coverage
+        total = _extrapolate(len(needed), scale, exponent)
+        singletons = CharSet(char for char in needed if counts.get(char, 0) <= 1)
+        rare = singletons or needed
+        tail_rate = len(rare - coverage) / len(rare) if rare else 0
+        fonts[font_path] = {
+            "total_chars": total,
+            "missing_count": len(missing) + round((total - len(needed)) * tail_rate),
+        }
+
+    return {
+        "unique_chars": _extrapolate(len(unique), scale, exponent),
+        "sampled_files": len(sample),
+        "sampled_bytes": sampled_bytes,
+        "total_bytes": total_bytes,
+        "exact": exact,
+        "fonts": fonts,
+    }
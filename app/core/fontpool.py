@@ -0,0 +1,151 @@
+# RenPatch Font Pool Module
+# In-process pool of font files shared by the patch workflow: each font is read
+# once per session and handed out as a shared parsed TTFont (read-only use) or
+# as a private TTFont over the pooled bytes (subsetting mutates the font).
+# Private copies are parsed from memory rather than deep-copied: for a large CJK
+# font copy.deepcopy() of the parsed tables is an order of magnitude slower.
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from fontTools.ttLib import TTFont
+
+from .archive import open_file
+
+# Default cap on the memory held, read when a pool is created; least recently
+# used fonts are evicted beyond it
+FONT_POOL_BYTES = 256 * 1024 * 1024
+
+class _Entry:
+    __slots__ = ("stamp", "data", "fonts")
+
+    def __init__(self, stamp, data):
+        self.stamp = stamp
+        self.data = data
+        # Shared parsed fonts by face index
+        self.fonts = {}
+
+    def cost(self):
+        """
+        Return: the bytes the entry is counted for. A shared parsed font (tables
+                read so far, decompiled cmap, glyph order) is counted as large as
+                the file again: an estimate, fontTools keeps no tally.
+        """
+        return len(self.data) * (1 + len(self.fonts))
+
+class FontPool:
+    """
+    LRU pool of fonts keyed by path, checked against size and mtime on each use.
+    max_bytes: cap on the pooled font bytes and parsed fonts (the font in use is
+               always kept). Default: FONT_POOL_BYTES.
+    hits / misses / evictions count since creation; see stats().
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = FONT_POOL_BYTES if max_bytes is None else max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(font_path):
+        try:
+            stat = os.stat(font_path)
+            return stat.st_size, stat.st_mtime
+        except OSError:
+            # Archive member: the path is enough, archives are not rewritten during a session
+            return None
+
+    def _entry(self, font_path):
+        """
+        Return: the pooled entry of a font, read on a miss (call with the lock held).
+        """
+        key = os.path.abspath(font_path)
+        stamp = self._stamp(font_path)
+        entry = self.entries.get(key)
+        if entry is not None and entry.stamp == stamp:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        if entry is not None:
+            self.size -= entry.cost()
+            del self.entries[key]
+        with open_file(font_path) as f:
+            entry = _Entry(stamp, f.read())
+        self.entries[key] = entry
+        self.size += entry.cost()
+        self._evict()
+        return entry
+
+    def _evict(self):
+        # Least recently used first; evicted entries take their parsed fonts along
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.cost()
+            self.evictions += 1
+
+    def set_max_bytes(self, max_bytes):
+        """
+        Change the cap, evicting down to it.
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def open(self, font_path, face=0):
+        """
+        Return: a shared, lazily parsed TTFont. Do not modify or close it.
+        """
+        with self.lock:
+            entry = self._entry(font_path)
+            if face not in entry.fonts:
+                entry.fonts[face] = TTFont(io.BytesIO(entry.data), fontNumber=face, lazy=True)
+                self.size += len(entry.data)
+                self._evict()
+            return entry.fonts[face]
+
+    def open_copy(self, font_path, face=0):
+        """
+        Return: a private TTFont over the pooled bytes, free to modify (e.g. subset) and close.
+        """
+        with self.lock:
+            data = self._entry(font_path).data
+        return TTFont(io.BytesIO(data), fontNumber=face)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return: {"hits", "misses", "evictions", "fonts", "bytes"}, bytes as counted against the cap.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fonts": len(self.entries),
+            "bytes": self.size,
+        }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_font_pool(max_bytes=None):
+    """
+    max_bytes: if given, the cap of the pool from now on (see FontPool.set_max_bytes()).
+    Return: the process-wide FontPool, created on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FontPool(max_bytes)
+        elif max_bytes is not None:
+            _pool.set_max_bytes(max_bytes)
+    return _pool
@@ -0,0 +1,161 @@
+# RenPatch Formats Module
+# Extractor registry for text sources that are not Ren'Py scripts:
+# Python modules and the JSON / CSV / PO tables a localization pipeline imports.
+# Each extractor is a generator of (line, text) spans over the decoded file,
+# looked up by file extension. Ren'Py scripts (.rpy / .rpym / .rpyc) keep
+# going through the statement-aware extractors of the scan modes.
+import io
+import re
+import csv
+import ast
+import json
+import tokenize
+
+from .lexer import emit_literal, is_probably_path, new_sink, finish_sink
+
+# Extension -> (extractor name, span generator)
+FORMATS = {}
+
+def register_format(name, extensions):
+    """
+    Register a span generator for the given extensions, e.g.
+
+        @register_format("yaml", (".yml", ".yaml"))
+        def yaml_spans(content, displayable=False):
+            yield line, text
+
+    content: decoded file text. displayable: only yield text the player can see
+    (e.g. _() strings of Python code); yield nothing when the format cannot tell.
+    Re-registering an extension replaces its extractor, e.g. to scan JSON files
+    that are all dialogue in the displayable / fonts modes too.
+    Files with these extensions are picked up by ProjectIndex built afterwards.
+    Register at import time of a module, so scan worker processes know the format too.
+    """
+    def decorator(spans):
+        for extension in extensions:
+            FORMATS[extension.lower()] = (name, spans)
+        return spans
+    return decorator
+
+def format_of(file_path):
+    """
+    Return: (extractor name, span generator) for a file, or None if no format handles it.
+    """
+    dot = file_path.rfind(".")
+    return FORMATS.get(file_path[dot:].lower()) if dot != -1 else None
+
+def extract_spans(spans, vectorized=False, occurrences=None):
+    """
+    Collect the characters of (line, text) spans. Text goes through the same
+    tag / interpolation stripping as script literals; asset paths are skipped.
+    occurrences: optional lexer.Occurrences, records the line of each character.
+    Return: a CharSet.
+    """
+    chars = new_sink(vectorized)
+    for line, text in spans:
+        if not text or is_probably_path(text, 0, len(text), tags=True):
+            continue
+        emit_literal(text, 0, len(text), chars)
+        if occurrences is not None:
+            occurrences.line = line
+            emit_literal(text, 0, len(text), occurrences)
+    return finish_sink(chars)
+
+### BUILT-IN FORMATS ###
+
+# Ren'Py translation functions, as in statements._TRANSLATABLE
+_TRANSLATABLE_CALLS = {"_", "__", "_p"}
+# Tokens after which a string is a statement of its own (docstrings)
+_STATEMENT_START = {tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING}
+
+@register_format("python", (".py",))
+def python_spans(content, displayable=False):
+    """
+    String literals of a Python module, docstrings and bytes excluded.
+    displayable: only arguments of _() / __() / _p() calls.
+    """
+    previous = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(content).readline):
+            if token.type in (tokenize.COMMENT, tokenize.NL) and previous:
+                continue
+            if token.type == tokenize.STRING:
+                prefix = token.string[:token.string.find(token.string[-1])].lower()
+                if displayable:
+                    wanted = (len(previous) == 2 and previous[1].string == "("
+                              and previous[0].string in _TRANSLATABLE_CALLS)
+                else:
+                    wanted = bool(previous) and previous[-1].type not in _STATEMENT_START
+                if wanted and "b" not in prefix and "f" not in prefix:
+                    try:
+                        yield token.start[0], ast.literal_eval(token.string)
+                    except (ValueError, SyntaxError):
+                        pass
+            previous = (previous + [token])[-2:]
+    except (tokenize.TokenError, SyntaxError) as e:
+        print(f"Error tokenizing Python source: {e}")
+
+# A JSON string token, and whether it is an object key
+_JSON_STRING = re.compile(r'"(?:[^"\\\n]|\\.)*"(\s*:)?')
+
+@register_format("json", (".json",))
+def json_spans(content, displayable=False):
+    """
+    String values of a JSON document; object keys are ids, not text.
+    displayable: nothing, values are mostly config keys, ids and asset tables.
+    """
+    if displayable:
+        return
+    line, pos = 1, 0
+    for match in _JSON_STRING.finditer(content):
+        if match.group(1):
+            continue
+        line += content.count("\n", pos, match.start())
+        pos = match.start()
+        try:
+            yield line, json.loads(match.group(0))
+        except ValueError:
+            pass
+
+@register_format("csv", (".csv", ".tsv"))
+def csv_spans(content, displayable=False):
+    """
+    Every non-empty cell of a CSV (or tab-separated) table.
+    displayable: nothing, cells are as often ids and asset names as text.
+    """
+    if displayable:
+        return
+    header = content.split("\n", 1)[0]
+    delimiter = "\t" if header.count("\t") > header.count(",") else ","
+    reader = csv.reader(io.StringIO(content), delimiter=delimiter)
+    line = 1
+    for row in reader:
+        for cell in row:
+            if cell.strip():
+                yield line, cell
+        line = reader.line_num + 1
+
+# msgid / msgid_plural / msgstr / msgstr[n] and their continuation lines
+_PO_ENTRY = re.compile(r'^(?:(?:msgid|msgid_plural|msgctxt|msgstr(?:\[\d+\])?)\s+)?"(.*)"\s*$')
+_PO_ESCAPE = re.compile(r'\\(.)')
+_PO_ESCAPES = {"n": "\n", "t": "\t", "r": "", "a": "", "b": "", "f": "", "v": ""}
+
+@register_format("po", (".po", ".pot"))
+def po_spans(content, displayable=False):
+    """
+    Source and translated strings of a gettext catalog; msgctxt is skipped.
+    displayable: only the translations (msgstr), the text the player reads.
+    """
+    keyword = None
+    for line, text in enumerate(content.split("\n"), 1):
+        text = text.strip()
+        if not text or text.startswith("#"):
+            continue
+        match = _PO_ENTRY.match(text)
+        if match is None:
+            continue
+        if not text.startswith('"'):
+            keyword = text.split(None, 1)[0]
+        if keyword == "msgctxt" or (displayable and not (keyword or "").startswith("msgstr")):
+            continue
+        yield line, _PO_ESCAPE.sub(lambda m: _PO_ESCAPES.get(m.group(1), m.group(1)), match.group(1))
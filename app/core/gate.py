@@ -0,0 +1,168 @@
+# RenPatch Gate Module
+# Pre-commit / CI check: scans only the scripts a git change touches and
+# stops at the first displayable character the primary (lite) font has to
+# render but lacks. Text in {font=...} tags or assigned to other fonts by the
+# config files (gui.rpy, screens.rpy, options.rpy) is left to those fonts.
+import os
+import subprocess
+
+from .charset import CharSet
+from .lexer import Occurrences
+from .attribution import FontUsage, scan_font_usage, characters_for_font
+from .project import SCRIPT_EXTENSIONS, CONFIG_FILES
+from .patcher import get_font_coverage
+from .scanner import _parse_config_fonts
+
+class GateError(Exception):
+    pass
+
+def _git(repo_dir, *args, input=None):
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_dir, *args], input=input, capture_output=True, check=True
+        )
+    except FileNotFoundError:
+        raise GateError("git not found")
+    except subprocess.CalledProcessError as e:
+        raise GateError(f"git {args[0]} failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
+
+def _range_end(rev):
+    """
+    Return: the revision a diff range ends at ("A..B" / "A...B", HEAD when B is empty),
+            or None for a single revision, which git diffs against the work tree.
+    """
+    for separator in ("...", ".."):
+        if separator in rev:
+            return rev.split(separator, 1)[1] or "HEAD"
+    return None
+
+def _read_blobs(root, paths, source):
+    """
+    Read files as of the index (source ""), a revision, or the work tree (source None).
+    Yields: (path, decoded content).
+    """
+    if source is None:
+        for path in paths:
+            with open(os.path.join(root, path), 'rb') as f:
+                yield path, _decode(f.read())
+        return
+
+    # One git process for every blob
+    batch = _git(root, "cat-file", "--batch", input="".join(f"{source}:{path}\n" for path in paths).encode("utf-8"))
+    pos = 0
+    for path in paths:
+        header_end = batch.index(b"\n", pos)
+        header = batch[pos:header_end].split()
+        if header[-1] == b"missing":
+            raise GateError(f"{path} is not in {source or 'the index'}")
+        size = int(header[2])
+        raw = batch[header_end + 1:header_end + 1 + size]
+        pos = header_end + 1 + size + 1
+        yield path, _decode(raw)
+
+def _source(rev):
+    # Staged changes are read from the index, ranges at their end, single revisions from the work tree
+    return "" if rev is None else _range_end(rev)
+
+def changed_scripts(repo_dir, rev=None):
+    """
+    Scripts added or modified by a change, with their content.
+    rev: None for the staged changes (pre-commit), read from the index;
+         a range such as "origin/main...HEAD" (CI), read at the end of the range;
+         a single revision, diffed against and read from the work tree.
+    Yields: (path relative to the repository root, decoded content).
+    """
+    root = _git(repo_dir, "rev-parse", "--show-toplevel").decode().strip()
+    diff = ["diff", "--name-only", "-z", "--diff-filter=ACMR"]
+    diff += ["--cached"] if rev is None else [rev]
+    paths = [path for path in _git(root, *diff).decode("utf-8").split("\0")
+             if path.endswith(SCRIPT_EXTENSIONS)]
+    if paths:
+        yield from _read_blobs(root, paths, _source(rev))
+
+def font_settings(repo_dir, rev=None):
+    """
+    gui / style font settings of the repository's config files, read from the
+    same place as changed_scripts() reads the scripts.
+    Return: a FontUsage holding only settings and aliases.
+    """
+    root = _git(repo_dir, "rev-parse", "--show-toplevel").decode().strip()
+    source = _source(rev)
+    if source:
+        listing = _git(root, "ls-tree", "-r", "-z", "--name-only", source)
+    else:
+        listing = _git(root, "ls-files", "-z")
+    paths = [path for path in listing.decode("utf-8").split("\0") if path.rsplit("/", 1)[-1] in CONFIG_FILES]
+
+    settings = FontUsage()
+    for _, content in _read_blobs(root, paths, source):
+        # Same parse as resolve_font_roles(), init python assignments included
+        settings |= _parse_config_fonts(content)[0]
+    return settings
+
+def _decode(raw):
+    return raw.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+def _uncovered(content, coverage, font_path, settings):
+    """
+    Return: a CharSet of the characters the font has to render in content but lacks.
+    """
+    usage = scan_font_usage(content)
+    if settings is not None:
+        usage |= settings
+    if font_path is None:
+        needed = usage.characters()
+    else:
+        needed = characters_for_font(usage.resolve(), font_path)
+    return needed - coverage
+
+def first_uncovered(content, coverage, font_path=None, settings=None):
+    """
+    font_path: the font being checked; text attributed to other fonts ({font=} tags,
+               gui / style settings) is skipped. None checks all displayable text.
+    settings: FontUsage with the project's font settings, see font_settings().
+    Return: (line, character) of the first character the font renders but lacks, or None.
+    """
+    # Most changed files are fine: check the set first, locate only on failure
+    uncovered = _uncovered(content, coverage, font_path, settings)
+    if not uncovered:
+        return None
+
+    # Lines holding an uncovered character, some perhaps only in text of another font
+    occurrences = Occurrences(content)
+    scan_font_usage(content, occurrences=occurrences)
+    uncovered = set(uncovered.codepoints())
+    candidates = sorted({line for codepoint, line in zip(*occurrences.result()) if codepoint in uncovered})
+
+    # The first candidate whose script prefix already fails: statements keep their context
+    text_lines = content.split("\n")
+    def prefix(line):
+        return "\n".join(text_lines[:line])
+    low, high = 0, len(candidates) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if _uncovered(prefix(candidates[middle]), coverage, font_path, settings):
+            high = middle
+        else:
+            low = middle + 1
+    line = candidates[low]
+    chars = _uncovered(prefix(line), coverage, font_path, settings) or CharSet(map(chr, uncovered))
+    text = text_lines[line - 1]
+    return line, min(chars, key=lambda char: (text.find(char) == -1, text.find(char)))
+
+def check_changes(repo_dir, font_path, rev=None):
+    """
+    Scan the changed scripts of a repository against a font, stopping at the first failure.
+    Return: (path, line, character) of the first uncovered character, or None if all are covered.
+    """
+    # Persistent coverage cache: the font is only parsed after it changed
+    coverage = get_font_coverage(font_path)
+    settings = None
+    for path, content in changed_scripts(repo_dir, rev):
+        if settings is None:
+            settings = font_settings(repo_dir, rev)
+        found = first_uncovered(content, coverage, font_path, settings)
+        if found is not None:
+            return (path, *found)
+    return None
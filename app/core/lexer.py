@@ -0,0 +1,524 @@
+# RenPatch Lexer Module
+# Single-pass extraction of characters from Ren'Py string literals.
+# Every offset of the input is visited a bounded number of times, so the
+# scan stays linear even on unterminated quotes, tags or interpolations.
+#
+# The same walk runs on decoded text (str) or on raw UTF-8 (bytes / mmap).
+# All delimiters are ASCII, so on raw UTF-8 they can be found without
+# decoding; only the text runs inside literals are ever decoded.
+import re
+import mmap
+import codecs
+import hashlib
+from array import array
+from collections import Counter
+
+from .charset import CharSet
+
+# Optional: vectorized codepoint reduction
+try:
+    import numpy as np
+except ImportError:
+    np = None
+HAS_NUMPY = np is not None
+
+# Heuristic pre-filtering
+ignored_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.ogg', '.mp3', '.wav', '.rpy', '.otf', '.ttf')
+# Enough trailing text to test a literal against ignored_extensions
+_PATH_TAIL = 16
+_PATH_MIN = max(len(ext) for ext in ignored_extensions)
+
+# Longest run of raw bytes decoded in one go
+DECODE_CHUNK = 1024 * 1024
+
+class _Syntax:
+    """
+    Delimiters and compiled patterns for one input type (str or bytes).
+    """
+    def __init__(self, kind):
+        def lit(text):
+            return text if kind is str else text.encode('ascii')
+
+        def pattern(text, flags=0):
+            return re.compile(lit(text), flags)
+
+        self.is_text = kind is str
+        self.quotes = (lit('"'), lit("'"))
+        self.backslash, self.newline = lit('\\'), lit('\n')
+        self.tag_open, self.tag_close = lit('{'), lit('}')
+        self.interpolation_open, self.interpolation_close = lit('['), lit(']')
+        self.dot, self.slash, self.n = lit('.'), lit('/'), lit('n')
+        self.hash = lit('#')
+        self.markup_open = (self.tag_open, self.interpolation_open)
+
+        # Next opening quote, or opening quote / comment start
+        self.quote = pattern(r'["\']')
+        self.quote_or_comment = pattern(r'["\'#]')
+        # Body of a single/double quoted literal with backslash escapes.
+        # The pattern is unambiguous, so matching it never backtracks.
+        self.body = {
+            lit('"'): pattern(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL),
+            lit("'"): pattern(r"[^'\\]*(?:\\.[^'\\]*)*", re.DOTALL),
+        }
+        # Characters that start markup inside a literal: {tag}, [interpolation], \escape
+        self.markup = pattern(r'[{\[\\]')
+        # Whole literal is a single whitespace-separated word
+        self.single_word = pattern(r'\s*\S+\s*')
+        # Fast path for short, plain {tag} / [interpolation] markup. The bounded
+        # length keeps each attempt O(1); anything else takes the general path.
+        self.short_tag = pattern(r'\{[^}\n]{0,64}\}')
+        self.short_interpolation = pattern(r'\[[^\]\n{]{0,64}\]')
+
+    def text(self, content, start, end, errors='strict'):
+        """
+        Decoded text of content[start:end].
+        """
+        if self.is_text:
+            return content[start:end]
+        return content[start:end].decode('utf-8', errors)
+
+    def update(self, chars, content, start, end):
+        """
+        Add the characters of content[start:end] to chars.
+        Raw runs longer than DECODE_CHUNK are decoded piecewise, so a huge
+        literal never needs more than one chunk of decoded text in memory;
+        the incremental decoder stitches characters split at chunk edges.
+        """
+        if self.is_text:
+            chars.update(content[start:end])
+        elif end - start <= DECODE_CHUNK:
+            chars.update(content[start:end].decode('utf-8'))
+        else:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for chunk_start in range(start, end, DECODE_CHUNK):
+                chunk_end = min(chunk_start + DECODE_CHUNK, end)
+                chars.update(decoder.decode(content[chunk_start:chunk_end], chunk_end == end))
+
+_TEXT = _Syntax(str)
+_BYTES = _Syntax(bytes)
+
+def _syntax_of(content):
+    return _TEXT if isinstance(content, str) else _BYTES
+
+def iter_literals(content, skip_comments=False):
+    """
+    Walk the text once and find every string literal.
+    Triple quotes are tried first, then single/double quotes with escapes.
+    skip_comments: ignore everything from a # outside a literal to the end of its line.
+    Yields: (start, end, width) per literal: body offsets, quotes excluded,
+            and the width of its quote delimiter (1 or 3).
+    """
+    syntax = _syntax_of(content)
+    opener = syntax.quote_or_comment if skip_comments else syntax.quote
+    pos = 0
+    # Once a closing delimiter is missing from one opener to the end of the
+    # text, every later opener of the same kind fails too. Remember it instead
+    # of searching to the end of the text again for each of them.
+    dead = set()
+
+    while True:
+        match = opener.search(content, pos)
+        if not match:
+            return
+
+        start = match.start()
+        quote = content[start:start + 1]
+        if quote == syntax.hash:
+            pos = content.find(syntax.newline, start)
+            if pos == -1:
+                return
+            continue
+        triple = quote * 3
+
+        if triple not in dead and content[start:start + 3] == triple:
+            close = content.find(triple, start + 3)
+            if close != -1:
+                yield start + 3, close, 3
+                pos = close + 3
+                continue
+            dead.add(triple)
+
+        if quote not in dead:
+            end = syntax.body[quote].match(content, start + 1).end()
+            if content[end:end + 1] == quote:
+                yield start + 1, end, 1
+                pos = end + 1
+                continue
+            dead.add(quote)
+
+        # Unterminated: the quote is plain text
+        pos = start + 1
+
+def is_probably_path(content, start, end, tags=False):
+    """
+    Skip literals that look like asset paths, e.g. "images/bg.png".
+    tags: the slash of a closing {/tag} does not make a single word a path.
+    Return: True if the literal should be ignored.
+    """
+    syntax = _syntax_of(content)
+
+    # Ends with an asset extension (only the tail is inspected).
+    # Without a dot near the end, only trailing whitespace could hide one.
+    tail_start = max(start, end - _PATH_TAIL)
+    if content.find(syntax.dot, tail_start, end) != -1 or not content[end - 1:end].isalnum():
+        # A tail cut from raw UTF-8 may start mid-character: drop that part
+        tail = syntax.text(content, tail_start, end, errors='ignore').rstrip()
+        if len(tail) < _PATH_MIN and tail_start > start:
+            # Long run of trailing whitespace: fall back to the whole literal
+            tail = syntax.text(content, start, end).rstrip()
+        if tail.lower().endswith(ignored_extensions):
+            return True
+
+    # Single word with slash likely a path
+    if content.find(syntax.slash, start, end) != -1:
+        if tags and content.find(syntax.tag_open, start, end) != -1:
+            return False
+        if syntax.is_text or content[start:end].isascii():
+            return syntax.single_word.fullmatch(content, start, end) is not None
+        # Byte patterns only know ASCII whitespace: check the decoded text
+        return _TEXT.single_word.fullmatch(syntax.text(content, start, end)) is not None
+
+    return False
+
+class _Lookahead:
+    """
+    Cached "next occurrence of char at or after pos" lookups within one literal.
+    An answer found from offset origin holds for any pos in [origin, found],
+    so repeated lookups over the same stretch of text stay linear overall.
+    """
+    __slots__ = ("content", "end", "syntax", "found", "interpolation_fail")
+
+    def __init__(self, content, end, syntax):
+        self.content = content
+        self.end = end
+        self.syntax = syntax
+        self.found = {}
+        # Every [ before this offset is known to be unclosed
+        self.interpolation_fail = -1
+
+    def next(self, char, pos):
+        origin, found = self.found.get(char, (0, -1))
+        if not origin <= pos <= found:
+            found = self.content.find(char, pos, self.end)
+            if found == -1:
+                found = self.end
+            self.found[char] = (pos, found)
+        return found
+
+def _tag_end(ahead, mark):
+    """
+    Offset of the } closing the {tag} at mark on the same line, or -1.
+    """
+    syntax = ahead.syntax
+    close = ahead.next(syntax.tag_close, mark + 1)
+    return close if close < ahead.next(syntax.newline, mark + 1) else -1
+
+def _interpolation_end(ahead, mark):
+    """
+    Offset of the ] closing the [interpolation] at mark on the same line, or -1.
+    Tags are stripped before interpolation, so a ] inside a {tag} does not count.
+    """
+    if mark < ahead.interpolation_fail:
+        return -1
+    syntax = ahead.syntax
+    newline = ahead.next(syntax.newline, mark + 1)
+    pos = mark + 1
+    while True:
+        close = ahead.next(syntax.interpolation_close, pos)
+        if close >= newline:
+            # Any later [ on this line fails the same way
+            ahead.interpolation_fail = newline
+            return -1
+        tag = ahead.next(syntax.tag_open, pos)
+        if tag > close:
+            return close
+        tag_end = _tag_end(ahead, tag)
+        pos = tag + 1 if tag_end == -1 else tag_end + 1
+
+def emit_literal(content, start, end, chars):
+    """
+    Add the characters of one literal body to chars, skipping Ren'Py markup:
+    - {tags} and [interpolation] closed on the same line
+    - \\" and \\' (kept as quotes) and \\n (dropped)
+    Plain runs between markup are added without further processing.
+    """
+    syntax = _syntax_of(content)
+    is_text = syntax.is_text
+    pos = start
+    ahead = None
+
+    while True:
+        match = syntax.markup.search(content, pos, end)
+        if not match:
+            if is_text:
+                chars.update(content[pos:end])
+            else:
+                syntax.update(chars, content, pos, end)
+            return
+
+        mark = match.start()
+        if mark > pos:
+            if is_text:
+                chars.update(content[pos:mark])
+            else:
+                syntax.update(chars, content, pos, mark)
+        char = content[mark:mark + 1]
+
+        if char == syntax.tag_open:
+            short = syntax.short_tag.match(content, mark, end)
+        elif char == syntax.interpolation_open:
+            short = syntax.short_interpolation.match(content, mark, end)
+        else:
+            short = None
+        if short:
+            pos = short.end()
+            continue
+
+        if ahead is None:
+            ahead = _Lookahead(content, end, syntax)
+
+        if char == syntax.backslash:
+            # Escapes are resolved after markup is stripped: look past any markup that follows
+            escaped = mark + 1
+            while escaped < end and content[escaped:escaped + 1] in syntax.markup_open:
+                if content[escaped:escaped + 1] == syntax.tag_open:
+                    close = _tag_end(ahead, escaped)
+                else:
+                    close = _interpolation_end(ahead, escaped)
+                if close == -1:
+                    break
+                escaped = close + 1
+
+            escaped_char = content[escaped:escaped + 1] if escaped < end else None
+            if escaped_char in syntax.quotes:
+                syntax.update(chars, content, escaped, escaped + 1)
+                pos = escaped + 1
+            elif escaped_char == syntax.n:
+                pos = escaped + 1
+            else:
+                chars.add('\\')
+                pos = escaped
+            continue
+
+        if char == syntax.tag_open:
+            close = _tag_end(ahead, mark)
+        else:
+            close = _interpolation_end(ahead, mark)
+
+        if close == -1:
+            syntax.update(chars, content, mark, mark + 1)
+            pos = mark + 1
+        else:
+            # Complete {tag} / [interpolation]: skip it
+            pos = close + 1
+
+def new_sink(vectorized=False):
+    """
+    Container that emit_literal adds characters to.
+    Return: a CodepointBuffer when vectorized and NumPy is installed, else a set.
+    """
+    return CodepointBuffer() if vectorized and np is not None else set()
+
+def finish_sink(chars):
+    """
+    Return: the visible characters of a sink from new_sink() as a CharSet.
+    """
+    if isinstance(chars, CodepointBuffer):
+        return chars.to_charset()
+    return visible_characters(chars)
+
+def extract_characters(content, vectorized=False, occurrences=None):
+    """
+    Extract the displayable characters from the text of a Ren'Py script.
+    content: decoded text, or raw UTF-8 bytes / mmap.
+    vectorized: reduce the literal text with NumPy instead of per-character
+                set insertion (ignored when NumPy is not installed).
+    occurrences: optional Occurrences of the same content, records where each character is.
+    Return: a CharSet of unique characters in the text.
+    """
+    chars = new_sink(vectorized)
+    for start, end, _ in iter_literals(content):
+        if start == end or is_probably_path(content, start, end):
+            continue
+        emit_literal(content, start, end, chars)
+        if occurrences is not None:
+            occurrences.record(start, end)
+    return finish_sink(chars)
+
+# Characters already classified by visible_characters, shared across files
+_VISIBLE = set()
+_HIDDEN = set()
+
+def visible_characters(chars):
+    """
+    Drop whitespace and control characters from a set of characters.
+    Each distinct character is classified once per process; after that
+    filtering is a pair of C-level set operations.
+    Return: a CharSet.
+    """
+    for char in chars - _VISIBLE - _HIDDEN:
+        if not char.isspace() and char.isprintable():
+            _VISIBLE.add(char)
+        else:
+            _HIDDEN.add(char)
+    return CharSet(chars - _HIDDEN)
+
+### VECTORIZED REDUCTION ###
+
+# Buffered characters before they are folded into the codepoint mask
+VECTOR_FLUSH = 4 * 1024 * 1024
+_UNICODE_SIZE = 0x110000
+_visible_table = None
+
+def _visible_codepoints():
+    """
+    Lookup table over all of Unicode: True where the codepoint is printable and not whitespace.
+    Built once per process (same rule as visible_characters).
+    """
+    global _visible_table
+    if _visible_table is None:
+        _visible_table = np.fromiter(
+            (not chr(cp).isspace() and chr(cp).isprintable() for cp in range(_UNICODE_SIZE)),
+            dtype=bool, count=_UNICODE_SIZE
+        )
+    return _visible_table
+
+class CodepointBuffer:
+    """
+    Set-like sink for emit_literal that gathers literal text into a buffer.
+    The buffer is periodically viewed as a UInt32 codepoint array and scattered
+    into a boolean mask, so memory stays bounded and no per-character Python
+    objects are created.
+    """
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.seen = np.zeros(_UNICODE_SIZE, dtype=bool)
+
+    def update(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= VECTOR_FLUSH:
+            self.flush()
+
+    add = update
+
+    def flush(self):
+        if self.parts:
+            codepoints = np.frombuffer("".join(self.parts).encode('utf-32-le'), dtype='<u4')
+            self.seen[codepoints] = True
+            self.parts = []
+            self.size = 0
+
+    def to_charset(self):
+        """
+        Return: a CharSet of the visible characters seen so far.
+        The mask is packed straight into the CharSet bitmap.
+        """
+        self.flush()
+        visible = self.seen & _visible_codepoints()
+        return CharSet.from_bytes(np.packbits(visible, bitorder='little').tobytes())
+
+### PROVENANCE ###
+
+def _count(content, sub, start, end):
+    # mmap has find() but no count()
+    if isinstance(content, mmap.mmap):
+        return content[start:end].count(sub)
+    return content.count(sub, start, end)
+
+class Occurrences:
+    """
+    Where characters occur in one script, as compact parallel arrays:
+    codepoints[i] is on line lines[i] (1-based).
+    Each literal passed to record() is emitted once more with line tracking;
+    a character is recorded once per run of text on a line.
+    lines: keep the (codepoint, line) arrays, see result().
+    counts: also count every occurrence of every character, see frequencies().
+    """
+    def __init__(self, content, lines=True, counts=False):
+        self.content = content
+        self.syntax = _syntax_of(content)
+        self.track_lines = lines
+        self.counts = Counter() if counts else None
+        self.codepoints = array('I')
+        self.lines = array('I')
+        # Line number at offset pos
+        self.pos = 0
+        self.line = 1
+
+    def record(self, start, end):
+        """
+        Record the characters of the literal body content[start:end].
+        Literals must be recorded in order.
+        """
+        if not self.track_lines:
+            emit_literal(self.content, start, end, self)
+            return
+        newline = self.syntax.newline
+        self.line += _count(self.content, newline, self.pos, start)
+        first_line = self.line
+        emit_literal(self.content, start, end, self)
+        self.line = first_line + _count(self.content, newline, start, end)
+        self.pos = end
+
+    def update(self, text):
+        if self.counts is not None:
+            self.counts.update(text)
+        if not self.track_lines:
+            return
+        codepoints, lines = self.codepoints, self.lines
+        line = self.line
+        for index, part in enumerate(text.split('\n')):
+            if index:
+                line += 1
+            for char in set(part):
+                codepoints.append(ord(char))
+                lines.append(line)
+        self.line = line
+
+    add = update
+
+    def frequencies(self):
+        """
+        Return: {character: occurrence count}, whitespace and control characters dropped.
+        """
+        visible = set(visible_characters(set(self.counts)))
+        return {char: count for char, count in self.counts.items() if char in visible}
+
+    def result(self):
+        """
+        Return: (codepoints, lines) arrays, whitespace and control characters dropped.
+        """
+        # A plain set for the per-occurrence test
+        visible = set(visible_characters(set(map(chr, set(self.codepoints)))).codepoints())
+        codepoints, lines = array('I'), array('I')
+        for codepoint, line in zip(self.codepoints, self.lines):
+            if codepoint in visible:
+                codepoints.append(codepoint)
+                lines.append(line)
+        return codepoints, lines
+
+def extract_file_characters(file_path, vectorized=False, extractor=None, record=False, count=False):
+    """
+    Extract characters from a script of any size without reading it into memory.
+    The file is memory-mapped and scanned as raw UTF-8; only literal text is decoded,
+    so memory stays bounded by DECODE_CHUNK and the pages the OS keeps resident.
+    extractor: extraction function taking (content, vectorized, occurrences);
+               default extract_characters.
+    record: also record character occurrences.
+    count: also count how often each character occurs.
+    Return: (CharSet of unique characters, content hash, (codepoints, lines) or None,
+             {character: count} or None).
+    """
+    extractor = extractor or extract_characters
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+            occurrences = Occurrences(content, record, count) if record or count else None
+            result = extractor(content, vectorized, occurrences)
+            return (
+                result, digest,
+                occurrences.result() if record else None,
+                occurrences.frequencies() if count else None
+            )
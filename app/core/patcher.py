@@ -1,38 +1,40 @@
 # RenPatch Patcher Module
 import os
+import re
 import json
 import unicodedata
-from fontTools.ttLib import TTFont
 from fontTools import subset
 
+from .charset import CharSet
+from .coverage import font_coverage
+from .fontpool import get_font_pool
+
+# Occurrences listed per character in the missing report
+REPORT_LOCATIONS = 10
+# Share of all character occurrences the hot tier patch font covers
+HOT_TIER_COVERAGE = 0.9
+
 ### EXTRACTOR ###
+def get_font_coverage(font_path, face=0):
+    """
+    Reads the characters a font has glyphs for.
+    The cmap is only parsed the first time a font (by content) is seen, see coverage.py.
+    face: index of the font in a .ttc / .otc collection.
+    Return: a CharSet of the font's cmap.
+    """
+    return font_coverage(font_path, face)
+
 # Extract missing chars in lite font
 def get_missing_characters(found_chars, lite_font_path):
     """
     Identifies characters in found_chars but missing from the lite_font.
-    Return: a set of diff / missing characters.
+    Return: a CharSet of diff / missing characters.
     """
-    missing_chars = set()
+    missing_chars = CharSet()
     
     try:
-        # Load the Lite font (Set: A)
-        font = TTFont(lite_font_path)
-        
-        # Get cmap table
-        # Use getBestCmap() to get most comprehensive Unicode-compatible table
-        unicode_map = font.getBestCmap() 
-        
-        # unicode_map
-        # keys: Unicode ordinals (int)
-        # values: glyph names
-        
-        for char in found_chars:
-            # use ord() to convert character to its Unicode int ID
-            # O(1)
-            if ord(char) not in unicode_map:
-                missing_chars.add(char)
-                
-        font.close()
+        # Bitmap difference instead of a per-character lookup
+        missing_chars = CharSet(found_chars) - get_font_coverage(lite_font_path)
              
     except Exception as e:
         print(f"Error analyzing font {lite_font_path}: {e}")
@@ -40,10 +42,11 @@ def get_missing_characters(found_chars, lite_font_path):
     return missing_chars
 
 # Generate Report of Missing Characters
-def save_missing_report(missing_chars, font_name, output_dir="."):
+def save_missing_report(missing_chars, font_name, output_dir=".", provenance=None):
     """
     Generates a JSON report of missing characters in the specified directory.
     Default: 'missing_characters_report.json' in current directory.
+    provenance: optional ProvenanceIndex; adds where each character is used.
     """
     if not missing_chars:
         return
@@ -61,12 +64,17 @@ def save_missing_report(missing_chars, font_name, output_dir="."):
 
         wiki_link = f"https://www.compart.com/en/unicode/{hex_code}"
         
-        json_data.append({
+        entry = {
             "char": char,
             "hex": hex_code,
             "name": name,
             "wiki_link": wiki_link
-        })
+        }
+        if provenance is not None:
+            locations = provenance.files_using(char)
+            entry["occurrences"] = len(locations)
+            entry["locations"] = [f"{path}:{line}" for path, line in locations[:REPORT_LOCATIONS]]
+        json_data.append(entry)
 
     # Save to JSON
     output_path = os.path.join(output_dir, "missing_characters_report.json")
@@ -83,17 +91,14 @@ def save_missing_report(missing_chars, font_name, output_dir="."):
 def verify_patch(target_chars, patch_path):
     """
     Checks the generated patch to see which characters actually made it in.
-    Return: sets of success and failed characters.
+    Return: CharSets of success and failed characters.
     """
+    target_chars = CharSet(target_chars)
     if not os.path.exists(patch_path):
-        return set()
-
-    patch_font = TTFont(patch_path)
-    patch_cmap = patch_font.getBestCmap()
-    patch_font.close()
+        return CharSet(), target_chars
 
     # Characters that are successfully in the patch
-    success_chars = {c for c in target_chars if ord(c) in patch_cmap}
+    success_chars = target_chars & get_font_coverage(patch_path)
     failed_chars = target_chars - success_chars
 
     return success_chars, failed_chars
@@ -105,7 +110,7 @@ def generate_patch_font(missing_chars, full_font_path, output_path):
     Return: Bool, success chars, failed chars
     """
     if not missing_chars:
-        return True, set(), set()
+        return True, CharSet(), CharSet()
 
     try:
         # Config subsetter options
@@ -113,8 +118,8 @@ def generate_patch_font(missing_chars, full_font_path, output_path):
         # Keep glyph names
         options.notdef_outline = True
         
-        # Load full font and do subsetting
-        font = TTFont(full_font_path)
+        # Load full font (a private copy from the font pool) and do subsetting
+        font = get_font_pool().open_copy(full_font_path)
         subsetter = subset.Subsetter(options=options)
         text_to_extract = "".join(list(missing_chars)) # conver to list
         subsetter.populate(text=text_to_extract)
@@ -144,24 +149,73 @@ def generate_patch_font(missing_chars, full_font_path, output_path):
 
     except Exception as e:
         print(f"Error generating patch font: {e}")
-        return False, set(), missing_chars
+        return False, CharSet(), CharSet(missing_chars)
     
 ### MULTI-SOURCE PATCHING ###
 
-def generate_multi_patch(missing_chars, donor_paths, output_dir):
+def split_tiers(chars, frequencies, coverage=HOT_TIER_COVERAGE):
+    """
+    Splits characters by how often they occur: the hot tier is the smallest set of
+    the most used characters that accounts for `coverage` of all their occurrences,
+    the cold tier is the long tail. Characters without a count are cold.
+    frequencies: {character: occurrence count}, e.g. from get_unique_characters().
+    Return: (hot CharSet, cold CharSet)
+    """
+    ranked = sorted(chars, key=lambda char: (-frequencies.get(char, 0), ord(char)))
+    total = sum(frequencies.get(char, 0) for char in ranked)
+    hot = []
+    covered = 0
+    for char in ranked:
+        if covered >= total * coverage or not frequencies.get(char, 0):
+            break
+        hot.append(char)
+        covered += frequencies[char]
+    hot = CharSet(hot)
+    return hot, CharSet(chars) - hot
+
+def _subset_font(chars, donor_path, output_path):
+    """
+    Saves the glyphs of chars from a donor font as a subset font.
+    Return: (success chars, failed chars) as found in the saved font.
+    """
+    options = subset.Options()
+    options.notdef_outline = True
+
+    # Subsetting modifies the font: work on a private copy, the donor bytes stay pooled
+    donor_font = get_font_pool().open_copy(donor_path)
+    subsetter = subset.Subsetter(options=options)
+    subsetter.populate(text="".join(list(chars)))
+    subsetter.subset(donor_font)
+    donor_font.save(output_path)
+    donor_font.close()
+
+    return verify_patch(chars, output_path)
+
+def generate_multi_patch(missing_chars, donor_paths, output_dir, prefix="patch", frequencies=None,
+                         hot_coverage=HOT_TIER_COVERAGE):
     """
     Tries to find missing characters across a prioritized list of donor fonts.
-    Generates one subset font per donor if used.
+    Generates one subset font per donor if used, named <prefix>_<donor index>.ttf.
+
+    frequencies: optional {character: occurrence count}. Splits each donor's patch into
+      a small <prefix>_<donor index>_hot.ttf holding the most used characters (see
+      split_tiers()) and a <prefix>_<donor index>_cold.ttf for the long tail, so the
+      font the game loads first for most lines stays small. Hot patches come first.
     
     Returns:
-        patches_info (list): [{ "filename": "patch_0.ttf", "chars": set(...) }, ...]
-        failed_chars (set): Chars not found in any donor.
+        patches_info (list): [{ "filename": "patch_0.ttf", "chars": CharSet(...),
+                                "tier": "hot" / "cold" / None }, ...]
+        failed_chars (CharSet): Chars not found in any donor.
     """
     if not missing_chars:
-        return [], set()
+        return [], CharSet()
 
-    remaining_chars = set(missing_chars)
+    remaining_chars = CharSet(missing_chars)
     patches_info = []
+    hot_chars = None
+    if frequencies:
+        hot_chars, _ = split_tiers(remaining_chars, frequencies, hot_coverage)
+        print(f"Hot tier: {len(hot_chars)} of {len(remaining_chars)} chars")
     
     print(f"\n--- Starting Multi-Patch Generation ({len(donor_paths)} donors) ---")
 
@@ -173,60 +227,157 @@ def generate_multi_patch(missing_chars, donor_paths, output_dir):
         
         try:
             # 1. Check which needed chars are in this donor
-            font = TTFont(donor_path)
-            cmap = font.getBestCmap() # Unicode map
-            
-            chars_found_in_donor = set()
-            for char in remaining_chars:
-                if ord(char) in cmap:
-                    chars_found_in_donor.add(char)
-            font.close()
+            chars_found_in_donor = remaining_chars & get_font_coverage(donor_path)
             
             if not chars_found_in_donor:
                 print("  No useful characters found.")
                 continue
-                
-            # 2. Generate a subset for these characters
-            patch_filename = f"patch_{i}.ttf"
-            output_path = os.path.join(output_dir, patch_filename)
-            
-            # Using the existing single-font generator logic, but specifying exact chars
-            # We call the subsetter directly to avoid redundancy
-            
-            options = subset.Options()
-            options.notdef_outline = True
-            
-            donor_font = TTFont(donor_path)
-            subsetter = subset.Subsetter(options=options)
-            text_to_extract = "".join(list(chars_found_in_donor))
-            subsetter.populate(text=text_to_extract)
-            subsetter.subset(donor_font)
-            donor_font.save(output_path)
-            donor_font.close()
-            
-            # 3. Verify
-            success, failed_verify = verify_patch(chars_found_in_donor, output_path)
-            
-            print(f"  Generated {patch_filename} with {len(success)} chars.")
-            
-            if success:
-                patches_info.append({
-                    "filename": patch_filename,
-                    "chars": success,
-                    "source": os.path.basename(donor_path)
-                })
-                # Update remaining
-                remaining_chars -= success
+
+            if hot_chars is None:
+                tiers = [(None, chars_found_in_donor)]
+            else:
+                tiers = [("hot", chars_found_in_donor & hot_chars), ("cold", chars_found_in_donor - hot_chars)]
+
+            for tier, tier_chars in tiers:
+                if not tier_chars:
+                    continue
+                # 2. Generate a subset for these characters, then verify it
+                patch_filename = f"{prefix}_{i}.ttf" if tier is None else f"{prefix}_{i}_{tier}.ttf"
+                output_path = os.path.join(output_dir, patch_filename)
+                success, failed_verify = _subset_font(tier_chars, donor_path, output_path)
+
+                print(f"  Generated {patch_filename} with {len(success)} chars.")
+
+                if success:
+                    patches_info.append({
+                        "filename": patch_filename,
+                        "chars": success,
+                        "source": os.path.basename(donor_path),
+                        "tier": tier
+                    })
+                    # Update remaining
+                    remaining_chars -= success
                 
         except Exception as e:
             print(f"Error processing donor {donor_path}: {e}")
             continue
 
+    # Hot tier first, donor priority within a tier
+    patches_info.sort(key=lambda patch: patch["tier"] == "cold")
     return patches_info, remaining_chars
 
+def generate_locale_patches(locale_missing, donor_paths, output_dir, frequencies=None):
+    """
+    Runs generate_multi_patch once per language, so each locale gets its own
+    patch fonts (patch_<language>_<donor index>.ttf), split into tiers by
+    frequencies if given.
+    locale_missing: {language: CharSet of missing characters}, from the
+                    languages map of the scanner (None is the base language).
+    The base language is patched first; its patch fonts are chained into every
+    locale's FontGroup (see generate_renpy_script()), so a locale only patches
+    the characters the base patches do not already hold.
+    Returns:
+        {language: (patches_info, failed_chars)} for every language; languages
+        with nothing missing get ([], CharSet()).
+    """
+    locale_patches = {}
+    base_patched = CharSet()
+    for language in sorted(locale_missing, key=lambda language: language is not None):
+        missing_chars = locale_missing[language]
+        if language is not None:
+            missing_chars = CharSet(missing_chars) - base_patched
+        if not missing_chars:
+            locale_patches[language] = ([], CharSet())
+            continue
+        prefix = "patch" if language is None else f"patch_{_locale_id(language)}"
+        print(f"\n=== Locale: {language or 'base language'} ===")
+        locale_patches[language] = generate_multi_patch(
+            missing_chars, donor_paths, output_dir, prefix, frequencies
+        )
+        if language is None:
+            base_patched = CharSet().union(*(patch["chars"] for patch in locale_patches[None][0]))
+    # Caller's language order
+    return {language: locale_patches[language] for language in locale_missing}
+
 ### FONT PACTCH SCRIPT ###
 
-def generate_renpy_script(patches_list, failed_chars, lite_font_filename, output_path, log_path=None):
+def _locale_id(language):
+    # tl/ folder names are identifiers in practice, keep generated names safe anyway
+    return re.sub(r'\W', '_', language)
+
+def _char_log(chars):
+    return [
+        {"char": char, "hex": f"U+{ord(char):04X}", "name": unicodedata.name(char, "Unknown")}
+        for char in sorted(list(chars), key=lambda x: ord(x))
+    ]
+
+def _patch_lines(group_name, patches_list):
+    """
+    Return: the init python lines adding each patch font's characters to a FontGroup.
+    """
+    script_lines = []
+    for patch in patches_list:
+        filename = patch['filename']
+        source = patch.get('source', '')
+        tier = f", {patch['tier']} tier" if patch.get('tier') else ""
+        chars = sorted(list(patch['chars']), key=lambda x: ord(x))
+        
+        script_lines.append(f"    # From: {source} ({len(chars)} chars{tier})")
+        
+        for char in chars:
+            hex_code_py = hex(ord(char))
+            hex_code_display = f"U+{ord(char):04X}"
+            # Add individual char mapping
+            script_lines.append(f"    {group_name} = {group_name}.add('{filename}', {hex_code_py}, {hex_code_py}) # {char} ({hex_code_display})")
+        
+        script_lines.append("")
+    return script_lines
+
+def _font_group_lines(group_name, patches_list, failed_chars, lite_font_filename, base_patches=None):
+    """
+    base_patches: patches of the base language, chained after patches_list in a locale's group:
+                  untranslated lines and base-script strings (Character names, menus...) show
+                  in every language. The first font added for a character wins.
+    Return: the init python lines building one FontGroup.
+    """
+    script_lines = [
+        "    # Initialize the FontGroup",
+        f"    {group_name} = FontGroup()"
+    ]
+    
+    # 1. Add Patches
+    if patches_list:
+        script_lines.append("")
+        script_lines.append("    # --- Patch Fonts ---")
+        script_lines += _patch_lines(group_name, patches_list)
+
+    if base_patches:
+        script_lines.append("")
+        script_lines.append("    # --- Base Language Patch Fonts ---")
+        script_lines += _patch_lines(group_name, base_patches)
+    
+    # 2. Add Failed Chars Comments
+    if failed_chars:
+        script_lines.append("    # === FAILED TO PATCH CHARACTERS ===")
+        script_lines.append("    # The following characters were NOT found in any donor fonts.")
+        
+        sorted_failed = sorted(list(failed_chars), key=lambda x: ord(x))
+        for char in sorted_failed:
+            hex_code = f"U+{ord(char):04X}"
+            try:
+                name = unicodedata.name(char)
+            except ValueError:
+                name = "Unknown"
+            script_lines.append(f"    # FAILED: {char} ({hex_code}) - {name}")
+
+    # 3. Fallback to Lite Font
+    script_lines.append("")
+    script_lines.append("    # Use Lite font for all the other characters")
+    script_lines.append(f"    {group_name} = {group_name}.add('{lite_font_filename}', 0x0000, 0xffff)")
+    return script_lines
+
+def generate_renpy_script(patches_list, failed_chars, lite_font_filename, output_path, log_path=None,
+                          locales=None):
     """
     Creates a drop-in .rpy script.
     
@@ -234,50 +385,50 @@ def generate_renpy_script(patches_list, failed_chars, lite_font_filename, output
       - filename: "patch_0.ttf"
       - chars: set of characters
       - source: "SourceHanSans.otf" (optional metadata)
+      - tier: "hot" / "cold" (optional); patches are added to the FontGroup in list order
     
     failed_chars: Set of characters that couldn't be patched.
+
+    locales: optional {language: (patches_list, failed_chars)} from generate_locale_patches().
+      Each language gets its own FontGroup (its patches, then the base language's),
+      and "renpatch_style" is switched to it by a translate <language> python block,
+      so players only load the patch fonts of the language they play in and the
+      base language. patches_list / failed_chars are then the base language's
+      (translate None).
     """
-    
-    success_count = sum(len(p['chars']) for p in patches_list)
-    total_needed = success_count + len(failed_chars)
+    locales = {language: patches for language, patches in (locales or {}).items() if language is not None}
+    all_patches = [(patches_list, failed_chars)] + list(locales.values())
+    success_count = sum(len(p['chars']) for patches, _ in all_patches for p in patches)
+    failed_count = sum(len(failed) for _, failed in all_patches)
+    total_needed = success_count + failed_count
     
     if total_needed == 0:
         return False
     
     ## Generate Log File ##
     if log_path:
-        log_patches = []
-        for p in patches_list:
-            char_data = []
-            for char in sorted(list(p['chars']), key=lambda x: ord(x)):
-                char_data.append({
-                    "char": char,
-                    "hex": f"U+{ord(char):04X}",
-                    "name": unicodedata.name(char, "Unknown")
-                })
-            log_patches.append({
+        def patch_log(patches):
+            return [{
                 "filename": p['filename'],
                 "source": p.get('source', 'Unknown'),
-                "chars": char_data
-            })
-
-        failed_data = []
-        for char in sorted(list(failed_chars), key=lambda x: ord(x)):
-            failed_data.append({
-                "char": char,
-                "hex": f"U+{ord(char):04X}",
-                "name": unicodedata.name(char, "Unknown")
-            })
+                "tier": p.get('tier'),
+                "chars": _char_log(p['chars'])
+            } for p in patches]
 
         log_data = {
-            "patches": log_patches,
-            "failed": failed_data,
+            "patches": patch_log(patches_list),
+            "failed": _char_log(failed_chars),
             "lite_font_filename": lite_font_filename,
             "summary": {
                 "patched": success_count,
-                "failed": len(failed_chars)
+                "failed": failed_count
             }
         }
+        if locales:
+            log_data["locales"] = {
+                language: {"patches": patch_log(patches), "failed": _char_log(failed)}
+                for language, (patches, failed) in locales.items()
+            }
         try:
             with open(log_path, "w", encoding="utf-8") as f:
                 json.dump(log_data, f, ensure_ascii=False, indent=4)
@@ -289,57 +440,41 @@ def generate_renpy_script(patches_list, failed_chars, lite_font_filename, output
     script_lines = [
         "# --- RenPatch Auto-Generated Integration ---",
         f"# Patched Characters: {success_count}",
-        f"# Failed Characters: {len(failed_chars)}",
+        f"# Failed Characters: {failed_count}",
         "",
         "init python:",
-        "    # Initialize the FontGroup",
-        "    renpatch_font = FontGroup()"
     ]
-    
-    # 1. Add Patches
-    if patches_list:
-        script_lines.append("")
-        script_lines.append("    # --- Patch Fonts ---")
+    script_lines += _font_group_lines("renpatch_font", patches_list, failed_chars, lite_font_filename)
 
-        for patch in patches_list:
-            filename = patch['filename']
-            source = patch.get('source', '')
-            chars = sorted(list(patch['chars']), key=lambda x: ord(x))
-            
-            script_lines.append(f"    # From: {source} ({len(chars)} chars)")
-            
-            for char in chars:
-                hex_code_py = hex(ord(char))
-                hex_code_display = f"U+{ord(char):04X}"
-                # Add individual char mapping
-                script_lines.append(f"    renpatch_font = renpatch_font.add('{filename}', {hex_code_py}, {hex_code_py}) # {char} ({hex_code_display})")
-            
-            script_lines.append("")
-    
-    # 2. Add Failed Chars Comments
-    if failed_chars:
-        script_lines.append("    # === FAILED TO PATCH CHARACTERS ===")
-        script_lines.append("    # The following characters were NOT found in any donor fonts.")
-        
-        sorted_failed = sorted(list(failed_chars), key=lambda x: ord(x))
-        for char in sorted_failed:
-            hex_code = f"U+{ord(char):04X}"
-            try:
-                name = unicodedata.name(char)
-            except ValueError:
-                name = "Unknown"
-            script_lines.append(f"    # FAILED: {char} ({hex_code}) - {name}")
-
-    # 3. Fallback to Lite Font
-    script_lines.append("")
-    script_lines.append("    # Use Lite font for all the other characters")
-    script_lines.append(f"    renpatch_font = renpatch_font.add('{lite_font_filename}', 0x0000, 0xffff)")
+    # 4. Per-locale groups; languages with nothing to patch share the base group
+    group_names = {}
+    for language, (locale_patches, locale_failed) in locales.items():
+        if not locale_patches and not locale_failed:
+            group_names[language] = "renpatch_font"
+            continue
+        group_names[language] = f"renpatch_font_{_locale_id(language)}"
+        script_lines.append("")
+        script_lines.append(f"    # === Locale: {language} ===")
+        script_lines += _font_group_lines(
+            group_names[language], locale_patches, locale_failed, lite_font_filename, base_patches=patches_list
+        )
     
-    # 4. Config Map
+    # 5. Config Map
     script_lines.append("")
     script_lines.append('    # Map the group to "renpatch_style" for use')
     script_lines.append("    config.font_name_map['renpatch_style'] = renpatch_font")
 
+    # 6. Switch groups with the language; FontGroup members are only loaded when used
+    if locales:
+        script_lines.append("")
+        script_lines.append("# Each language maps \"renpatch_style\" to its own patch fonts")
+        script_lines.append("translate None python:")
+        script_lines.append("    config.font_name_map['renpatch_style'] = renpatch_font")
+        for language, group_name in group_names.items():
+            script_lines.append("")
+            script_lines.append(f"translate {language} python:")
+            script_lines.append(f"    config.font_name_map['renpatch_style'] = {group_name}")
+
     try:
         with open(output_path, "w", encoding="utf-8") as f:
             f.write("\n".join(script_lines))
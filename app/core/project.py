@@ -0,0 +1,255 @@
+# RenPatch Project Module
+# One os.scandir traversal of a project, shared by the whole scan workflow.
+import os
+import re
+import copy
+import fnmatch
+
+from .archive import ARCHIVE_EXTENSION, open_archive, member_path
+from .formats import format_of
+
+# Config files analyze_font_role looks into
+CONFIG_FILES = ("gui.rpy", "screens.rpy", "options.rpy")
+SCRIPT_EXTENSIONS = (".rpy", ".rpym")
+# Compiled scripts are only scanned when their source is not shipped
+COMPILED_EXTENSIONS = (".rpyc", ".rpymc")
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+# Subtrees that never hold scripts or fonts worth scanning:
+# VCS / tool folders, Ren'Py runtime output, bulky asset folders (pruned
+# unlisted: traversal is the main cost on network storage), and the Ren'Py
+# SDK itself (anchored to the root: only when the SDK folder gets picked).
+DEFAULT_EXCLUDE = (
+    ".*", "__pycache__",
+    "cache", "saves", "log",
+    "images", "audio", "music", "sound", "sounds", "voice", "movies", "video",
+    "renpy/", "lib/", "launcher/", "tutorial/", "the_question/",
+)
+
+def _compile_globs(patterns):
+    """
+    Compile glob patterns into two regexes: one for patterns without a slash,
+    matched against entry names at any depth, one for patterns with a slash,
+    matched against project-relative POSIX paths.
+    Return: (name regex or None, path regex or None).
+    """
+    names = [fnmatch.translate(os.path.normcase(p)) for p in patterns if "/" not in p]
+    paths = [fnmatch.translate(os.path.normcase(p.strip("/"))) for p in patterns if "/" in p]
+    return (
+        re.compile("|".join(names)) if names else None,
+        re.compile("|".join(paths)) if paths else None,
+    )
+
+def _kind(name, names):
+    """
+    What an entry is to RenPatch; names are the entries next to it.
+    Return: "script", "archive", "font", "source" or None.
+    """
+    if name.endswith(SCRIPT_EXTENSIONS):
+        return "script"
+    if name.endswith(COMPILED_EXTENSIONS):
+        return "script" if name[:-1] not in names else None
+    lower = name.lower()
+    if lower.endswith(ARCHIVE_EXTENSION):
+        return "archive"
+    if lower.endswith(FONT_EXTENSIONS):
+        return "font"
+    if format_of(lower) is not None:
+        return "source"
+    return None
+
+def _matches(globs, name, rel_path):
+    name_regex, path_regex = globs
+    return (
+        (name_regex is not None and name_regex.match(os.path.normcase(name)) is not None)
+        or (path_regex is not None and path_regex.match(os.path.normcase(rel_path)) is not None)
+    )
+
+class ProjectIndex:
+    """
+    Files of a project directory that RenPatch cares about, found in a single
+    os.scandir traversal (same top-down order as os.walk, symlinked directories
+    not followed). Only scripts, sources and fonts are stat'ed; images, audio and
+    everything else are just skipped by name.
+    - scripts: (path, size, mtime) of every .rpy / .rpym file, and of every
+      .rpyc / .rpymc file whose source is not next to it (games often ship
+      compiled scripts only)
+    - sources: (path, size, mtime) of every file a registered format reads
+      (.py, .json, .csv, .po ..., see formats.py)
+    - fonts: (path, size, mtime) of every .ttf / .otf file
+    - config_files: {name: path} of the first gui.rpy / screens.rpy / options.rpy found
+    - archives: (path, size, mtime) of every .rpa archive; their scripts, sources
+      and fonts are listed above as member paths (archive path + member name), with the
+      member size and the archive mtime
+
+    exclude: glob patterns of directories / files to skip. Patterns without a
+             slash match names at any depth ("cache"), others match paths
+             relative to root ("game/tl/*", "renpy/"). Matching directories are
+             pruned before descent. Default: DEFAULT_EXCLUDE.
+    include: glob patterns, same syntax, that win over exclude, e.g.
+             include=("images",) to also index fonts kept under images/.
+    pruned_dirs / skipped_entries count the directories and script / source / font
+    files the rules left out; directories lists the ones traversed.
+    """
+    def __init__(self, root, include=(), exclude=DEFAULT_EXCLUDE):
+        self.root = root
+        self._rules = (include, exclude)
+        self.include = _compile_globs(include)
+        self.exclude = _compile_globs(exclude)
+        self.scripts = []
+        self.sources = []
+        self.fonts = []
+        self.config_files = {}
+        self.archives = []
+        self.directories = []
+        self.dir_count = 0
+        self.entry_count = 0
+        self.pruned_dirs = 0
+        self.skipped_entries = 0
+        # Set on subsets: the index does not hold every file of the project
+        self.partial = False
+        self._scan()
+
+    def _excluded(self, name, rel_path):
+        return _matches(self.exclude, name, rel_path) and not _matches(self.include, name, rel_path)
+
+    @staticmethod
+    def _stat(entry):
+        try:
+            stat = entry.stat()
+            return (entry.path, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return (entry.path, 0, 0)
+
+    def _scan(self):
+        pending = [(self.root, "")]
+        while pending:
+            directory, rel_dir = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError:
+                # Unreadable directories are skipped, like os.walk does
+                continue
+            self.dir_count += 1
+            self.directories.append(directory)
+            self.entry_count += len(entries)
+
+            subdirs = []
+            names = {entry.name for entry in entries}
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    rel_path = rel_dir + name
+                    if self._excluded(name, rel_path):
+                        self.pruned_dirs += 1
+                    elif not entry.is_symlink():
+                        subdirs.append((entry.path, rel_path + "/"))
+                    continue
+
+                # Only scripts, sources, fonts and archives are checked against the rules
+                kind = _kind(name, names)
+                if kind is None:
+                    continue
+                if self._excluded(name, rel_dir + name):
+                    self.skipped_entries += 1
+                elif kind == "script":
+                    self._add_script(self._stat(entry))
+                elif kind == "archive":
+                    self._add_archive(self._stat(entry))
+                elif kind == "font":
+                    self.fonts.append(self._stat(entry))
+                else:
+                    self.sources.append(self._stat(entry))
+
+            # Depth-first, subdirectories in listing order
+            pending.extend(reversed(subdirs))
+
+    def _add_script(self, record):
+        self.scripts.append(record)
+        name = os.path.basename(record[0])
+        if name.endswith(COMPILED_EXTENSIONS):
+            name = name[:-1]
+        if name in CONFIG_FILES:
+            self.config_files.setdefault(name, record[0])
+
+    def _add_archive(self, record):
+        self.archives.append(record)
+        archive_path, _, mtime = record
+        try:
+            archive = open_archive(archive_path)
+        except Exception as e:
+            print(f"Error reading archive {archive_path}: {e}")
+            return
+        names = set(archive.names())
+        for name in archive.names():
+            kind = _kind(name, names)
+            if kind is None or kind == "archive":
+                continue
+            member = (member_path(archive_path, name), archive.size(name), mtime)
+            if kind == "script":
+                self._add_script(member)
+            elif kind == "font":
+                self.fonts.append(member)
+            else:
+                self.sources.append(member)
+
+    def rescan(self):
+        """
+        Return: a fresh ProjectIndex of the same root with the same include / exclude rules.
+        """
+        return ProjectIndex(self.root, *self._rules)
+
+    def subset(self, paths):
+        """
+        Return: a copy of the index whose scripts and sources are limited to the given
+                files and the contents of the given directories (or .rpa archives).
+                Paths are absolute or relative to the root.
+        """
+        prefixes = [os.path.normpath(os.path.join(self.root, path)) for path in paths]
+
+        def wanted(record):
+            path = os.path.normpath(record[0])
+            return any(path == prefix or path.startswith(prefix + os.sep) for prefix in prefixes)
+
+        project = copy.copy(self)
+        project.scripts = [record for record in self.scripts if wanted(record)]
+        project.sources = [record for record in self.sources if wanted(record)]
+        project.partial = True
+        return project
+
+    @property
+    def script_paths(self):
+        return [path for path, _, _ in self.scripts]
+
+    @property
+    def source_paths(self):
+        return [path for path, _, _ in self.sources]
+
+    @property
+    def font_paths(self):
+        return [path for path, _, _ in self.fonts]
+
+def language_of(file_path, root):
+    """
+    Language of a file from its place under tl/<language>/ (archive members included).
+    Return: the language name, or None for the base language (tl/None too).
+    """
+    parts = os.path.relpath(file_path, root).replace(os.sep, "/").split("/")
+    for index, part in enumerate(parts[:-2]):
+        if part == "tl":
+            language = parts[index + 1]
+            return None if language == "None" else language
+    return None
+
+def get_project_index(base_dir, project=None):
+    """
+    Return: project if given (must index base_dir), else a fresh ProjectIndex
+            of base_dir with the default exclusions.
+    """
+    return project if project is not None else ProjectIndex(base_dir)
@@ -0,0 +1,148 @@
+# RenPatch Provenance Module
+# SQLite index of where each character occurs: (codepoint, file, line).
+# Filled during the scan, so "which files use U+94E4" or "which characters
+# does chapter3.rpy introduce" are answered without rescanning the project.
+import os
+import sqlite3
+
+from .cache import CACHE_DIR
+from .charset import CharSet
+
+# Bump whenever the schema or the recorded occurrences change
+PROVENANCE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT
+);
+-- Clustered by file so a file's rows are appended in one stretch;
+-- the codepoint index covers lookups by character.
+CREATE TABLE IF NOT EXISTS occurrences (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    codepoint INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    PRIMARY KEY (file_id, codepoint, line)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS occurrences_by_codepoint ON occurrences (codepoint);
+"""
+
+class ProvenanceIndex:
+    """
+    Per-project occurrence index stored in <project>/.renpatch/cache/<name>.sqlite.
+    Files are keyed by project-relative path and kept current by size and mtime;
+    rows of files not seen during a scan are dropped by finish(),
+    which also commits everything stored since the index was opened.
+    """
+    def __init__(self, project_dir, name="provenance"):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, CACHE_DIR, f"{name}.sqlite")
+        self.seen = set()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self._check_version()
+        self.db.executescript(_SCHEMA)
+
+    def _check_version(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != PROVENANCE_VERSION:
+            # Rows written by another version are stale
+            self.db.executescript("DROP TABLE IF EXISTS occurrences; DROP TABLE IF EXISTS files;")
+            self.db.execute(f"PRAGMA user_version = {PROVENANCE_VERSION}")
+
+    def _key(self, file_path):
+        return os.path.relpath(file_path, self.project_dir).replace(os.sep, "/")
+
+    def _file_id(self, file_path):
+        # Queries take absolute paths or the project-relative paths files_using() returns
+        key = self._key(file_path) if os.path.isabs(file_path) else file_path.replace(os.sep, "/")
+        row = self.db.execute("SELECT id FROM files WHERE path = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    ### UPDATES ###
+
+    def is_current(self, file_path, size, mtime):
+        """
+        Return: True if the occurrences of the file are indexed and up to date.
+        """
+        key = self._key(file_path)
+        self.seen.add(key)
+        row = self.db.execute("SELECT size, mtime FROM files WHERE path = ?", (key,)).fetchone()
+        return row is not None and row == (size, mtime)
+
+    def store(self, file_path, size, mtime, occurrences, digest=None):
+        """
+        Replace the indexed occurrences of a file.
+        occurrences: (codepoints, lines) arrays from lexer.Occurrences.result().
+        """
+        key = self._key(file_path)
+        self.seen.add(key)
+        codepoints, lines = occurrences
+        self.db.execute("DELETE FROM files WHERE path = ?", (key,))
+        file_id = self.db.execute(
+            "INSERT INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+            (key, size, mtime, digest)
+        ).lastrowid
+        # Deduplicated and in key order, rows go straight into the B-tree
+        rows = sorted(set(zip(codepoints, lines)))
+        self.db.executemany(
+            "INSERT INTO occurrences (file_id, codepoint, line) VALUES (?, ?, ?)",
+            ((file_id, codepoint, line) for codepoint, line in rows)
+        )
+
+    def finish(self, prune=True):
+        """
+        Drop files not seen since the index was opened (deleted or renamed scripts)
+        and commit.
+        prune: False keeps unseen files, for scans of a subset of the project.
+        """
+        if not prune:
+            self.db.commit()
+            return
+        with self.db:
+            stale = [(path,) for (path,) in self.db.execute("SELECT path FROM files")
+                     if path not in self.seen]
+            self.db.executemany("DELETE FROM files WHERE path = ?", stale)
+
+    def close(self):
+        self.db.close()
+
+    ### QUERIES ###
+
+    def files_using(self, char):
+        """
+        Return: sorted list of (project-relative path, line) where a character occurs.
+        """
+        codepoint = char if isinstance(char, int) else ord(char)
+        return self.db.execute(
+            "SELECT files.path, occurrences.line FROM occurrences "
+            "JOIN files ON files.id = occurrences.file_id "
+            "WHERE occurrences.codepoint = ? ORDER BY files.path, occurrences.line",
+            (codepoint,)
+        ).fetchall()
+
+    def characters_in(self, file_path):
+        """
+        Return: a CharSet of the characters used by a file.
+        """
+        return CharSet.from_codepoints(codepoint for (codepoint,) in self.db.execute(
+            "SELECT DISTINCT codepoint FROM occurrences WHERE file_id = ?",
+            (self._file_id(file_path),)
+        ))
+
+    def characters_introduced_by(self, file_path):
+        """
+        Return: a CharSet of the characters no other file uses.
+        """
+        return CharSet.from_codepoints(codepoint for (codepoint,) in self.db.execute(
+            "SELECT DISTINCT codepoint FROM occurrences AS own WHERE own.file_id = :file "
+            "AND NOT EXISTS (SELECT 1 FROM occurrences AS other "
+            "WHERE other.codepoint = own.codepoint AND other.file_id != :file)",
+            {"file": self._file_id(file_path)}
+        ))
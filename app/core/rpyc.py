@@ -0,0 +1,251 @@
+# RenPatch Compiled Script Module
+# Reads compiled Ren'Py scripts (.rpyc) without Ren'Py and without running anything.
+# The pickled AST is loaded into inert stand-in objects, and only the statements
+# that carry text are written back as a minimal Ren'Py source, line-aligned with
+# the original script. That source then goes through the regular extractors.
+import io
+import re
+import zlib
+import codecs
+import pickle
+import struct
+
+RPYC2_HEADER = b"RENPY RPC2"
+
+class RpycError(Exception):
+    pass
+
+class _Node:
+    """
+    Stand-in for every Ren'Py class in a compiled script: it only keeps
+    the constructor arguments and the pickled state.
+    """
+    def __new__(cls, *args, **kwargs):
+        node = object.__new__(cls)
+        node._args = args
+        return node
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__dict__.update(state)
+        elif (isinstance(state, tuple) and len(state) == 2
+              and all(part is None or isinstance(part, dict) for part in state)):
+            # (__dict__, __slots__ values) of classes with slots
+            for part in state:
+                if part:
+                    self.__dict__.update(part)
+        else:
+            # Custom state, e.g. PyCode: (version, source, location, mode, ...)
+            self._state = state
+
+_STUBS = {}
+
+def _stub(module, name):
+    key = (module, name)
+    if key not in _STUBS:
+        _STUBS[key] = type(name, (_Node,), {"__module__": module, "__qualname__": name})
+    return _STUBS[key]
+
+def _reconstructor(cls, base, state):
+    # copyreg._reconstructor without calling into arbitrary base classes
+    if not issubclass(cls, _Node):
+        raise RpycError(f"Unexpected class in compiled script: {cls!r}")
+    return cls.__new__(cls) if state is None else cls.__new__(cls, state)
+
+class _ScriptUnpickler(pickle.Unpickler):
+    """
+    Ren'Py classes become inert stubs; only a few harmless builtins are resolved.
+    Anything else in the pickle is refused.
+    """
+    SAFE = {
+        ("builtins", "set"): set, ("__builtin__", "set"): set,
+        ("builtins", "frozenset"): frozenset, ("__builtin__", "frozenset"): frozenset,
+        ("builtins", "object"): object, ("__builtin__", "object"): object,
+        ("collections", "OrderedDict"): dict,
+        ("_codecs", "encode"): codecs.encode,
+        ("builtins", "bytes"): bytes, ("__builtin__", "bytes"): bytes,
+        ("copyreg", "_reconstructor"): _reconstructor,
+        ("copy_reg", "_reconstructor"): _reconstructor,
+    }
+
+    def find_class(self, module, name):
+        if (module, name) in self.SAFE:
+            return self.SAFE[(module, name)]
+        if module.split(".")[0] in ("renpy", "store"):
+            return _stub(module, name)
+        raise RpycError(f"Unexpected object in compiled script: {module}.{name}")
+
+def load_rpyc(raw):
+    """
+    Unpickle the AST of a compiled script (RPC2 slot 1, or a bare zlib pickle for old builds).
+    Return: the list of top-level statements.
+    """
+    if raw.startswith(RPYC2_HEADER):
+        pos = len(RPYC2_HEADER)
+        while True:
+            slot, start, length = struct.unpack_from("<III", raw, pos)
+            if slot == 0:
+                raise RpycError("Compiled script has no AST slot")
+            if slot == 1:
+                payload = zlib.decompress(raw[start:start + length])
+                break
+            pos += 12
+    else:
+        payload = zlib.decompress(raw)
+
+    unpickler = _ScriptUnpickler(io.BytesIO(payload), encoding='utf-8', errors='replace')
+    _, statements = unpickler.load()
+    return statements
+
+### SOURCE WRITER ###
+
+_IDENTIFIER = re.compile(r'[A-Za-z_]\w*(?:\.\w+)*')
+# Screen language displayables whose positional argument is shown as text
+_SCREEN_TEXT = {
+    "renpy.text.text.Text": "text",
+    "renpy.ui._textbutton": "textbutton",
+    "renpy.ui._label": "label",
+}
+
+def _get(node, name):
+    return node.__dict__.get(name) if isinstance(node, _Node) else None
+
+def _source(value):
+    """
+    Return: the Python source of a PyExpr / PyCode stand-in (or plain string).
+    """
+    if isinstance(value, str):
+        return value
+    if not isinstance(value, _Node):
+        return ""
+    if "source" in value.__dict__:
+        return _source(value.__dict__["source"])
+    if value._args and isinstance(value._args[0], str):
+        return value._args[0]
+    state = value.__dict__.get("_state")
+    if isinstance(state, tuple) and len(state) > 1:
+        return _source(state[1])
+    return ""
+
+def _quote(text):
+    # Backslashes first, or the escapes added after them would be doubled
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+class _SourceWriter:
+    """
+    Minimal Ren'Py source, each statement on its original line when possible.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def add(self, text, indent=0, linenumber=None):
+        if isinstance(linenumber, int):
+            while len(self.lines) < linenumber - 1:
+                self.lines.append("")
+        self.lines.append("    " * indent + text)
+
+    def add_code(self, header, code, indent, linenumber):
+        self.add(header, indent, linenumber)
+        for line in _source(code).splitlines() or ["pass"]:
+            self.add(line, indent + 1)
+
+    def source(self):
+        return "\n".join(self.lines) + "\n"
+
+def _walk(node, out, indent=0):
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            _walk(child, out, indent)
+        return
+    if not isinstance(node, _Node):
+        return
+
+    kind = type(node).__name__
+    line = _get(node, "linenumber")
+
+    if kind == "Say":
+        what = _get(node, "what")
+        if isinstance(what, str):
+            who = _get(node, "who")
+            if who is None:
+                out.add(_quote(what), indent, line)
+            else:
+                speaker = who if _IDENTIFIER.fullmatch(who or "") else "character"
+                out.add(f"{speaker} {_quote(what)}", indent, line)
+    elif kind == "Menu":
+        out.add("menu:", indent, line)
+        for item in _get(node, "items") or ():
+            label, block = item[0], item[2] if len(item) > 2 else None
+            if not isinstance(label, str):
+                continue
+            if block is None:
+                out.add(_quote(label), indent + 1)
+            else:
+                out.add(_quote(label) + ":", indent + 1)
+                _walk(block, out, indent + 2)
+    elif kind == "TranslateString":
+        out.add(f"translate {_get(node, 'language') or 'None'} strings:", indent, line)
+        out.add("old " + _quote(_get(node, "old") or ""), indent + 1)
+        out.add("new " + _quote(_get(node, "new") or ""), indent + 1)
+    elif kind in ("Define", "Default"):
+        store = _get(node, "store") or "store"
+        prefix = store[len("store."):] + "." if store.startswith("store.") else ""
+        value = " ".join(_source(_get(node, "code")).split())
+        out.add(f"{kind.lower()} {prefix}{_get(node, 'varname')} = {value}", indent, line)
+    elif kind in ("Python", "EarlyPython"):
+        out.add_code("init python:", _get(node, "code"), indent, line)
+    elif kind == "Style":
+        out.add(f"style {_get(node, 'style_name')}:", indent, line)
+        for name, expr in (_get(node, "properties") or {}).items():
+            out.add(f"{name} {' '.join(_source(expr).split())}", indent + 1)
+    elif kind == "Screen":
+        screen = _get(node, "screen")
+        out.add(f"screen {_get(screen, 'name') or 'screen'}():", indent, line)
+        _walk_screen(screen, out, indent + 1)
+    else:
+        # Labels, init / translate / if / while blocks: only their bodies matter
+        _walk(_get(node, "block"), out, indent)
+        for entry in _get(node, "entries") or ():
+            if isinstance(entry, tuple) and len(entry) == 2:
+                _walk(entry[1], out, indent)
+
+def _walk_screen(node, out, indent):
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            _walk_screen(child, out, indent)
+        return
+    if not isinstance(node, _Node):
+        return
+
+    kind = type(node).__name__
+    if kind == "SLDisplayable":
+        target = _get(node, "displayable")
+        keyword = None
+        if isinstance(target, type):
+            keyword = _SCREEN_TEXT.get(f"{target.__module__}.{target.__qualname__}")
+        if keyword:
+            for argument in _get(node, "positional") or ():
+                out.add(f"{keyword} {' '.join(_source(argument).split())}", indent, _get(node, "line"))
+    elif kind == "SLPython":
+        out.add_code("python:", _get(node, "code"), indent, _get(node, "line"))
+        return
+
+    _walk_screen(_get(node, "children"), out, indent)
+    for entry in _get(node, "entries") or ():
+        if isinstance(entry, tuple) and len(entry) == 2:
+            _walk_screen(entry[1], out, indent)
+
+def rpyc_to_source(raw):
+    """
+    Turn a compiled script into a minimal Ren'Py source holding its text:
+    say / menu / translate strings, define / default, style properties,
+    python code and screen text displayables. Statements keep their original
+    line numbers where possible.
+    Return: source text.
+    """
+    out = _SourceWriter()
+    _walk(load_rpyc(raw), out)
+    return out.source()
@@ -1,154 +1,488 @@
 # RenPatch Scanner Module
 import os
 import re
+import time
+import weakref
+import hashlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-def get_unique_characters(game_dir):
+from .cache import ScanCache, CountsCache
+from .charset import CharSet
+from .lexer import extract_characters, extract_file_characters, Occurrences, HAS_NUMPY
+from .statements import extract_displayable_characters, SAY
+from .attribution import FontUsage, FontUsageCache, scan_font_usage, characters_for_font, resolve_languages, _font_ref
+from .provenance import ProvenanceIndex
+from .project import ProjectIndex, CONFIG_FILES, COMPILED_EXTENSIONS, get_project_index, language_of
+from .archive import open_archive, open_file, split_member_path
+from .rpyc import rpyc_to_source
+from .formats import format_of, extract_spans
+
+# Parallel scan kicks in above either threshold.
+# Below them, process start-up costs more than the scan itself.
+PARALLEL_MIN_FILES = 64
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+# Scripts at least this large are scanned through mmap (e.g. generated localization dumps)
+MMAP_MIN_BYTES = 8 * 1024 * 1024
+
+# Scripts at least this large use the NumPy reduction when it is available.
+# Smaller files do not amortize the per-file codepoint mask.
+VECTOR_MIN_BYTES = 256 * 1024
+
+# Bump whenever extraction output changes so stale cache entries are dropped
+SCAN_CACHE_VERSION = 4
+
+# Extraction modes:
+# - naive: every quoted string outside asset paths
+# - displayable: only text Ren'Py can show (see statements.py)
+EXTRACTORS = {
+    "naive": extract_characters,
+    "displayable": extract_displayable_characters,
+}
+
+# Per-file scanners: mode -> (scan function, empty result, cache class, cache name)
+_SCANNERS = {
+    "naive": (extract_characters, CharSet, ScanCache, "scan"),
+    "displayable": (extract_displayable_characters, CharSet, ScanCache, "scan-displayable"),
+    "fonts": (scan_font_usage, FontUsage, FontUsageCache, "fonts"),
+}
+
+def _read_script(file_path):
     """
-    Scan and extract all special chars from .rpy files in the game directory.
-    Return: a set of unique characters in the game.
+    Read a script (or .rpa archive member) as raw bytes.
+    Compiled scripts (.rpyc) are turned into the source of their text statements.
+    Return: (bytes, decoded text with universal newlines).
+    """
+    with open_file(file_path) as f:
+        raw = f.read()
+    if file_path.endswith(COMPILED_EXTENSIONS):
+        return raw, rpyc_to_source(raw)
+    content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return raw, content
+
+def _scan_file(file_path, vectorized=None, mode="naive", record=False, count=False):
     """
-    unique_chars = set()
+    Extract the displayable characters from a single script (.rpy, .rpym, .rpyc)
+    or from a file of a registered format (see formats.py).
+    Files above MMAP_MIN_BYTES are memory-mapped and scanned as raw bytes
+    instead of being read and decoded whole. Archive members are read from
+    their offset in the .rpa file. Compiled scripts are scanned through the
+    source rebuilt from their AST (see rpyc.py), line numbers included.
+    vectorized: use the NumPy reduction. None picks it for files above VECTOR_MIN_BYTES.
+    mode: scan mode, a key of _SCANNERS.
+    record: also record where each character occurs.
+    count: also count how often each character occurs.
+    Return: (CharSet of unique characters, or FontUsage in "fonts" mode,
+             content hash or None on error,
+             (codepoints, lines) occurrence arrays or None,
+             {character: occurrence count} or None).
+    """
+    extractor, empty, _, _ = _SCANNERS[mode]
+    source_format = format_of(file_path)
+    try:
+        member = split_member_path(file_path)
+        if member is None:
+            size = os.path.getsize(file_path)
+        else:
+            size = open_archive(member[0]).size(member[1])
+        if vectorized is None:
+            vectorized = HAS_NUMPY and size >= VECTOR_MIN_BYTES
+        if (member is None and size >= MMAP_MIN_BYTES and source_format is None
+                and not file_path.endswith(COMPILED_EXTENSIONS)):
+            return extract_file_characters(file_path, vectorized, extractor, record, count)
+        raw, content = _read_script(file_path)
+        occurrences = Occurrences(content, record, count) if record or count else None
+        if source_format is None:
+            result = extractor(content, vectorized, occurrences)
+        else:
+            spans = source_format[1](content, displayable=mode != "naive")
+            result = extract_spans(spans, vectorized, occurrences)
+            if mode == "fonts":
+                result = FontUsage.from_characters(result)
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        return (
+            result, digest,
+            occurrences.result() if record else None,
+            occurrences.frequencies() if count else None
+        )
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return empty(), None, None, None
+
+def _extractor_name(file_path):
+    """
+    Return: the name scan timings are recorded under for a file.
+    """
+    source_format = format_of(file_path)
+    if source_format is not None:
+        return source_format[0]
+    return "rpyc" if file_path.endswith(COMPILED_EXTENSIONS) else "rpy"
+
+def _timed_scan(file_path, vectorized=None, mode="naive", record=False, count=False):
+    """
+    Return: (path, chars, digest, occurrences, counts, seconds spent on the file).
+    """
+    start = time.perf_counter()
+    result = _scan_file(file_path, vectorized, mode, record, count)
+    return (file_path, *result, time.perf_counter() - start)
+
+def _scan_files(file_paths, vectorized=None, mode="naive", record=False, count=False):
+    """
+    Pool worker: scan a chunk of files, keeping per-file results.
+    Return: a list of (path, chars, digest, occurrences, counts, seconds) tuples.
+    """
+    return [_timed_scan(file_path, vectorized, mode, record, count) for file_path in file_paths]
+
+def _split_chunks(script_files, chunk_count):
+    """
+    Deal files largest-first onto the lightest chunk so workers finish together.
+    Return: a list of non-empty lists of file paths.
+    """
+    chunks = [[] for _ in range(chunk_count)]
+    loads = [0] * chunk_count
+    for file_path, size, _ in sorted(script_files, key=lambda x: x[1], reverse=True):
+        lightest = loads.index(min(loads))
+        chunks[lightest].append(file_path)
+        loads[lightest] += size
+    return [chunk for chunk in chunks if chunk]
+
+def _scan_script_files(script_files, workers=None, parallel=None, vectorized=None, mode="naive",
+                       record=False, count=False):
+    """
+    Scan the given files serially or on a process pool.
+    Yields: (path, chars, digest, occurrences, counts, seconds) per file, in no particular order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(script_files)))
     
-    # Single pass extraction
-    # 1. Capture triple-quoted strings first (Greedy)
-    # 2. Capture single/double quoted strings with backslash escape support
-    # Pattern explanation for " or ':
-    #   "          : Start quote
-    #   (          : Capture group
-    #     [^"\\]*  : Match any char except quote or backslash (Greedy)
-    #     (?:      : Non-capturing group for escaped char
-    #       \\.    : Match backslash followed by any char
-    #       [^"\\]* : Match any char except quote or backslash
-    #     )*       : Repeat 0 or more times
-    #   )          : End capture
-    #   "          : End quote
-    string_pattern = re.compile(r'("""(.*?)"""|\'\'\'(.*?)\'\'\'|"([^"\\]*(?:\\.[^"\\]*)*)"|\'([^\'\\]*(?:\\.[^\'\\]*)*)\')', re.DOTALL)
+    if parallel is None:
+        total_bytes = sum(size for _, size, _ in script_files)
+        parallel = len(script_files) >= PARALLEL_MIN_FILES or total_bytes >= PARALLEL_MIN_BYTES
+    
+    if parallel and workers > 1:
+        # A few chunks per worker keeps the pool busy when file sizes are uneven
+        chunks = _split_chunks(script_files, workers * 4)
+        try:
+            results = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk_results in executor.map(partial(_scan_files, vectorized=vectorized, mode=mode, record=record, count=count), chunks):
+                    results.extend(chunk_results)
+            yield from results
+            return
+        except (OSError, BrokenProcessPool) as e:
+            # e.g. frozen builds or sandboxes without multiprocessing support
+            print(f"Parallel scan unavailable, falling back to serial scan: {e}")
+
+    for file_path, _, _ in script_files:
+        yield _timed_scan(file_path, vectorized, mode, record, count)
+
+def _scan_project(game_dir, mode, result, workers=None, parallel=None, use_cache=False, vectorized=None,
+                  provenance=False, project=None, timings=None, languages=None, files=None,
+                  frequencies=None, digests=None):
+    """
+    Scan all scripts and registered-format sources of the game directory in the given mode,
+    merging each per-file result into result with |=.
+    provenance: also keep the ProvenanceIndex of the mode up to date.
+    project: ProjectIndex of game_dir, built if not given.
+    timings: optional dict, filled per extractor name with the "files", "bytes"
+             and "seconds" of the files actually scanned (cache hits excluded).
+    languages: optional dict, filled with the merged result of each language
+               (see project.language_of(); None is the base language).
+    files: optional dict, filled with the result of every single file.
+    frequencies: optional Counter, filled with how often each character occurs.
+    digests: optional dict, filled with the content hash of every file read or cached.
+    Return: result.
+    """
+    _, empty, cache_class, cache_name = _SCANNERS[mode]
+
+    def merge(file_path, found):
+        nonlocal result
+        result |= found
+        if files is not None:
+            files[file_path] = found
+        if languages is not None:
+            language = language_of(file_path, game_dir)
+            if language not in languages:
+                languages[language] = empty()
+            languages[language] |= found
+
+    project = get_project_index(game_dir, project)
+    script_files = project.scripts + project.sources
+
+    index = ProvenanceIndex(game_dir, name=f"provenance-{mode}") if provenance else None
     
-    # Ren'Py specific strip
-    tag_pattern = re.compile(r'\{.*?\}') # patterns like {size=30}, {b}, etc. 
-    interpolation_pattern = re.compile(r'\[.*?\]') # patterns like [player_name]
-
-    # Heuristic pre-filtering
-    ignored_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.ogg', '.mp3', '.wav', '.rpy', '.otf', '.ttf')
-
-    for root, _, files in os.walk(game_dir):
-        for file in files:
-            if file.endswith(".rpy"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                        matches = string_pattern.findall(content)
-                        
-                        for match_tuple in matches:
-                            # The match tuple contains full match + groups. 
-                            # We want the content inside the quotes.
-                            # Groups: 
-                            # 0: Full match ("""...""" or "...")
-                            # 1: content of """..."""
-                            # 2: content of '''...'''
-                            # 3: content of "..."
-                            # 4: content of '...'
-                            
-                            # Find the non-empty group (skip group 0)
-                            text = next((m for m in match_tuple[1:] if m), None)
-                            
-                            if not text:
-                                continue
-                                
-                            # Skip likely file paths
-                            if text.lower().strip().endswith(ignored_extensions):
-                                continue
-                            if "/" in text and len(text.split()) == 1: # Single word with slash likely a path
-                                continue
-
-                            # Clean up the text
-                            # Strip Ren'Py tags
-                            text = tag_pattern.sub('', text)
-                            # Strip Interpolation
-                            text = interpolation_pattern.sub('', text)
-                            # Common escape sequences
-                            text = text.replace('\\"', '"').replace("\\'", "'").replace("\\n", "")
-                            
-                            for char in text:
-                                # Ignore whitespace and control characters
-                                if not char.isspace() and char.isprintable():
-                                    unique_chars.add(char)
-                                    
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
+    count = frequencies is not None
+    # Files whose counts are already in frequencies
+    counted = set()
+    cache = counts_cache = None
+    if use_cache:
+        cache = cache_class(game_dir, name=cache_name, version=SCAN_CACHE_VERSION)
+        if count:
+            counts_cache = CountsCache(game_dir, name=f"{cache_name}-counts", version=SCAN_CACHE_VERSION)
+        pending = []
+        for file_path, size, mtime in script_files:
+            cached = cache.lookup(file_path, size, mtime)
+            if cached is None:
+                pending.append((file_path, size, mtime))
+                continue
+            merge(file_path, cached)
+            if digests is not None:
+                digests[file_path] = cache.digest(file_path)
+            cached_counts = counts_cache.lookup(file_path, size, mtime) if count else None
+            if cached_counts is not None:
+                frequencies.update(cached_counts)
+                counted.add(file_path)
+            # Cached characters, but occurrences still to be indexed or counted
+            if ((index is not None and not index.is_current(file_path, size, mtime))
+                    or (count and cached_counts is None)):
+                pending.append((file_path, size, mtime))
+        script_files = pending
+
+    file_stats = {file_path: (size, mtime) for file_path, size, mtime in script_files}
+    scanned = _scan_script_files(script_files, workers, parallel, vectorized, mode, record=provenance, count=count)
+    for file_path, found, digest, occurrences, counts, seconds in scanned:
+        merge(file_path, found)
+        size, mtime = file_stats[file_path]
+        if timings is not None:
+            timing = timings.setdefault(_extractor_name(file_path), {"files": 0, "bytes": 0, "seconds": 0.0})
+            timing["files"] += 1
+            timing["bytes"] += size
+            timing["seconds"] += seconds
+        if digest is None:
+            continue
+        if digests is not None:
+            digests[file_path] = digest
+        if cache is not None:
+            cache.store(file_path, size, mtime, found, digest)
+        if counts is not None:
+            if file_path not in counted:
+                frequencies.update(counts)
+            if counts_cache is not None:
+                counts_cache.store(file_path, size, mtime, counts, digest)
+        if index is not None and not index.is_current(file_path, size, mtime):
+            index.store(file_path, size, mtime, occurrences, digest)
+
+    # A subset scan only saw part of the project: keep the entries of the other files
+    if cache is not None:
+        cache.save(prune=not project.partial)
+    if counts_cache is not None:
+        counts_cache.save(prune=not project.partial)
+    if index is not None:
+        index.finish(prune=not project.partial)
+        index.close()
+
+    return result
+
+def _fill_stats(stats, chars, naive_chars, project):
+    stats["chars"] = len(chars)
+    if naive_chars is not None:
+        stats["naive_chars"] = len(naive_chars)
+        stats["removed_chars"] = len(naive_chars - chars)
+    stats["scripts"] = len(project.scripts)
+    stats["sources"] = len(project.sources)
+    stats["pruned_dirs"] = project.pruned_dirs
+    stats["skipped_entries"] = project.skipped_entries
+
+def get_unique_characters(game_dir, workers=None, parallel=None, use_cache=False, vectorized=None,
+                          mode="naive", stats=None, provenance=False, project=None, languages=None,
+                          frequencies=None, compare=False):
+    """
+    Scan and extract all special chars from the scripts and registered-format sources
+    (see formats.register_format()) in the game directory.
+    workers: process count for the parallel scan (default: os.cpu_count()).
+    parallel: force the parallel scan on/off. None picks it automatically
+              above PARALLEL_MIN_FILES files or PARALLEL_MIN_BYTES bytes.
+    use_cache: reuse per-file results from <game_dir>/.renpatch/cache and
+               only rescan files that changed or are new.
+    vectorized: force the NumPy codepoint reduction on/off. None uses it
+                for files above VECTOR_MIN_BYTES when NumPy is installed.
+    mode: "naive" keeps every quoted string, "displayable" only text Ren'Py can show.
+    stats: optional dict, filled with "chars", "scripts", "sources", "pruned_dirs"
+           and "skipped_entries" from the project traversal,
+           and "extractors": {name: {"files", "bytes", "seconds"}} for the files
+           scanned by each extractor ("rpy", "rpyc", "python", "json", "csv", "po" ...).
+    provenance: record where every character occurs in the same pass and keep the
+                SQLite index of the mode current (see get_provenance_index()).
+    project: ProjectIndex of game_dir to reuse instead of walking the tree again;
+             build one with include / exclude globs to change which subtrees are pruned.
+    languages: optional dict, filled in the same pass with {language: CharSet} of the
+               files under tl/<language>/; None holds the base language (everything else).
+    frequencies: optional collections.Counter, filled in the same pass with how often
+                 each character occurs (see patcher.split_tiers()).
+    compare: also fill stats with "naive_chars" and "removed_chars" (characters the mode
+             dropped compared to the naive scan). Outside naive mode this costs a second
+             full scan, so it is off by default.
+    Return: a CharSet of unique characters in the game.
+    """
+    if mode not in EXTRACTORS:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    project = get_project_index(game_dir, project)
+    timings = stats.setdefault("extractors", {}) if stats is not None else None
+    unique_chars = _scan_project(
+        game_dir, mode, CharSet(), workers, parallel, use_cache, vectorized, provenance, project, timings,
+        languages, frequencies=frequencies
+    )
+
+    if stats is not None:
+        naive_chars = None
+        if mode == "naive":
+            naive_chars = unique_chars
+        elif compare:
+            naive_chars = get_unique_characters(
+                game_dir, workers, parallel, use_cache, vectorized, project=project
+            )
+        _fill_stats(stats, unique_chars, naive_chars, project)
 
     return unique_chars
 
-def find_fonts(base_dir):
+def get_font_characters(game_dir, workers=None, parallel=None, use_cache=False, vectorized=None,
+                        stats=None, provenance=False, project=None, languages=None, frequencies=None,
+                        compare=False):
+    """
+    Scan the displayable text of the game and attribute it to the fonts that render it,
+    following {font=} tags, gui.*_font defines and style font statements.
+    Takes the same options as get_unique_characters(); compare adds the naive scan to stats,
+    languages is filled with {language: font map like the one returned}, and frequencies
+    counts the displayable text only.
+    Return: {font as written in the scripts: CharSet}. The None key holds characters
+            whose font is unknown; pass the map to characters_for_font() per font file.
+    """
+    project = get_project_index(game_dir, project)
+    timings = stats.setdefault("extractors", {}) if stats is not None else None
+    language_usage = {} if languages is not None else None
+    usage = _scan_project(
+        game_dir, "fonts", FontUsage(), workers, parallel, use_cache, vectorized, provenance, project, timings,
+        language_usage, frequencies=frequencies
+    )
+    if languages is not None:
+        languages.update(resolve_languages(usage, language_usage))
+
+    if stats is not None:
+        naive_chars = None
+        if compare:
+            naive_chars = get_unique_characters(
+                game_dir, workers, parallel, use_cache, vectorized, project=project
+            )
+        _fill_stats(stats, usage.characters(), naive_chars, project)
+
+    return usage.resolve()
+
+def get_provenance_index(game_dir, mode="naive"):
+    """
+    Open the occurrence index written by a scan with provenance=True in the given mode
+    ("fonts" for get_font_characters()). Close it when done.
+    Return: a ProvenanceIndex.
+    """
+    if mode not in _SCANNERS:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+    return ProvenanceIndex(game_dir, name=f"provenance-{mode}")
+
+def find_fonts(base_dir, project=None):
     """
     Recursively find all .ttf and .otf files in the directory.
+    project: ProjectIndex of base_dir to reuse instead of walking the tree again.
     Returns a list of absolute paths.
     """
-    font_files = []
-    for root, _, files in os.walk(base_dir):
-        for file in files:
-            if file.lower().endswith(('.ttf', '.otf')):
-                font_files.append(os.path.join(root, file))
-    return font_files
+    return get_project_index(base_dir, project).font_paths
+
+### FONT ROLES ###
+
+# gui.*_font / style.<name>.font assignments outside define / style statements, e.g. in init python
+_PYTHON_FONT = re.compile(r'\b(gui\.\w+_font|style\.\w+\.font)\s*=\s*(["\'])([^"\'\n]*)\2')
+# Other font properties (screen text, one-off displayables) and defines of font files
+_FONT_PROPERTY = re.compile(r'\bfont\s+(["\'])([^"\'\n]*)\1')
+_FONT_DEFINE = re.compile(
+    r'^[ \t]*define\s+(?:[-+]?\d+\s+)?[\w.]+\s*=\s*(["\'])([^"\'\n]*\.(?:ttf|otf|ttc))\1',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# Parsed config files: content hash -> (FontUsage settings, other fonts named)
+_CONFIG_FONTS = {}
+# Resolved roles per ProjectIndex: {font file name: (role, confidence)}
+_PROJECT_ROLES = weakref.WeakKeyDictionary()
+
+def _font_name(font):
+    return _font_ref(font).rsplit('/', 1)[-1].lower()
+
+def _parse_config_fonts(content):
+    """
+    One pass over a config file for every font assignment it makes.
+    Return: (FontUsage holding the gui / style settings, set of other fonts named).
+    """
+    usage = scan_font_usage(content)
+    # Only the settings matter; the text of the config files is left out
+    usage.by_font, usage.by_kind = {}, {}
+    for match in _PYTHON_FONT.finditer(content):
+        name = match.group(1)
+        if name.startswith("style."):
+            name = name[:-len(".font")]
+        usage.settings.setdefault(name, set()).add(_font_ref(match.group(3)))
+    others = {_font_ref(match.group(2)) for match in _FONT_PROPERTY.finditer(content)}
+    others |= {_font_ref(match.group(2)) for match in _FONT_DEFINE.finditer(content)}
+    return usage, others
+
+def resolve_font_roles(base_dir, project=None):
+    """
+    Font roles assigned by the config files (gui.rpy, screens.rpy, options.rpy), each parsed once.
+    The fonts that decide dialogue (the first of style.say_dialogue / style.default /
+    gui.text_font that is set, aliases followed) are "Dialogue"; fonts of any other gui.*_font,
+    style font, screen-level font property or font define are "UI".
+    Parsed files are cached by content hash, resolved roles per ProjectIndex.
+    Return: {font file name (lowercase): (role, confidence)}.
+    """
+    project = get_project_index(base_dir, project)
+    if project in _PROJECT_ROLES:
+        return _PROJECT_ROLES[project]
+
+    usage = FontUsage()
+    others = set()
+    for config_file in CONFIG_FILES:
+        # First match in directory tree order
+        file_path = project.config_files.get(config_file)
+        if not file_path:
+            continue
+        try:
+            raw, content = _read_script(file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            continue
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        if digest not in _CONFIG_FONTS:
+            _CONFIG_FONTS[digest] = _parse_config_fonts(content)
+        file_usage, file_others = _CONFIG_FONTS[digest]
+        usage |= file_usage
+        others |= file_others
+
+    roles = {}
+    for font in others.union(*usage.settings.values()):
+        roles[_font_name(font)] = ("UI", "Medium")
+    for font in usage.fonts_of(SAY):
+        roles[_font_name(font)] = ("Dialogue", "High")
+
+    _PROJECT_ROLES[project] = roles
+    return roles
 
 # Try to analyze font role based on file path and gui.rpy
-def analyze_font_role(base_dir, font_path, missing_count=None, total_chars=0):
+def analyze_font_role(base_dir, font_path, missing_count=None, total_chars=0, project=None):
     """
     Heuristics to determine the role of a font (Dialogue, UI, unknown).
-    1. Check gui.rpy/screens.rpy for explicit assignment.
+    1. Check gui.rpy/screens.rpy/options.rpy for explicit assignment (see resolve_font_roles()).
     2. Check file path conventions.
     3. Check character coverage (if provided).
+    project: ProjectIndex of base_dir to reuse instead of walking the tree and parsing
+             the config files again.
     """
-    font_filename = os.path.basename(font_path)
     role = "Unknown"
     confidence = "Low"
 
     # 1. Check explicit definitions in common config files
-    config_files = ["gui.rpy", "screens.rpy", "options.rpy"]
-    found_config_match = False
-    
-    for config_file in config_files:
-        if found_config_match: break
-        
-        # Find file in directory tree
-        file_path = None
-        for root, _, files in os.walk(base_dir):
-            if config_file in files:
-                file_path = os.path.join(root, config_file)
-                break
-        
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    # Regex Pattern to catch:
-                    # gui.text_font = "path/to/font.ttf"
-                    # font "path/to/font.ttf"
-                    escaped_name = re.escape(font_filename)
-                    
-                    # High Priority: Dialogue assignments
-                    if re.search(f'gui\.text_font\s*=\s*[\'"].*{escaped_name}[\'"]', content):
-                        role = "Dialogue"
-                        confidence = "High"
-                        found_config_match = True
-                        break
-                        
-                    # Medium Priority: UI assignments
-                    if re.search(f'gui\.interface_text_font\s*=\s*[\'"].*{escaped_name}[\'"]', content) or \
-                       re.search(f'gui\.name_text_font\s*=\s*[\'"].*{escaped_name}[\'"]', content) or \
-                       re.search(f'font\s+[\'"].*{escaped_name}[\'"]', content): # General style font
-                        role = "UI"
-                        confidence = "Medium"
-                        found_config_match = True
-                        break
-            except:
-                pass
-
-    if found_config_match:
-        return role, confidence
+    config_role = resolve_font_roles(base_dir, project).get(os.path.basename(font_path).lower())
+    if config_role is not None:
+        return config_role
 
     # 2. Check file path conventions (Fallback)
     if "gui" in font_path.lower() or "interface" in font_path.lower() or "common" in font_path.lower():
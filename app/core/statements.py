@@ -0,0 +1,233 @@
+# RenPatch Statement Module
+# Ren'Py-aware classification of string literals.
+# Only enough statement structure is tracked (lines, indented blocks, open
+# brackets) to tell text the player sees from code, ids, styles and assets.
+import re
+
+from .lexer import (
+    _syntax_of, iter_literals, is_probably_path, emit_literal, new_sink, finish_sink
+)
+
+# Kinds of displayable literals
+SAY = "say"                    # dialogue and narration
+NAME = "name"                  # speaker names: define Character("...") or "Name" "line"
+MENU = "menu"                  # menu choices
+SCREEN = "screen"              # text displayables, show text
+BUTTON = "button"              # textbutton displayables
+LABEL = "label"                # label displayables
+TRANSLATE = "translate"        # old / new strings of translate blocks
+TRANSLATABLE = "translatable"  # anything wrapped in _() / __() / _p()
+
+# Block contexts
+_SCRIPT = "script"  # say statements and menus
+_SCREEN = "screen"  # screen language: only text displayables
+_CODE = "code"      # python, style, transform, image / ATL: nothing
+
+_INIT = r'(?:init(?:\s+[-+]?\d+)?\s+)?'
+# Headers of blocks whose body holds no dialogue, e.g. "init python:", "style say_label:"
+_CODE_BLOCK = re.compile(
+    _INIT + r'(?:python\b|(?:style|transform|image|layeredimage)\s|(?:show|scene|camera)\b)'
+    r'|translate\s+\w+\s+(?:python|style)\b'
+)
+_SCREEN_BLOCK = re.compile(_INIT + r'screen\s')
+
+# Statement text before a literal, with earlier literals replaced by ""
+_TRANSLATABLE = re.compile(r'(?<![\w.])(?:_|__|_p)\(\s*$')
+_CHARACTER = re.compile(
+    r'(?:define|default)(?:\s+[-+]?\d+)?\s+[\w.]+\s*=\s*(?:\w+\.)*'
+    r'(?:Character|DynamicCharacter|ADVCharacter|NVLCharacter|ADVSpeaker|NVLSpeaker|Speaker)\(\s*$'
+)
+_SCREEN_TEXT = re.compile(r'(text|textbutton|label|tooltip|show\s+text)\s*$')
+_SCREEN_KINDS = {"textbutton": BUTTON, "label": LABEL}
+# Block header of a style, e.g. "style say_dialogue is default:"
+_STYLE_BLOCK = re.compile(r'style\s+(\w+)')
+_TRANSLATE_STRING = re.compile(r'(?:old|new)\s*$')
+# Speaker and attributes, e.g. e, e happy, e @ sad, e -happy, "Name"
+_SAY = re.compile(r'(?:""|[A-Za-z_]\w*(?:\.\w+)*)(?:\s+(?:@|-?\w+))*$')
+# Statements that look like "keyword words "literal"" but are not dialogue
+_NON_SAY = frozenset((
+    'play', 'queue', 'stop', 'voice', 'show', 'scene', 'hide', 'image', 'camera',
+    'jump', 'call', 'define', 'default', 'style', 'screen', 'transform', 'init',
+    'python', 'window', 'with', 'pause', 'return', 'menu', 'label', 'translate',
+    'layeredimage', 'nvl', 'at', 'use',
+))
+# What follows a literal that opens a line: ":" / "if" for a menu choice,
+# another literal when it names the speaker
+_TAIL = re.compile(r'[ \t]*(?:(:|if\b)|["\'])')
+_TAIL_SIZE = 16
+
+_OPEN_BRACKETS = '([{'
+_CLOSE_BRACKETS = ')]}'
+
+class _Statements:
+    """
+    Follows the statement structure around the literals of one script.
+    The text between literals is fed in order; each literal is then
+    classified by the statement text before it and the block it is in.
+    """
+    def __init__(self, content):
+        self.content = content
+        self.syntax = _syntax_of(content)
+        # (indent, context, header) of the enclosing python / screen / style ... blocks
+        self.blocks = []
+        # End of the text consumed so far
+        self.pos = 0
+        self._new_statement()
+
+    def _new_statement(self):
+        # Statement text since the last literal (all of it before the first)
+        self.parts = []
+        # Statement text before the first literal, once there is one
+        self.head = None
+        self.literals = 0
+        # Statement text before the last literal
+        self.prefix = ""
+        self.indent = None
+        self.depth = 0
+
+    def feed(self, end):
+        """
+        Consume the text between the last literal and end (no literals in it).
+        """
+        content, newline = self.content, self.syntax.newline
+        pos = self.pos
+        while True:
+            line_end = content.find(newline, pos, end)
+            if line_end == -1:
+                self._text(self.syntax.text(content, pos, end, 'replace'))
+                break
+            self._text(self.syntax.text(content, pos, line_end, 'replace'))
+            if self.depth > 0:
+                # Inside brackets the statement continues on the next line
+                self.parts.append(" ")
+            else:
+                self._end_statement()
+            pos = line_end + 1
+        self.pos = end
+
+    def _text(self, piece):
+        # Outside literals, # always starts a comment
+        comment = piece.find('#')
+        if comment != -1:
+            piece = piece[:comment]
+        if self.indent is None and piece.strip():
+            self._begin("".join(self.parts) + piece)
+        self.parts.append(piece)
+        for char in _OPEN_BRACKETS:
+            self.depth += piece.count(char)
+        for char in _CLOSE_BRACKETS:
+            self.depth -= piece.count(char)
+        self.depth = max(self.depth, 0)
+
+    def _begin(self, line):
+        # First text of a statement: its indentation closes deeper blocks
+        self.indent = len(line) - len(line.lstrip())
+        while self.blocks and self.indent <= self.blocks[-1][0]:
+            self.blocks.pop()
+
+    def _statement(self):
+        """
+        Return: the statement text so far, with earlier literals replaced by "".
+                Past the second literal the text between earlier ones is left out:
+                no rule looks further than the head and the last literal, and long
+                bracketed statements (define lists) stay linear to walk.
+        """
+        tail = "".join(self.parts)
+        if self.head is None:
+            return tail.strip()
+        return (self.head + ('""' if self.literals == 1 else '"" ""') + tail).rstrip()
+
+    def _end_statement(self):
+        if self.indent is not None:
+            statement = self._statement()
+            if statement.endswith(':'):
+                if _CODE_BLOCK.match(statement):
+                    self.blocks.append((self.indent, _CODE, statement))
+                elif _SCREEN_BLOCK.match(statement):
+                    self.blocks.append((self.indent, _SCREEN, statement))
+        self._new_statement()
+
+    def literal(self, close):
+        """
+        Classify the literal whose closing quote ends at close.
+        Return: its kind, or None if it is not displayable.
+        """
+        if self.indent is None:
+            self._begin("".join(self.parts))
+        self.prefix = self._statement()
+        if self.head is None:
+            self.head = "".join(self.parts).lstrip()
+        self.literals += 1
+        self.parts = []
+        self.pos = close
+        return self._kind(self.prefix, close)
+
+    def style(self):
+        """
+        Return: the name of the style block the current statement is in, or None.
+        """
+        if self.blocks:
+            match = _STYLE_BLOCK.match(self.blocks[-1][2])
+            if match:
+                return match.group(1)
+        return None
+
+    def _kind(self, prefix, close):
+        translatable = _TRANSLATABLE.search(prefix)
+        if translatable:
+            # textbutton _("Start") still renders as a button
+            screen_text = _SCREEN_TEXT.match(prefix[:translatable.start()].strip())
+            return _SCREEN_KINDS.get(screen_text.group(1), SCREEN) if screen_text else TRANSLATABLE
+
+        context = self.blocks[-1][1] if self.blocks else _SCRIPT
+        if context == _CODE or prefix.startswith('$'):
+            return None
+        screen_text = _SCREEN_TEXT.match(prefix)
+        if screen_text:
+            return _SCREEN_KINDS.get(screen_text.group(1), SCREEN)
+        if context == _SCREEN:
+            return None
+        if _TRANSLATE_STRING.match(prefix):
+            return TRANSLATE
+        if _CHARACTER.match(prefix):
+            return NAME
+
+        if not prefix:
+            tail = _TAIL.match(self.syntax.text(self.content, close, close + _TAIL_SIZE, 'ignore'))
+            if tail is None:
+                return SAY
+            return MENU if tail.group(1) else NAME
+
+        if _SAY.match(prefix) and prefix.split(None, 1)[0] not in _NON_SAY:
+            return SAY
+        return None
+
+def classify_literals(content):
+    """
+    Walk the literals of a Ren'Py script, comments skipped, with their statement kind.
+    content: decoded text, or raw UTF-8 bytes / mmap.
+    Yields: (start, end, kind) per literal; kind is None for code, ids, styles
+            and other text that never reaches the screen.
+    """
+    statements = _Statements(content)
+    for start, end, width in iter_literals(content, skip_comments=True):
+        statements.feed(start - width)
+        yield start, end, statements.literal(end + width)
+
+def extract_displayable_characters(content, vectorized=False, occurrences=None):
+    """
+    Extract only the characters of displayable text from a Ren'Py script:
+    dialogue, menu choices, screen text, Character names, translations and
+    _() strings. Comments, python code, screen ids, style names, persistent
+    keys and renpy.notify() debug text are left out.
+    occurrences: optional Occurrences of the same content, records where each character is.
+    Return: a CharSet of unique characters in the text.
+    """
+    chars = new_sink(vectorized)
+    for start, end, kind in classify_literals(content):
+        if kind is None or start == end or is_probably_path(content, start, end, tags=True):
+            continue
+        emit_literal(content, start, end, chars)
+        if occurrences is not None:
+            occurrences.record(start, end)
+    return finish_sink(chars)
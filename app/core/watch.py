@@ -0,0 +1,305 @@
+# RenPatch Watch Module
+# Keeps the character set of a project live while its scripts are edited:
+# an in-memory per-file index, refreshed from inotify events (Linux) or by
+# polling, that re-extracts only the files that changed and reports deltas.
+# A refresh only stats the files and directories already indexed; the tree is
+# walked again only when a directory or an archive changed.
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from .charset import CharSet
+from .attribution import FontUsage, characters_for_font, resolve_languages
+from .scanner import _scan_project, _scan_script_files
+from .project import get_project_index, language_of
+from .archive import split_member_path
+from .patcher import get_font_coverage
+
+# Polling fallback interval, seconds
+POLL_INTERVAL = 0.5
+# Quiet time after the first event before rescanning, so one save is one refresh
+DEBOUNCE_SECONDS = 0.1
+
+class CharacterIndex:
+    """
+    Per-file scan results of a project ("fonts" mode) and the coverage of its fonts.
+    refresh() re-indexes the project, re-extracts new and changed files only,
+    and returns what changed.
+    """
+    def __init__(self, game_dir, project=None, use_cache=True):
+        self.game_dir = game_dir
+        self.project = get_project_index(game_dir, project)
+        self.files = {}
+        _scan_project(game_dir, "fonts", FontUsage(), use_cache=use_cache, project=self.project, files=self.files)
+        self.records = self._records(self.project)
+        self.stamps = self._stamps(self.project)
+        self.coverage = {}
+        for path, size, mtime in self.project.fonts:
+            self._load_font(path, (size, mtime))
+        self.unique_chars, self.missing = self._totals()
+
+    @staticmethod
+    def _records(project):
+        return {path: (size, mtime) for path, size, mtime in project.scripts + project.sources}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stamps(self, project):
+        """
+        Return: {path: mtime} of the traversed directories and the .rpa archives. A directory's
+                mtime moves when entries are added, removed or renamed in it.
+        """
+        paths = project.directories + [path for path, _, _ in project.archives]
+        return {path: self._mtime(path) for path in paths}
+
+    @staticmethod
+    def _restat(records):
+        """
+        Return: records with the current size and mtime of each file; files that are gone
+                are dropped, archive members keep theirs (their archive is stamped).
+        """
+        current = {}
+        for path, record in records.items():
+            try:
+                stat = os.stat(path)
+                current[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                if split_member_path(path) is not None:
+                    current[path] = record
+        return current
+
+    def _current(self):
+        """
+        Return: (fresh records of the scripts and sources, fresh records of the fonts).
+        """
+        if any(self._mtime(path) != mtime for path, mtime in self.stamps.items()):
+            # Files were added, removed or renamed somewhere: walk the tree again
+            self.project = self.project.rescan()
+            self.stamps = self._stamps(self.project)
+            fonts = {path: (size, mtime) for path, size, mtime in self.project.fonts}
+            return self._records(self.project), fonts
+        fonts = {path: record for path, (record, _) in self.coverage.items()}
+        return self._restat(self.records), self._restat(fonts)
+
+    def _load_font(self, font_path, record):
+        try:
+            self.coverage[font_path] = (record, get_font_coverage(font_path))
+        except Exception as e:
+            print(f"Error analyzing font {font_path}: {e}")
+            self.coverage[font_path] = (record, CharSet())
+
+    def _totals(self):
+        """
+        Return: (CharSet of all characters,
+                 {font path: (needed CharSet, missing CharSet, {language: missing CharSet})}).
+        """
+        usage = FontUsage()
+        languages = {}
+        for path, found in self.files.items():
+            usage |= found
+            language = language_of(path, self.game_dir)
+            if language not in languages:
+                languages[language] = FontUsage()
+            languages[language] |= found
+        font_chars = usage.resolve()
+        language_chars = resolve_languages(usage, languages)
+
+        missing = {}
+        for font_path, (_, coverage) in self.coverage.items():
+            needed = characters_for_font(font_chars, font_path)
+            missing_set = needed - coverage
+            by_language = {
+                language: missing_set & characters_for_font(chars, font_path)
+                for language, chars in language_chars.items()
+            }
+            missing[font_path] = (needed, missing_set, by_language)
+        return usage.characters(), missing
+
+    def refresh(self):
+        """
+        Re-extract files whose size or mtime changed. Only the indexed files and directories
+        are stat'ed; the project is walked again when a directory or an archive changed.
+        Return: a delta dict, or None if nothing the scan sees changed:
+            - changed / removed: script and source paths
+            - unique_chars: total count, added_chars / dropped_chars: CharSets
+            - fonts: {font path: {"total_chars", "missing_count", "missing_set",
+                                  "missing_by_language", "new_missing", "fixed"}} for every font
+        """
+        records, fonts = self._current()
+        changed = [(path, *record) for path, record in records.items() if self.records.get(path) != record]
+        removed = [path for path in self.records if path not in records]
+
+        fonts_changed = False
+        for font_path, record in fonts.items():
+            if font_path not in self.coverage or self.coverage[font_path][0] != record:
+                self._load_font(font_path, record)
+                fonts_changed = True
+        for font_path in [path for path in self.coverage if path not in fonts]:
+            del self.coverage[font_path]
+            fonts_changed = True
+
+        if not changed and not removed and not fonts_changed:
+            return None
+
+        for path in removed:
+            self.files.pop(path, None)
+        for path, found, _, _, _, _ in _scan_script_files(changed, mode="fonts"):
+            self.files[path] = found
+        self.records = records
+
+        unique_chars, missing = self._totals()
+        delta = {
+            "changed": [path for path, _, _ in changed],
+            "removed": removed,
+            "unique_chars": len(unique_chars),
+            "added_chars": unique_chars - self.unique_chars,
+            "dropped_chars": self.unique_chars - unique_chars,
+            "fonts": {},
+        }
+        for font_path, (needed, missing_set, by_language) in missing.items():
+            previous = self.missing[font_path][1] if font_path in self.missing else CharSet()
+            delta["fonts"][font_path] = {
+                "total_chars": len(needed),
+                "missing_count": len(missing_set),
+                "missing_set": missing_set,
+                "missing_by_language": by_language,
+                "new_missing": missing_set - previous,
+                "fixed": previous - missing_set,
+            }
+        self.unique_chars, self.missing = unique_chars, missing
+        return delta
+
+### BACKENDS ###
+
+class _Inotify:
+    """
+    Directory watches through the Linux inotify API (via ctypes, no dependency).
+    """
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    # Sent when a watch goes away, e.g. its directory was deleted
+    IN_IGNORED = 0x8000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    # struct inotify_event: wd, mask, cookie, len, then len bytes of name
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # directory -> watch descriptor, and back
+        self.watched = {}
+        self.directories = {}
+
+    def watch(self, directories):
+        for directory in directories:
+            if directory in self.watched:
+                continue
+            wd = self._add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd >= 0:
+                self.watched[directory] = wd
+                self.directories[wd] = directory
+
+    def _events(self, data):
+        pos = 0
+        while pos + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size + length
+            if mask & self.IN_IGNORED:
+                # Deleted (or unmounted) directory: a directory recreated at the same
+                # path is a new inode and gets a new watch on the next watch() call
+                directory = self.directories.pop(wd, None)
+                if directory is not None and self.watched.get(directory) == wd:
+                    del self.watched[directory]
+
+    def wait(self, timeout):
+        """
+        Return: True once events arrived within timeout (all pending events are consumed).
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        time.sleep(DEBOUNCE_SECONDS)
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._events(data)
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class _Polling:
+    """
+    Fallback: every interval counts as a possible change; refresh() compares size and mtime.
+    """
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+
+    def watch(self, directories):
+        pass
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+def _backend(use_inotify, poll_interval):
+    if use_inotify is not False and hasattr(os, "O_CLOEXEC") and ctypes.util.find_library("c"):
+        try:
+            return _Inotify()
+        except (OSError, AttributeError) as e:
+            if use_inotify:
+                raise
+            print(f"inotify unavailable, polling every {poll_interval}s: {e}")
+    return _Polling(poll_interval)
+
+class ProjectWatcher:
+    """
+    Watches a project and calls on_delta with CharacterIndex.refresh() deltas.
+    use_inotify: None picks inotify when available, False forces polling.
+    """
+    def __init__(self, game_dir, project=None, use_inotify=None, poll_interval=POLL_INTERVAL):
+        self.index = CharacterIndex(game_dir, project)
+        self.backend = _backend(use_inotify, poll_interval)
+        self.backend.watch(self.index.project.directories)
+
+    def run(self, on_delta, stop_event=None, timeout=1.0):
+        """
+        Block until stop_event is set (or forever), pushing deltas to on_delta.
+        """
+        try:
+            while stop_event is None or not stop_event.is_set():
+                if not self.backend.wait(timeout):
+                    continue
+                try:
+                    delta = self.index.refresh()
+                except Exception as e:
+                    print(f"Error refreshing watched project: {e}")
+                    continue
+                # New directories need watches of their own
+                self.backend.watch(self.index.project.directories)
+                if delta is not None:
+                    on_delta(delta)
+        finally:
+            self.backend.close()
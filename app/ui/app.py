@@ -1,10 +1,14 @@
 import flet as ft
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from app.ui.theme import current_theme as theme
 
 # Import Core Logic
-from app.core import scanner, patcher
+from app.core import scanner, patcher, estimate
+from app.core.charset import CharSet
+from app.core.coverage import get_coverage_cache
+from app.core.watch import ProjectWatcher
 import os
 
 # Import Screens
@@ -14,6 +18,9 @@ from app.ui.screens.scanning import ScanningScreen
 from app.ui.screens.results import ResultsScreen
 from app.ui.screens.wizard import WizardScreen
 
+# Threads analyzing fonts after the script scan
+FONT_WORKERS = 8
+
 class RenPatchApp(ft.Column):
     def __init__(self, page: ft.Page):
         super().__init__()
@@ -75,7 +82,8 @@ class RenPatchApp(ft.Column):
             "results": ResultsScreen(
                 on_wizard_click=self.open_wizard,
                 on_manual_click=lambda e: print("Manual clicked"),
-                on_back_click=lambda e: self.navigate_to("directory")
+                on_back_click=lambda e: self.navigate_to("directory"),
+                on_watch_change=self.set_watch
             ),
             "wizard": WizardScreen(
                 on_back_click=lambda e: self.navigate_to("results"),
@@ -84,6 +92,10 @@ class RenPatchApp(ft.Column):
         }
         
         self.current_screen = "welcome"
+        # Set to stop the running watch thread, if any
+        self.watch_stop = None
+        # ProjectIndex of the last scan, reused when watching is switched on
+        self.scan_project = None
         
         # Sidebar setup
         self.sidebar_content = ft.Column(
@@ -212,20 +224,50 @@ class RenPatchApp(ft.Column):
         
     def _run_scan(self, directory):
         scan_screen = self.screens["scanning"]
+        # Once estimates are on the results screen, the exact scan runs unseen
+        estimated = False
+
+        def status(text, filepath=""):
+            if not estimated:
+                scan_screen.set_status(text, filepath=filepath)
+
+        def progress(value):
+            if not estimated:
+                scan_screen.set_progress(value)
         
         try:
             # 1. Scanning Files
-            scan_screen.set_status("Scanning Ren'Py script files...")
-            scan_screen.set_progress(0.1)
+            status("Scanning Ren'Py script files...")
+            progress(0.1)
             time.sleep(0.5) 
             
-            unique_chars = scanner.get_unique_characters(directory)
-            scan_screen.set_status(f"Found {len(unique_chars)} unique characters...")
-            scan_screen.set_progress(0.3)
+            # One traversal of the project, shared by every step below.
+            # VCS, cache, save, asset and SDK folders are pruned (project.DEFAULT_EXCLUDE).
+            project = scanner.ProjectIndex(directory)
+
+            # Large projects: numbers from a sample first, replaced in place below
+            if estimate.script_bytes(project) >= estimate.PROGRESSIVE_MIN_BYTES:
+                status("Estimating from a sample of the scripts...")
+                self._show_estimate(directory, project)
+                estimated = True
+
+            scan_stats = {}
+            # Same pass, split by game/tl/<language> for per-locale patches
+            language_font_chars = {}
+            # Only text the player can see, grouped by the font that renders it;
+            # code, ids and comments would bloat the patch
+            font_chars = scanner.get_font_characters(
+                directory, use_cache=True, stats=scan_stats, project=project,
+                languages=language_font_chars
+            )
+            unique_chars = CharSet().union(*font_chars.values())
+            status(f"Found {len(unique_chars)} unique characters in {scan_stats['scripts']} scripts...")
+            progress(0.3)
             
             # 2. Heuristic Font Analysis
-            scan_screen.set_status("Locating project fonts...")
-            font_files = scanner.find_fonts(directory)
+            status("Locating project fonts...")
+            font_files = scanner.find_fonts(directory, project=project)
+            font_sizes = {path: size for path, size, _ in project.fonts}
             
             # Prepare data
             font_health_data = []
@@ -234,88 +276,76 @@ class RenPatchApp(ft.Column):
             processed_fonts = 0
             
             if not font_files:
-                scan_screen.set_status("No fonts found in project.")
+                status("No fonts found in project.")
                 time.sleep(1)
             else:
-                for font_path in font_files:
-                    filename = os.path.basename(font_path)
-                    scan_screen.set_status("Analyzing font...", filepath=filename)
-                    
-                    # 1. Calculate Health FIRST (needed for heuristic role analysis)
-                    missing_chars = patcher.get_missing_characters(unique_chars, font_path)
-                    
-                    # 2. Determine Role
-                    role, confidence = scanner.analyze_font_role(
-                        directory, 
-                        font_path, 
-                        missing_count=len(missing_chars), 
-                        total_chars=len(unique_chars)
-                    )
-                    
-                    font_health_data.append({
-                        "file_path": font_path,
-                        "role": role,
-                        "confidence": confidence,
-                        "missing_count": len(missing_chars),
-                        "total_chars": len(unique_chars),
-                        "missing_set": missing_chars, # Store for later patching
-                        "file_size": f"{os.path.getsize(font_path) / (1024 * 1024):.2f} MB"
-                    })
-                    
-                    processed_fonts += 1
-                    scan_screen.set_progress(0.3 + (0.6 * (processed_fonts / total_fonts)))
-
-            # Sort data: 
-            # 1. Role (Dialogue is critical)
-            # 2. Status (Critical/Missing > Perfect)
-            role_priority = {"Dialogue": 0, "Unknown": 1, "Name/UI": 2, "UI": 3, "UI/Symbols": 3}
-            # Secondary sort: Missing count DESC (Critical top), but for UI/Safe roles we don't care as much.
-            # Actually, just sorting by Role then Missing DESC works well for "Most Critical Dialogue Font".
-            font_health_data.sort(key=lambda x: (role_priority.get(x["role"], 99), -x["missing_count"]))
-
-            scan_screen.set_progress(0.9)
+                # Fonts are analyzed concurrently (coverage reads are I/O and cached);
+                # resolve the config roles once up front so workers share them
+                scanner.resolve_font_roles(directory, project)
+                # New fonts are written to the coverage cache once, after the last one
+                with get_coverage_cache().batch(), \
+                        ThreadPoolExecutor(max_workers=min(FONT_WORKERS, total_fonts)) as executor:
+                    futures = [
+                        executor.submit(_analyze_font, directory, font_path, font_chars, language_font_chars, project)
+                        for font_path in font_files
+                    ]
+                    # Completion order: progress follows the fonts actually done
+                    for future in as_completed(futures):
+                        health = future.result()
+                        # From the index: fonts may live inside .rpa archives
+                        health["file_size"] = f"{font_sizes[health['file_path']] / (1024 * 1024):.2f} MB"
+                        font_health_data.append(health)
+
+                        processed_fonts += 1
+                        status(
+                            f"Analyzed font {processed_fonts}/{total_fonts}...",
+                            filepath=os.path.basename(health["file_path"])
+                        )
+                        progress(0.3 + (0.6 * (processed_fonts / total_fonts)))
+
+            _sort_font_health(font_health_data)
+
+            progress(0.9)
             time.sleep(0.5)
             
             # 3. Complete
-            scan_screen.set_status("Compiling results...")
-            scan_screen.set_progress(1.0)
+            status("Compiling results...")
+            progress(1.0)
             time.sleep(0.5)
             
             # Populate Results
             results_screen = self.screens["results"]
             
             # Count rpy files for stats
-            rpy_count = sum(1 for root, _, files in os.walk(directory) for f in files if f.endswith('.rpy'))
-            
-            # Smart Missing Char Count:
-            # We take the missing count of the Top Critical Font (which is now at index 0).
-            # If the top font is Dialogue/Unknown, its missing count is the project's bottleneck.
-            # If the top font is UI (meaning no dialogue fonts found?), then ??? use 0 or that font's count.
-            # We assume the user wants to fix the squares in dialogue.
-            
-            primary_missing_count = 0
-            if font_health_data:
-                top_font = font_health_data[0]
-                if top_font["role"] in ["Dialogue", "Unknown"]:
-                    primary_missing_count = top_font["missing_count"]
+            rpy_count = len(project.scripts)
             
             global_stats = {
                 "files": rpy_count,
                 "unique_chars": len(unique_chars),
-                "missing_chars_count": primary_missing_count
+                "missing_chars_count": _primary_missing_count(font_health_data)
             }
             
+            # Watching is opt-in per scan
+            self._stop_watch()
+            results_screen.watching = False
             results_screen.update_data(global_stats, font_health_data)
             
             # Store data for wizard usage
             self.scan_data = {
                 "directory": directory,
                 "unique_chars": unique_chars,
-                "fonts": font_health_data
+                "fonts": font_health_data,
+                "global_stats": global_stats,
+                # Occurrence counts for hot/cold tier patches, counted by the wizard when asked for
+                "frequencies": None
             }
+            self.scan_project = project
             
-            # Navigate
-            self.navigate_to("results")
+            # Navigate, or replace the estimates in place
+            if estimated:
+                self.page.update()
+            else:
+                self.navigate_to("results")
             
         except Exception as e:
             import traceback
@@ -323,6 +353,89 @@ class RenPatchApp(ft.Column):
             print(f"Scan Error: {e}")
             scan_screen.set_status(f"Error: {e}")
 
+    def _show_estimate(self, directory, project):
+        """
+        First phase of a progressive scan: estimated counts on the results screen.
+        """
+        result = estimate.estimate_project(directory, project=project)
+        font_sizes = {path: size for path, size, _ in project.fonts}
+        font_health_data = []
+        for font_path, health in result["fonts"].items():
+            role, confidence = scanner.analyze_font_role(
+                directory,
+                font_path,
+                missing_count=health["missing_count"],
+                total_chars=health["total_chars"],
+                project=project
+            )
+            font_health_data.append({
+                "file_path": font_path,
+                "role": role,
+                "confidence": confidence,
+                "missing_count": health["missing_count"],
+                "total_chars": health["total_chars"],
+                "estimate": True,
+                "file_size": f"{font_sizes[font_path] / (1024 * 1024):.2f} MB"
+            })
+        _sort_font_health(font_health_data)
+
+        global_stats = {
+            "files": len(project.scripts),
+            "unique_chars": result["unique_chars"],
+            "missing_chars_count": _primary_missing_count(font_health_data),
+            "estimate": True
+        }
+        self.screens["results"].update_data(global_stats, font_health_data)
+        self.navigate_to("results")
+
+    ### WATCH MODE ###
+
+    def set_watch(self, enabled):
+        """
+        Results screen switch: keep the results live while the project's scripts are edited.
+        """
+        self._stop_watch()
+        if enabled and self.scan_data is not None:
+            self.watch_stop = threading.Event()
+            threading.Thread(
+                target=self._run_watch, args=(self.scan_data["directory"], self.scan_project, self.watch_stop),
+                daemon=True
+            ).start()
+
+    def _stop_watch(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
+
+    def _run_watch(self, directory, project, stop):
+        try:
+            # Per-file results come from the scan cache written by the scan
+            watcher = ProjectWatcher(directory, project=project)
+            # A delta computed while the switch went off is dropped
+            watcher.run(lambda delta: stop.is_set() or self._on_watch_delta(delta), stop)
+        except Exception as e:
+            print(f"Watch Error: {e}")
+
+    def _on_watch_delta(self, delta):
+        # Runs on the watch thread: build new entries and swap them in, never
+        # modify the ones the results and wizard screens may be reading
+        font_health_data = []
+        for font_data in self.scan_data["fonts"]:
+            health = delta["fonts"].get(font_data["file_path"])
+            if health is not None:
+                font_data = dict(font_data)
+                for key in ("missing_count", "total_chars", "missing_set", "missing_by_language"):
+                    font_data[key] = health[key]
+            font_health_data.append(font_data)
+
+        global_stats = dict(self.scan_data["global_stats"])
+        global_stats["unique_chars"] = delta["unique_chars"]
+        global_stats["missing_chars_count"] = _primary_missing_count(font_health_data)
+        # Occurrence counts of the edited scripts are stale: recounted on the next tiered patch
+        self.scan_data = dict(self.scan_data, fonts=font_health_data, global_stats=global_stats, frequencies=None)
+        self.screens["results"].update_data(global_stats, font_health_data)
+        self.page.update()
+
     def open_wizard(self, font_data):
         self.screens["wizard"].set_data(font_data, self.scan_data)
         self.navigate_to("wizard")
@@ -332,4 +445,62 @@ class RenPatchApp(ft.Column):
         self.page.update()
 
     def close(self, e):
-        self.page.window_close()
\ No newline at end of file
+        self.page.window_close()
+
+def _analyze_font(directory, font_path, font_chars, language_font_chars, project):
+    """
+    Health and role of one font, run on the font analysis workers.
+    Return: a font_health_data entry (without "file_size").
+    """
+    # 1. Calculate Health FIRST (needed for heuristic role analysis)
+    # Only against the characters this font actually renders
+    font_unique_chars = scanner.characters_for_font(font_chars, font_path)
+    missing_chars = patcher.get_missing_characters(font_unique_chars, font_path)
+    # Missing characters per language: no font read needed, the total is a superset
+    missing_by_language = {
+        language: missing_chars & scanner.characters_for_font(chars, font_path)
+        for language, chars in language_font_chars.items()
+    }
+
+    # 2. Determine Role
+    role, confidence = scanner.analyze_font_role(
+        directory,
+        font_path,
+        missing_count=len(missing_chars),
+        total_chars=len(font_unique_chars),
+        project=project
+    )
+
+    return {
+        "file_path": font_path,
+        "role": role,
+        "confidence": confidence,
+        "missing_count": len(missing_chars),
+        "total_chars": len(font_unique_chars),
+        "missing_set": missing_chars, # CharSet bitmap, stored for later patching
+        "missing_by_language": missing_by_language, # None: base language
+    }
+
+def _sort_font_health(font_health_data):
+    """
+    Sort data:
+    1. Role (Dialogue is critical)
+    2. Status (Critical/Missing > Perfect)
+    """
+    role_priority = {"Dialogue": 0, "Unknown": 1, "Name/UI": 2, "UI": 3, "UI/Symbols": 3}
+    # Secondary sort: Missing count DESC (Critical top), but for UI/Safe roles we don't care as much.
+    # Actually, just sorting by Role then Missing DESC works well for "Most Critical Dialogue Font".
+    # Path last: fonts arrive in completion order, ties must not depend on it
+    font_health_data.sort(key=lambda x: (role_priority.get(x["role"], 99), -x["missing_count"], x["file_path"]))
+
+def _primary_missing_count(font_health_data):
+    """
+    Smart Missing Char Count:
+    We take the missing count of the Top Critical Font (font_health_data is sorted, it is at index 0).
+    If the top font is Dialogue/Unknown, its missing count is the project's bottleneck.
+    If the top font is UI (meaning no dialogue fonts found?), use 0.
+    We assume the user wants to fix the squares in dialogue.
+    """
+    if font_health_data and font_health_data[0]["role"] in ["Dialogue", "Unknown"]:
+        return font_health_data[0]["missing_count"]
+    return 0
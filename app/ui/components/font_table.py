@@ -10,6 +10,7 @@ class FontTable(ft.DataTable):
           - role (Dialogue, UI, Unknown)
           - missing_count
           - total_chars
+          - estimate (optional): counts are estimates of a progressive scan
         """
         super().__init__(
             columns=[
@@ -65,9 +66,10 @@ class FontTable(ft.DataTable):
 
             # Display missing count differently for UI roles
             missing_display_color = status_color if missing > 0 and not is_ui_role else "black"
-            missing_text = f"{missing} chars"
+            approx = "~" if font.get('estimate') else ""
+            missing_text = f"{approx}{missing} chars"
             if is_ui_role and missing > 0:
-                 missing_text = f"{missing} (Ignored)"
+                 missing_text = f"{approx}{missing} (Ignored)"
                  missing_display_color = "#95a5a6" # Greyed out
 
             self.rows.append(
@@ -3,11 +3,14 @@ from app.ui.theme import current_theme as theme
 from app.ui.components.font_table import FontTable
 
 class ResultsScreen(ft.Container):
-    def __init__(self, on_wizard_click, on_manual_click, on_back_click=None):
+    def __init__(self, on_wizard_click, on_manual_click, on_back_click=None, on_watch_change=None):
         super().__init__()
         self.on_wizard_click = on_wizard_click
         self.on_manual_click = on_manual_click
         self.on_back_click = on_back_click
+        self.on_watch_change = on_watch_change
+        # Live updates while scripts are edited, off until switched on
+        self.watching = False
         self.expand = True
         self.padding = 32
         self.bgcolor = "white"
@@ -33,6 +36,9 @@ class ResultsScreen(ft.Container):
         # Calculate summary
         total_fonts = len(self.font_data)
         critical_fonts = sum(1 for f in self.font_data if f['missing_count'] > 0)
+        # Progressive scan: counts from a sample until the exact scan replaces them
+        estimate = self.global_stats.get('estimate', False)
+        approx = "~" if estimate else ""
         
         # Header Row with Back Button
         # Header Row with Back Button
@@ -46,12 +52,24 @@ class ResultsScreen(ft.Container):
                 ),
                 ft.Column(
                     controls=[
-                        ft.Text("Scan Results", size=18, color="#2c3e50", weight=ft.FontWeight.BOLD),
+                        ft.Text(
+                            "Scan Results (estimated, exact scan running...)" if estimate else "Scan Results",
+                            size=18, color="#2c3e50", weight=ft.FontWeight.BOLD
+                        ),
                         ft.Container(
                             width=50, height=3, bgcolor="#3498db", border_radius=1, margin=ft.margin.only(top=4)
                         )
                     ],
                     spacing=0
+                ),
+                ft.Container(expand=True),
+                ft.Switch(
+                    label="Live update",
+                    value=self.watching,
+                    on_change=self._on_watch_switch,
+                    visible=bool(self.on_watch_change),
+                    # Watching starts from the exact scan
+                    disabled=estimate
                 )
             ],
             vertical_alignment=ft.CrossAxisAlignment.CENTER
@@ -68,9 +86,9 @@ class ResultsScreen(ft.Container):
                 ft.Row(
                     controls=[
                         self._summary_card("Scripts Scanned", self.global_stats['files'], "#3498db"),
-                        self._summary_card("Unique Chars", self.global_stats['unique_chars'], "#3498db"),
+                        self._summary_card("Unique Chars", f"{approx}{self.global_stats['unique_chars']}", "#3498db"),
                         self._summary_card("Fonts Found", total_fonts, "#3498db"),
-                        self._summary_card("Missing Chars", self.global_stats.get('missing_chars_count', 0), "#e74c3c" if self.global_stats.get('missing_chars_count', 0) > 0 else "#3498db"),
+                        self._summary_card("Missing Chars", f"{approx}{self.global_stats.get('missing_chars_count', 0)}", "#e74c3c" if self.global_stats.get('missing_chars_count', 0) > 0 else "#3498db"),
                         
                         # Fix Button (Wizard)
                         ft.Container(
@@ -83,7 +101,9 @@ class ResultsScreen(ft.Container):
                                     shape=ft.RoundedRectangleBorder(radius=4),
                                     padding=20 
                                 ),
-                                on_click=lambda e: self.on_wizard_click(self.font_data) # Pass all data
+                                on_click=lambda e: self.on_wizard_click(self.font_data), # Pass all data
+                                # Patching needs the exact missing sets
+                                disabled=estimate
                             ),
                             margin=ft.margin.only(left=20),
                             alignment=ft.alignment.center
@@ -119,6 +139,10 @@ class ResultsScreen(ft.Container):
             alignment=ft.MainAxisAlignment.START
         )
 
+    def _on_watch_switch(self, e):
+        self.watching = e.control.value
+        self.on_watch_change(self.watching)
+
     def _summary_card(self, label, value, color):
         return ft.Container(
             content=ft.Column(
@@ -1,8 +1,11 @@
 import flet as ft
 from app.ui.theme import current_theme as theme
-from app.core import patcher
+from app.core import patcher, scanner
+from app.core.charset import CharSet
+from app.core.fontpool import get_font_pool
 import os
 import threading
+from collections import Counter
 
 class WizardScreen(ft.Container):
     def __init__(self, on_back_click, on_patch_complete_click):
@@ -45,6 +48,10 @@ class WizardScreen(ft.Container):
             on_click=self.on_patch_click,
             disabled=True
         )
+        self.tier_checkbox = ft.Checkbox(
+            label="Split into hot / cold tiers (most used characters in a small font listed first)",
+            value=False
+        )
 
     def build(self):
         self.content = ft.Column(
@@ -113,6 +120,7 @@ class WizardScreen(ft.Container):
                 ft.Container(
                     content=ft.Column([
                         ft.Text("3. Generate", weight="bold", color=theme.colors.text_primary),
+                        self.tier_checkbox,
                         self.patch_btn,
                         self.progress_bar,
                         self.status_text
@@ -234,19 +242,46 @@ class WizardScreen(ft.Container):
             self.log(f"Output directory: {game_dir}")
             
             missing_chars = self.target_font_data["missing_set"]
+            missing_by_language = self.target_font_data.get("missing_by_language") or {}
+            frequencies = None
+            if self.tier_checkbox.value:
+                frequencies = self.scan_data.get("frequencies")
+                if frequencies is None:
+                    # Counted only for tiered patches; characters come from the scan cache
+                    self.log("Counting character occurrences for the hot / cold tiers...", "yellow")
+                    frequencies = Counter()
+                    scanner.get_font_characters(project_dir, use_cache=True, frequencies=frequencies)
+                    self.scan_data["frequencies"] = frequencies
             
             # 1. Generate Multiple Patches
             self.log(f"Searching for {len(missing_chars)} chars in {len(self.donor_fonts)} fonts...", "yellow")
             
-            patches_list, failed_chars = patcher.generate_multi_patch(
-                missing_chars, 
-                self.donor_fonts, 
-                game_dir
-            )
+            locale_patches = {}
+            if any(language is not None and chars for language, chars in missing_by_language.items()):
+                # One patch set per game/tl/<language>, so each player loads only their own glyphs
+                self.log(f"Patching {len(missing_by_language)} languages separately...", "yellow")
+                locale_patches = patcher.generate_locale_patches(
+                    missing_by_language,
+                    self.donor_fonts,
+                    game_dir,
+                    frequencies
+                )
+                patches_list, failed_chars = locale_patches.pop(None, ([], CharSet()))
+            else:
+                patches_list, failed_chars = patcher.generate_multi_patch(
+                    missing_chars, 
+                    self.donor_fonts, 
+                    game_dir,
+                    frequencies=frequencies
+                )
             
-            if patches_list:
-                for p in patches_list:
-                    self.log(f"Generated {p['filename']} from {p['source']} ({len(p['chars'])} chars)", "green")
+            all_patches = patches_list + [p for patches, _ in locale_patches.values() for p in patches]
+            if all_patches:
+                for p in all_patches:
+                    tier = f", {p['tier']} tier" if p.get('tier') else ""
+                    self.log(f"Generated {p['filename']} from {p['source']} ({len(p['chars'])} chars{tier})", "green")
+                pool = get_font_pool().stats()
+                self.log(f"Donor fonts: {pool['misses']} loaded, {pool['hits']} reused from the font pool")
             else:
                 self.log("No patches could be generated.", "red")
                 self.status_text.value = "Failed."
@@ -264,13 +299,15 @@ class WizardScreen(ft.Container):
                 failed_chars,
                 lite_font_name, # Relative path (assuming it is in game or configured paths)
                 script_path,
-                log_path
+                log_path,
+                locales=locale_patches
             )
             
             self.log(f"Script created: renpatch_init.rpy", "green")
             
-            if failed_chars:
-                self.log(f"Warning: {len(failed_chars)} characters could not be found in any donor.", "orange")
+            failed_count = len(failed_chars) + sum(len(failed) for _, failed in locale_patches.values())
+            if failed_count:
+                self.log(f"Warning: {failed_count} characters could not be found in any donor.", "orange")
             else:
                 self.log("Success! All characters patched.", "green")
             
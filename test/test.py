@@ -8,9 +8,449 @@ parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 
 from app.core import *
+from app.core.lexer import extract_characters
+
+import io
+import pickle
+import struct
+import tempfile
+import zlib
+
+### FIXTURES ###
+
+def make_rpa(path, files, key=0x42424242):
+    """
+    Write an RPA-3.0 archive the way Ren'Py 8 does: protocol 2 index pickled
+    by Python 3, with an empty b"" prefix per member.
+    """
+    data = io.BytesIO()
+    data.write(b"RPA-3.0 XXXXXXXXXXXXXXXX XXXXXXXX\n")
+    index = {}
+    for name, content in files.items():
+        offset = data.tell()
+        data.write(content)
+        index[name] = [(offset ^ key, len(content) ^ key, b"")]
+    index_offset = data.tell()
+    data.write(zlib.compress(pickle.dumps(index, 2)))
+    data.seek(0)
+    data.write(b"RPA-3.0 %016x %08x\n" % (index_offset, key))
+    with open(path, 'wb') as f:
+        f.write(data.getvalue())
+
+def make_font(path, codepoints):
+    """
+    Write a TrueType font with a square glyph for each codepoint
+    (cmap formats 4 and, beyond the BMP, 12).
+    """
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+    codepoints = sorted(set(codepoints))
+    names = [".notdef"] + [f"u{codepoint:05X}" for codepoint in codepoints]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap(dict(zip(codepoints, names[1:])))
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0)); pen.lineTo((0, 500)); pen.lineTo((500, 500)); pen.closePath()
+    glyph = pen.glyph()
+    builder.setupGlyf({name: glyph for name in names})
+    builder.setupHorizontalMetrics({name: (500, 0) for name in names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "RenPatch Test", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+    builder.save(path)
+
+def set_cmap(path, subtables):
+    """
+    Replace the cmap of a font with raw subtables, [(platform, encoding, bytes)]:
+    fontTools never writes mappings to glyph 0.
+    """
+    from fontTools.ttLib.tables.DefaultTable import DefaultTable
+    font = TTFont(path)
+    header = struct.pack(">HH", 0, len(subtables))
+    offset = 4 + 8 * len(subtables)
+    for platform, encoding, data in subtables:
+        header += struct.pack(">HHI", platform, encoding, offset)
+        offset += len(data)
+    font["cmap"] = DefaultTable("cmap")
+    font["cmap"].data = header + b"".join(data for _, _, data in subtables)
+    font.save(path)
+
+def make_rpyc(path, statements):
+    """
+    Write an RPC2 compiled script whose AST holds renpy.ast nodes.
+    statements: [(class name, attributes)]
+    """
+    import struct
+    import types
+    module = types.ModuleType("renpy.ast")
+    nodes = []
+    for name, attributes in statements:
+        if not hasattr(module, name):
+            setattr(module, name, type(name, (), {"__module__": "renpy.ast"}))
+        node = object.__new__(getattr(module, name))
+        node.__dict__.update(attributes)
+        nodes.append(node)
+    saved = {name: sys.modules.get(name) for name in ("renpy", "renpy.ast")}
+    sys.modules["renpy"], sys.modules["renpy.ast"] = types.ModuleType("renpy"), module
+    try:
+        payload = zlib.compress(pickle.dumps(({"version": 5003000}, nodes), 2))
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = value
+    header = b"RENPY RPC2"
+    start = len(header) + 24
+    with open(path, 'wb') as f:
+        f.write(header + struct.pack("<IIIIII", 1, start, len(payload), 0, 0, 0) + payload)
 
 # --- Test Block ---
 if __name__ == "__main__":
+    ## LEXER TEST (no game directory needed)
+    # Inputs that make the old findall/sub chain quadratic must stay fast
+    import time
+    n = 20000
+    pathological = {
+        "unterminated escapes": '"' + '\\"' * n,
+        "unclosed tags": '"' + '{' * n + '"',
+        "unclosed interpolation": '"' + '[' * n + '"',
+        "unterminated triple quotes": ('"""' + 'x' * 10 + '"') * n,
+    }
+    for name, text in pathological.items():
+        start = time.perf_counter()
+        extract_characters(text)
+        elapsed = time.perf_counter() - start
+        print(f"Lexer {name}: {elapsed * 1000:.1f} ms")
+        assert elapsed < 1.0, f"Lexer is not linear on {name}"
+
+    assert extract_characters('e "Hi {b}[name]{/b}, it\\\'s \\"ok\\"\\n" show "bg/room.png"') == set("Hi,it's\"ok")
+    assert extract_characters('"""unterminated') == set()
+
+    ## STATEMENT TEST
+    from app.core.statements import classify_literals, extract_displayable_characters
+    script = '''define e = Character("Eileen")
+# e "commented out"
+label start:
+    e happy "Hello"
+    "Narration"
+    "Sylvie" "Named line"
+    menu:
+        "Choice A":
+            pass
+    $ renpy.notify("debug")
+    play music "audio/theme.ogg"
+    jump "ending"
+init python:
+    note = "python text"
+screen hud():
+    text "Screen text"
+    textbutton _("Start") action Start()
+    add "gui/frame.png"
+    use "other"
+style say_label:
+    font "fonts/Label.ttf"
+'''
+    kinds = {script[start:end]: kind for start, end, kind in classify_literals(script)}
+    assert kinds == {
+        "Eileen": "name", "Hello": "say", "Narration": "say", "Sylvie": "name", "Named line": "say",
+        "Choice A": "menu", "debug": None, "audio/theme.ogg": None, "ending": None,
+        "python text": None, "Screen text": "screen", "Start": "button", "gui/frame.png": None,
+        "other": None, "fonts/Label.ttf": None,
+    }, kinds
+    # A long define list spanning lines must stay linear to walk
+    n = 20000
+    script = "define choices = [\n" + "".join(f'    _("{chr(0x4E00 + i)}"),\n    "id{i}",\n' for i in range(n)) + "]\n"
+    start = time.perf_counter()
+    found = extract_displayable_characters(script)
+    elapsed = time.perf_counter() - start
+    print(f"Statements {n} listed literals: {elapsed * 1000:.1f} ms")
+    assert found == CharSet(chr(0x4E00 + i) for i in range(n))
+    assert elapsed < 2.0, "Statement walk is not linear on multi-line lists"
+    print("Statements: literals classified by their statement")
+
+    ## PROJECT TEST
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in ("game/script.rpy", "game/images/bg/notes.rpy", "game/images/Title.ttf",
+                     "game/lib/Fallback.ttf", "renpy/common/00start.rpy"):
+            os.makedirs(os.path.dirname(os.path.join(tmp, path)), exist_ok=True)
+            open(os.path.join(tmp, path), 'w').close()
+        project = ProjectIndex(tmp)
+        # Asset folders and the SDK are pruned unlisted; lib/ below the root is not the SDK
+        assert [os.path.relpath(path, tmp) for path in project.script_paths] == [os.path.join("game", "script.rpy")]
+        assert [os.path.relpath(path, tmp) for path in project.font_paths] == [os.path.join("game", "lib", "Fallback.ttf")]
+        assert project.pruned_dirs == 2 and os.path.join(tmp, "game", "images", "bg") not in project.directories
+        # Fonts kept under an asset folder: opt in with include=
+        project = ProjectIndex(tmp, include=("images",))
+        assert os.path.join(tmp, "game", "images", "Title.ttf") in project.font_paths
+        assert project.pruned_dirs == 1 and project.rescan().pruned_dirs == 1
+    print("Project: asset and SDK folders pruned before descent")
+
+    ## ARCHIVE TEST
+    from app.core.archive import open_archive, open_file
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "game"))
+        archive_path = os.path.join(tmp, "game", "scripts.rpa")
+        make_rpa(archive_path, {
+            "script.rpy": 'e "Hello 世界"\n'.encode('utf-8'),
+            "fonts/UI.ttf": b"not really a font",
+        })
+        archive = open_archive(archive_path)
+        assert archive.names() == ["script.rpy", "fonts/UI.ttf"]
+        with open_file(os.path.join(archive_path, "fonts", "UI.ttf")) as f:
+            assert f.read() == b"not really a font"
+        project = ProjectIndex(tmp)
+        assert [os.path.relpath(path, tmp) for path in project.script_paths] == [os.path.join("game", "scripts.rpa", "script.rpy")]
+        assert len(project.fonts) == 1
+        assert get_unique_characters(tmp, project=project) == CharSet("Hello世界")
+    print("Archive: Ren'Py 8 index with empty prefixes read")
+
+    ## COMPILED SCRIPT TEST
+    from app.core.rpyc import rpyc_to_source
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "game"))
+        rpyc_path = os.path.join(tmp, "game", "script.rpyc")
+        make_rpyc(rpyc_path, [
+            ("Say", {"who": "e", "what": "C:\\", "linenumber": 1}),
+            ("Say", {"who": None, "what": 'He said \\"hi\\"', "linenumber": 2}),
+            ("Say", {"who": "e", "what": "第二行", "linenumber": 3}),
+        ])
+        with open(rpyc_path, 'rb') as f:
+            source = rpyc_to_source(f.read())
+        assert source.splitlines()[0] == 'e "C:\\\\"', source
+        # The trailing backslash must not swallow the lines after it
+        assert get_unique_characters(tmp) == CharSet('C:\\He said"hi第二行') - CharSet(" ")
+    print("Compiled script: backslashes survive decompilation")
+
+    ## LOCALE SCRIPT TEST
+    from app.core.patcher import generate_locale_patches
+    with tempfile.TemporaryDirectory() as tmp:
+        donor = os.path.join(tmp, "Donor.ttf")
+        make_font(donor, map(ord, "Éileen✓你好"))
+        # Base scripts: a Character name and a menu mark; tl/chinese: its own text and the mark
+        locales = generate_locale_patches(
+            {None: CharSet("É✓"), "chinese": CharSet("你好✓")}, [donor], tmp
+        )
+        assert locales["chinese"][0][0]["chars"] == CharSet("你好")
+        script_path = os.path.join(tmp, "renpatch_init.rpy")
+        base_patches, base_failed = locales.pop(None)
+        generate_renpy_script(base_patches, base_failed, "Lite.ttf", script_path, locales=locales)
+        with open(script_path, encoding="utf-8") as f:
+            script = f.read()
+        chinese_group = script.split("# === Locale: chinese ===")[1].split("# Map the group")[0]
+        # Untranslated lines and base-script strings still render in chinese
+        for char in "É✓你好":
+            assert f"# {char} (U+{ord(char):04X})" in chinese_group, char
+        assert chinese_group.index("patch_chinese_0.ttf") < chinese_group.index("patch_0.ttf") < chinese_group.index("Lite.ttf")
+    print("Locale script: base patches chained into each locale group")
+
+    ## WATCH TEST
+    from app.core.watch import CharacterIndex
+
+    def touch(path, text=None):
+        # Move mtime a second forward: coarse file system clocks must still see the change
+        if text is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        game = os.path.join(tmp, "game")
+        os.makedirs(game)
+        script = os.path.join(game, "script.rpy")
+        touch(script, 'e "Hello"\n')
+        make_font(os.path.join(game, "Lite.ttf"), map(ord, "Helo"))
+        index = CharacterIndex(tmp, use_cache=False)
+        assert index.refresh() is None
+
+        # Edit in place: only the file is re-stat'ed and re-extracted
+        touch(script, 'e "Hello 世界"\n')
+        delta = index.refresh()
+        assert delta["changed"] == [script] and delta["added_chars"] == CharSet("世界")
+        assert delta["fonts"][os.path.join(game, "Lite.ttf")]["new_missing"] == CharSet("世界")
+
+        # New file in a new folder: the changed directory triggers a rescan
+        os.makedirs(os.path.join(game, "extra"))
+        extra = os.path.join(game, "extra", "more.rpy")
+        touch(extra, 'e "Bye"\n')
+        touch(game)
+        delta = index.refresh()
+        assert delta["changed"] == [extra] and delta["added_chars"] == CharSet("By")
+
+        os.remove(script)
+        touch(game)
+        delta = index.refresh()
+        assert delta["removed"] == [script] and delta["dropped_chars"] == CharSet("Hlo世界")
+    print("Watch: edits, new folders and removals reported as deltas")
+
+    if sys.platform.startswith("linux"):
+        import shutil
+        from app.core.watch import ProjectWatcher
+        with tempfile.TemporaryDirectory() as tmp:
+            extra = os.path.join(tmp, "game", "extra")
+            os.makedirs(extra)
+            touch(os.path.join(extra, "a.rpy"), 'e "A"\n')
+            watcher = ProjectWatcher(tmp, use_inotify=True)
+            # Branch checkout: the folder is deleted and recreated, a new inode
+            shutil.rmtree(extra)
+            os.makedirs(extra)
+            assert watcher.backend.wait(1.0)
+            watcher.index.refresh()
+            watcher.backend.watch(watcher.index.project.directories)
+            touch(os.path.join(extra, "b.rpy"), 'e "B"\n')
+            assert watcher.backend.wait(1.0), "recreated folder is not watched"
+            delta = watcher.index.refresh()
+            assert delta["changed"] == [os.path.join(extra, "b.rpy")] and delta["added_chars"] == CharSet("B")
+            watcher.backend.close()
+        print("Watch: recreated folders are watched again")
+
+    ## ARTIFACT TEST
+    import json
+    from collections import Counter
+    from app.core.artifact import ScanArtifact, ArtifactError, scan_shard
+    from app.core.cache import hash_file
+    with tempfile.TemporaryDirectory() as tmp:
+        scripts = {
+            "game/script.rpy": 'define gui.text_font = "Lite.ttf"\nlabel start:\n    e "Hello {font=Sym.ttf}★{/font}"\n',
+            "game/dlc/dlc.rpy": 'label dlc:\n    e "世界 ★"\n',
+            "game/tl/french/script.rpy": 'translate french start:\n    e "Été"\n',
+        }
+        for path, text in scripts.items():
+            os.makedirs(os.path.dirname(os.path.join(tmp, path)), exist_ok=True)
+            with open(os.path.join(tmp, path), 'w', encoding='utf-8') as f:
+                f.write(text)
+        languages, counts = {}, Counter()
+        fonts = get_font_characters(tmp, languages=languages, frequencies=counts)
+
+        base = scan_shard(tmp, ["game/script.rpy", "game/tl"], count=True, use_cache=True)
+        dlc = scan_shard(tmp, ["game/dlc"], count=True, use_cache=True)
+        # The second shard keeps the cache entries of the first
+        with open(os.path.join(tmp, ".renpatch", "cache", "fonts.json"), encoding='utf-8') as f:
+            assert set(json.load(f)["files"]) == set(scripts)
+        dlc_path = os.path.join(tmp, "game", "dlc", "dlc.rpy")
+        assert dlc.files == {"game/dlc/dlc.rpy": (os.path.getsize(dlc_path), hash_file(dlc_path))}
+        # Cached rerun: digests come from the cache
+        assert scan_shard(tmp, ["game/dlc"], count=True, use_cache=True).files == dlc.files
+
+        base_file = os.path.join(tmp, "base.rpsa")
+        base.save(base_file)
+        loaded = ScanArtifact.load(base_file)
+        assert loaded.files == base.files and loaded.counts == base.counts
+        assert loaded.font_characters() == base.font_characters()
+
+        merged = ScanArtifact.merge([dlc, loaded])
+        merged_languages = {}
+        assert merged.font_characters(merged_languages) == fonts
+        assert merged_languages == languages and merged.counts == counts
+        try:
+            ScanArtifact.merge([base, loaded])
+            assert False, "overlapping shards merged"
+        except ArtifactError:
+            pass
+    print("Artifact: shards round trip and merge into the full scan")
+
+    ## FONT POOL TEST
+    from app.core import fontpool
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"Font{i}.ttf") for i in range(3)]
+        for i, path in enumerate(paths):
+            make_font(path, range(0x41 + i, 0x60 + i))
+        size = os.path.getsize(paths[0])
+        # The cap is read when the pool is created
+        default = fontpool.FONT_POOL_BYTES
+        fontpool.FONT_POOL_BYTES = 2 * size + size // 2
+        pool = fontpool.FontPool()
+        fontpool.FONT_POOL_BYTES = default
+        assert pool.max_bytes == 2 * size + size // 2
+        pool.open_copy(paths[0]).close()
+        pool.open_copy(paths[1])
+        assert pool.stats()["bytes"] == 2 * size
+        # A shared parsed font counts toward the cap: the least recently used font goes
+        pool.open(paths[1]).getBestCmap()
+        assert pool.stats()["fonts"] == 1 and pool.stats()["bytes"] == 2 * size and pool.evictions == 1
+        pool.set_max_bytes(size)
+        assert pool.stats()["fonts"] == 1 and pool.evictions == 1
+        pool.open_copy(paths[2])
+        assert list(pool.entries) == [os.path.abspath(paths[2])] and pool.evictions == 2
+    print("Font pool: cap configurable, parsed fonts counted")
+
+    ## COVERAGE CACHE TEST
+    from concurrent.futures import ThreadPoolExecutor
+    from app.core import coverage
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"Font{i}.ttf") for i in range(4)]
+        for i, path in enumerate(paths):
+            make_font(path, range(0x41, 0x50 + i))
+        cache = coverage.CoverageCache(os.path.join(tmp, "coverage.json"))
+        # Slow storage: fonts checked concurrently must not hash one at a time
+        hash_file = coverage.hash_file
+        def slow_hash(path):
+            time.sleep(0.2)
+            return hash_file(path)
+        coverage.hash_file = slow_hash
+        try:
+            start = time.perf_counter()
+            with cache.batch(), ThreadPoolExecutor(len(paths)) as executor:
+                found = list(executor.map(cache.coverage, paths))
+            elapsed = time.perf_counter() - start
+        finally:
+            coverage.hash_file = hash_file
+        assert found == [CharSet.from_ranges([(0x41, 0x4F + i)]) for i in range(4)]
+        assert elapsed < 0.2 * len(paths) * 0.75, f"fonts hashed serially ({elapsed:.2f} s)"
+        assert coverage.CoverageCache(cache.path).coverage(paths[3]) == found[3]
+    print("Coverage cache: fonts hashed concurrently")
+
+    ## CMAP PARITY TEST
+    from app.core.cmap import read_cmap_ranges
+    from app.core.coverage import read_cmap
+
+    def check_parity(path):
+        # fontTools leaves out codes mapped to glyph 0 (.notdef): so must cmap.py
+        expected = CharSet.from_codepoints(TTFont(path).getBestCmap())
+        assert read_cmap_ranges(path) == expected, path
+        # WOFF is left to fontTools: the fallback must agree
+        font = TTFont(path)
+        font.flavor = "woff"
+        font.save(path + ".woff")
+        assert read_cmap_ranges(path + ".woff") is None
+        assert read_cmap(path + ".woff") == expected, path
+        return expected
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bmp = list(range(0x20, 0x7F)) + list(range(0x4E00, 0x4E40)) + [0x3001, 0x30A2, 0xFF01]
+        path = os.path.join(tmp, "format4.ttf")
+        make_font(path, bmp)
+        assert check_parity(path) == CharSet.from_codepoints(bmp)
+        path = os.path.join(tmp, "format12.ttf")
+        make_font(path, bmp + [0x1F600, 0x20000, 0x20001])
+        assert check_parity(path) == CharSet.from_codepoints(bmp + [0x1F600, 0x20000, 0x20001])
+
+        # Format 4: a delta segment starting on glyph 0, a glyph array holding a 0
+        ends, starts, deltas, offsets = (0x45, 0x4E03, 0xFFFF), (0x41, 0x4E00, 0xFFFF), ((-0x41) & 0xFFFF, 0, 1), (0, 4, 0)
+        # segCountX2, searchRange, entrySelector, rangeShift for 3 segments
+        body = struct.pack(">4H", 6, 4, 1, 2) + struct.pack(">3H", *ends) + b"\0\0" + struct.pack(">3H", *starts)
+        body += struct.pack(">3H", *deltas) + struct.pack(">3H", *offsets) + struct.pack(">4H", 5, 0, 6, 7)
+        format4 = struct.pack(">3H", 4, 6 + len(body), 0) + body
+        # Format 12: only the first code of a group starting on glyph 0 is missing;
+        # format 13: all of such a group is
+        def groups(format, *entries):
+            return struct.pack(">HHIII", format, 0, 16 + 12 * len(entries), 0, len(entries)) + b"".join(
+                struct.pack(">III", *entry) for entry in entries)
+        format12 = groups(12, (0x41, 0x43, 0), (0x1F600, 0x1F601, 3))
+        format13 = groups(13, (0x41, 0x45, 0), (0x50, 0x52, 4))
+
+        path = os.path.join(tmp, "notdef4.ttf")
+        make_font(path, range(0x41, 0x4B))
+        set_cmap(path, [(3, 1, format4)])
+        assert check_parity(path) == CharSet.from_codepoints([0x42, 0x43, 0x44, 0x45, 0x4E00, 0x4E02, 0x4E03])
+        set_cmap(path, [(3, 10, format12)])
+        assert check_parity(path) == CharSet.from_codepoints([0x42, 0x43, 0x1F600, 0x1F601])
+        set_cmap(path, [(0, 6, format13)])
+        assert check_parity(path) == CharSet.from_codepoints([0x50, 0x51, 0x52])
+    print("Cmap: memory-mapped reader matches fontTools, glyph 0 excluded")
+
     # Test with game directory
     test_path = "/Users/jiyuhe/Downloads/game" 
     lite_font = "/Users/jiyuhe/Downloads/game/SourceHanSansLite.ttf"